@@ -1,11 +1,25 @@
+import base64
+import csv
+import io
+import json
 import os
+import zlib
 from datetime import datetime
 from itertools import zip_longest
 from urllib.parse import quote
-from flask import Flask, render_template, request, redirect, url_for, flash, Response
+from flask import Flask, render_template, request, redirect, url_for, flash, Response, stream_with_context, jsonify, make_response, session
+from werkzeug.http import is_resource_modified
 
+import cache_boletas
+import cache_paginas
+import clientes
 import database
-from pricing import calcular_precio
+import escritor
+import estaticos
+import metricas
+import pricing
+import respaldo
+import tablero
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-only-change-me')
@@ -14,6 +28,18 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-only-change-me')
 WHATSAPP_NUMBER = os.getenv("LAVA_WHATSAPP", "51999999999")  # <-- cambia por tu número
 LAVA_DIRECCION = os.getenv("LAVA_DIRECCION", "Tu calle #123, Huánuco")
 PROMO_BANNER   = os.getenv("LAVA_PROMO", "🌿 Martes: perfumado GRATIS en lavados por kilo")
+# Precios de ítems con tarifa (kilo/edredón/terno): validar = rechaza si el precio unitario del
+# formulario no es la tarifa, corregir = el servidor fija el precio, confiar = usa el del formulario
+PRECIOS_MODO   = os.getenv("LAVA_PRECIOS_MODO", "validar")
+
+# Métricas (/metrics) antes de abrir la primera conexión
+metricas.instalar(app)
+
+# Estáticos con huella y precomprimidos, service worker en /sw.js
+estaticos.instalar(app)
+
+# Respaldos automáticos en segundo plano (LAVA_RESPALDO_CADA_H)
+respaldo.instalar(app)
 
 # Inicializar BD
 database.crear_bd()
@@ -33,88 +59,299 @@ def home():
     return render_template("index.html")
 
 
+def _pagina_condicional(renderizar):
+    """GET condicional + caché de la página renderizada, según la versión de los datos.
+    Si el navegador ya tiene esta versión responde 304 sin consultar boletas ni renderizar."""
+    if session.get("_flashes"):  # los mensajes flash son de un solo uso: no se cachean
+        return renderizar()
+    version = database.leer_contador(database.VERSION_BOLETAS)
+    ruta = request.full_path
+    etag, modificado = cache_paginas.paginas.validadores(version, ruta)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=modificado):
+        respuesta = make_response("", 304)
+    else:
+        html = cache_paginas.paginas.obtener(version, ruta)
+        if html is None:
+            html = renderizar()
+            cache_paginas.paginas.guardar(version, ruta, html)
+        respuesta = make_response(html)
+    respuesta.set_etag(etag)
+    respuesta.last_modified = modificado
+    respuesta.cache_control.no_cache = True  # el navegador guarda la página pero revalida siempre
+    return respuesta
+
+def _filtros_request():
+    """Filtros comunes de listado/exportación: (cliente, desde, hasta)."""
+    cliente = (request.args.get("cliente") or "").strip() or None
+    fecha_desde = request.args.get("desde") or None
+    fecha_hasta = request.args.get("hasta") or None
+    return cliente, fecha_desde, fecha_hasta
+
+def _codificar_cursor(fecha, id_):
+    """Token opaco para la URL con la última fila vista (fecha, id)."""
+    return base64.urlsafe_b64encode(f"{fecha}|{id_}".encode("utf-8")).decode("ascii")
+
+def _decodificar_cursor(token):
+    """Devuelve (fecha, id) o None si el token falta o es inválido."""
+    if not token:
+        return None
+    try:
+        fecha, id_ = base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return fecha, int(id_)
+    except (ValueError, UnicodeError):
+        return None
 
 @app.route("/boletas")
 def boletas():
+    return _pagina_condicional(_render_boletas)
+
+def _render_boletas():
     pagina = int(request.args.get("page", 1))
     limite = 20
     offset = (pagina - 1) * limite
+    # ?after=<token>: página siguiente por cursor (fecha, id); cuesta lo mismo en la página 1 o la 500
+    despues_de = _decodificar_cursor(request.args.get("after"))
 
-    cliente = (request.args.get("cliente") or "").strip() or None
-    fecha_desde = request.args.get("desde") or None
-    fecha_hasta = request.args.get("hasta") or None
+    cliente, fecha_desde, fecha_hasta = _filtros_request()
 
-    filas = database.obtener_boletas_paginado(
-        limit=limite, offset=offset, cliente=cliente,
-        fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
+    filtro = database.FiltroBoletas(cliente, fecha_desde, fecha_hasta)
+    filas, total_registros, total_periodo = database.listar_boletas(
+        filtro, limit=limite, offset=offset, despues_de=despues_de,
     )
-    total_registros = database.contar_boletas(cliente=cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+    # fila = (id, cliente, tipo_item, kilos, cantidad, servicio, perfumado, precio, fecha, ...)
+    cursor_siguiente = _codificar_cursor(filas[-1][8], filas[-1][0]) if len(filas) == limite else None
     total_paginas = max(1, (total_registros + limite - 1) // limite)
-    total_periodo = database.total_periodo(cliente=cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
 
     return render_template(
         "boletas.html", filas=filas, pagina=pagina, total_paginas=total_paginas,
-        total_periodo=total_periodo,
+        total_periodo=total_periodo, cursor_siguiente=cursor_siguiente,
         filtros={"cliente": cliente or "", "desde": fecha_desde or "", "hasta": fecha_hasta or ""},
     )
 
-@app.route("/export.csv")
-def export_csv():
-    POTENTIALLY_DANGEROUS = ("=", "+", "-", "@")
-    def sanitize_cell(s):
-        s = str(s or "")
-        return ("'" + s) if (s and s[0] in POTENTIALLY_DANGEROUS) else s
+POTENTIALLY_DANGEROUS = ("=", "+", "-", "@")
 
-    import csv, io
-    filas = database.obtener_boletas_todas()
+def sanitize_cell(s):
+    """Evita que Excel interprete la celda como fórmula."""
+    s = str(s or "")
+    return ("'" + s) if (s and s[0] in POTENTIALLY_DANGEROUS) else s
 
-    output = io.StringIO()
-    output.write("\ufeff")
-    writer = csv.writer(output)
+def _gzip_stream(trozos):
+    z = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+    for trozo in trozos:
+        datos = z.compress(trozo.encode("utf-8"))
+        if datos:
+            yield datos
+    yield z.flush()
 
-    writer.writerow([
-        "ID","Fecha","Cliente","Tipo","Kilos","Cantidad","Servicio",
-        "Perfumado","Método de pago","Estado","Precio"
-    ])
-    for b in filas:
-        (id_, cliente, tipo_item, kilos, cantidad, servicio, perfumado, precio, fecha, metodo_pago, estado) = b
+@app.route("/export.csv")
+def export_csv():
+    """Exporta en streaming (por lotes) con los mismos filtros que /boletas.
+    ?gzip=1 entrega el archivo comprimido (.csv.gz)."""
+    cliente, fecha_desde, fecha_hasta = _filtros_request()
+    comprimir = request.args.get("gzip") == "1"
+    filas = database.iter_boletas(cliente=cliente, fecha_desde=fecha_desde, fecha_hasta=fecha_hasta)
+
+    def generar_csv():
+        # Buffer pequeño que se vacía cada ~500 filas: memoria constante sin importar el tamaño de la tabla
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        buf.write("\ufeff")
         writer.writerow([
-            id_, fecha, sanitize_cell(cliente), tipo_item, kilos, cantidad, servicio,
-            "Sí" if perfumado == 1 else "No", metodo_pago, estado, f"{float(precio):.2f}"
+            "ID","Fecha","Cliente","Tipo","Kilos","Cantidad","Servicio",
+            "Perfumado","Método de pago","Estado","Precio"
         ])
+        for n, b in enumerate(filas, 1):
+            (id_, cliente, tipo_item, kilos, cantidad, servicio, perfumado, precio, fecha, metodo_pago, estado) = b
+            writer.writerow([
+                id_, fecha, sanitize_cell(cliente), tipo_item, kilos, cantidad, servicio,
+                "Sí" if perfumado == 1 else "No", metodo_pago, estado, f"{float(precio):.2f}"
+            ])
+            if n % 500 == 0:
+                yield buf.getvalue()
+                buf.seek(0); buf.truncate(0)
+        yield buf.getvalue()
 
     filename = f"boletas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    if comprimir:
+        return Response(
+            stream_with_context(_gzip_stream(generar_csv())), mimetype="application/gzip",
+            headers={"Content-Disposition": f"attachment; filename={filename}.gz"}
+        )
     return Response(
-        output.getvalue(), mimetype="text/csv; charset=utf-8",
+        stream_with_context(generar_csv()), mimetype="text/csv; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
+MAX_EXPORT_DELTA = 50000
+_CAMPOS_DELTA = ("id", "cambio", "numero", "fecha", "cliente", "telefono", "direccion", "entrega_fecha",
+                 "entrega_hora", "metodo_pago", "estado", "a_cuenta", "saldo", "total", "notas")
+_CAMPOS_DELTA_ITEM = ("descripcion", "tipo", "cantidad", "lavado", "p_unit", "importe", "perfumado")
+
+@app.route("/export/cambios")
+def export_cambios():
+    """Exportación incremental: boletas nuevas o modificadas desde ?since=<cursor> con sus items.
+    ?formato=csv (una fila por ítem, columnas como importar.py) | jsonl (una boleta por línea).
+    El cursor para la próxima llamada va en X-Cursor-Siguiente; X-Hay-Mas: 1 si quedó algo por
+    exportar (se corta en ?limite boletas). Sin since exporta desde el principio."""
+    try:
+        desde = int(request.args.get("since") or 0)
+        limite = min(int(request.args.get("limite") or MAX_EXPORT_DELTA), MAX_EXPORT_DELTA)
+    except ValueError:
+        return jsonify(error="since y limite deben ser enteros"), 400
+    formato = request.args.get("formato", "csv")
+    if formato not in ("csv", "jsonl"):
+        return jsonify(error="formato: csv | jsonl"), 400
+
+    hasta = database.hasta_cambio(desde, limite)
+    hay_mas = database.hasta_cambio(hasta, 1) > hasta
+    cambios = database.iter_cambios(desde, hasta)
+
+    def generar_jsonl():
+        lineas = []
+        for cab, items in cambios:
+            d = dict(zip(_CAMPOS_DELTA, cab))
+            d["items"] = [dict(zip(_CAMPOS_DELTA_ITEM, it)) for it in items]
+            lineas.append(json.dumps(d, ensure_ascii=False))
+            if len(lineas) >= 500:
+                yield "\n".join(lineas) + "\n"
+                lineas.clear()
+        if lineas:
+            yield "\n".join(lineas) + "\n"
+
+    def generar_csv():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(_CAMPOS_DELTA + _CAMPOS_DELTA_ITEM)
+        for n, (cab, items) in enumerate(cambios, 1):
+            cab = [sanitize_cell(v) if isinstance(v, str) else v for v in cab]
+            for it in items or [("",) * len(_CAMPOS_DELTA_ITEM)]:
+                writer.writerow(cab + [sanitize_cell(v) if isinstance(v, str) else v for v in it])
+            if n % 500 == 0:
+                yield buf.getvalue()
+                buf.seek(0); buf.truncate(0)
+        yield buf.getvalue()
+
+    generar, mimetype = ((generar_jsonl, "application/x-ndjson") if formato == "jsonl"
+                         else (generar_csv, "text/csv; charset=utf-8"))
+    cuerpo = generar()
+    headers = {"X-Cursor-Siguiente": str(hasta), "X-Hay-Mas": "1" if hay_mas else "0"}
+    if request.args.get("gzip") == "1":
+        cuerpo, mimetype = _gzip_stream(cuerpo), "application/gzip"
+        headers["Content-Disposition"] = f"attachment; filename=cambios_{desde}_{hasta}.{formato}.gz"
+    return Response(stream_with_context(cuerpo), mimetype=mimetype, headers=headers)
+
+@app.route("/api/reportes/ingresos")
+def api_reporte_ingresos():
+    """Ingresos por ?periodo=dia|semana|mes y ?por=total|metodo_pago|estado|tipo (desde el resumen diario)."""
+    _, fecha_desde, fecha_hasta = _filtros_request()
+    periodo = request.args.get("periodo", "dia")
+    dimension = request.args.get("por", "total")
+    if dimension not in ("total", "metodo_pago", "estado", "tipo"):
+        return jsonify(error=f"por inválido: {dimension}"), 400
+    try:
+        filas = database.reporte_ingresos(periodo, dimension, fecha_desde, fecha_hasta)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(periodo=periodo, por=dimension, filas=[
+        {"periodo": p, "valor": v, "boletas": n, "monto": monto} for p, v, n, monto in filas
+    ])
+
+@app.route("/api/clientes/autocompletar")
+def api_clientes_autocompletar():
+    """?q=mar -> clientes frecuentes que coinciden (nombre o teléfono) para llenar el formulario."""
+    limite = min(int(request.args.get("limit", 10)), 50)
+    return jsonify(clientes=[
+        {"telefono": tel, "nombre": nombre, "direccion": direccion, "boletas": n, "total": total}
+        for tel, nombre, direccion, n, total in clientes.indice.buscar(request.args.get("q", ""), limite)
+    ])
+
+@app.route("/api/clientes/<telefono>")
+def api_cliente(telefono):
+    c = database.obtener_cliente(telefono)
+    if not c:
+        return jsonify(error="Cliente no encontrado"), 404
+    tel, nombre, direccion, n, total, primera, ultima = c
+    return jsonify(telefono=tel, nombre=nombre, direccion=direccion, boletas=n,
+                   total=round(total, 2), primera_fecha=primera, ultima_fecha=ultima)
+
 @app.route('/logout')
 def logout():
     flash('Sesión cerrada (demo).', 'info')
     return redirect(url_for('home'))
 
 # ------------------- NUEVO: BOLETA MULTI-ITEM -------------------
-def _normalize_phone(raw: str|None) -> str|None:
-    if not raw: return None
-    digits = "".join(ch for ch in raw if ch.isdigit())
-    if not digits: return None
-    if not digits.startswith("51"):
-        digits = "51" + digits.lstrip("0")
-    return digits
+_normalize_phone = database.normalizar_telefono
+
+def _to_float(x, default=0.0):
+    if isinstance(x, (int, float)) and not isinstance(x, bool):
+        return float(x)
+    try: return float((x or "").replace(",", "."))
+    except (AttributeError, ValueError): return default
+
+def _armar_items(filas):
+    """filas: iterable de (tipo, descripcion, cantidad, lavado, perfumado, p_unit) tal como llegan.
+    Return: (items, total). Las filas vacías se saltan."""
+    items, total = [], 0.0
+    for t, d, cnt, lv, pf, pu in filas:
+        t = (t or "").strip()
+        d = (d or "").strip()
+        cnt_v = _to_float(cnt, 1.0)
+        pu_v = _to_float(pu, 0.0)
+        lv = (lv or "Normal").strip()
+
+        # Saltar filas vacías
+        if not t and pu_v == 0 and cnt_v == 0:
+            continue
+        if not t: t = "kilo"
+        if not d: d = t.capitalize()
+
+        # Importe
+        importe = round(cnt_v * pu_v, 2)
+
+        total += importe
+        items.append(dict(
+            descripcion=d, tipo=t, cantidad=cnt_v,  # cantidad se usará para prendas o kilos según el tipo
+            lavado=lv, perfumado=1 if pf in ("1", 1, True) else 0, p_unit=pu_v, recargo=0.0, importe=importe
+        ))
+    if PRECIOS_MODO != "confiar" and items:
+        total = _aplicar_tarifas(items)
+    return items, total
+
+def _aplicar_tarifas(items):
+    """Precia en el servidor los ítems con tarifa. En modo 'validar' rehace antes la cuenta del
+    cliente con el mismo motor (su p_unit, redondeo al centavo exacto) y la compara con la tarifa.
+    Guarda p_unit = tarifa y los recargos aparte: importe = p_unit × cantidad + recargo. Return: total."""
+    t = pricing.tabla()
+    total = 0.0
+    for it in items:
+        partes = pricing.desglose(it["tipo"], it["cantidad"], it["lavado"], it["perfumado"], t)
+        if partes is not None:
+            p_unit, subtotal, recargo = partes
+            if PRECIOS_MODO == "validar":
+                _, propio, _ = pricing.desglose(it["tipo"], it["cantidad"], it["lavado"], it["perfumado"], t,
+                                                p_unit=it["p_unit"])
+                if propio != subtotal:
+                    raise ValueError(
+                        f"El precio de '{it['descripcion']}' (S/ {it['p_unit']:.2f}) no coincide "
+                        f"con la tarifa (S/ {p_unit:.2f})"
+                    )
+            it.update(p_unit=float(p_unit), recargo=float(recargo), importe=float(subtotal + recargo))
+        total += it["importe"]
+    return round(total, 2)
+
+def _armar_cabecera(cliente, direccion, telefono, entrega_fecha, entrega_hora, metodo_pago, a_cuenta, notas, total):
+    return dict(
+        numero=None, cliente=cliente, direccion=direccion, telefono=telefono,
+        fecha=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        entrega_fecha=entrega_fecha, entrega_hora=entrega_hora,
+        metodo_pago=metodo_pago, estado="registrado",
+        a_cuenta=a_cuenta, saldo=round(total - a_cuenta, 2), total=round(total, 2), notas=notas
+    )
 
 @app.route("/boleta/nueva", methods=["GET", "POST"])
 def boleta_nueva():
     if request.method == "POST":
         try:
-            # Helpers
-            def to_float(x, default=0.0):
-                try: return float((x or "").replace(",", "."))
-                except: return default
-            def to_int(x, default=0):
-                try: return int(float(x or 0))
-                except: return default
-
             # Cabecera
             cliente = (request.form.get("cliente") or "").strip()
             direccion = (request.form.get("direccion") or "").strip()
@@ -122,7 +359,7 @@ def boleta_nueva():
             entrega_fecha = request.form.get("entrega_fecha") or ""
             entrega_hora = request.form.get("entrega_hora") or ""
             metodo_pago = request.form.get("metodo_pago") or "efectivo"
-            a_cuenta = to_float(request.form.get("a_cuenta"), 0.0)
+            a_cuenta = _to_float(request.form.get("a_cuenta"), 0.0)
             notas = (request.form.get("notas") or "").strip()
 
             if not cliente:
@@ -135,78 +372,24 @@ def boleta_nueva():
             cantidades = request.form.getlist("item_cantidad[]")
             lavados = request.form.getlist("item_lavado[]")
             perfumados = request.form.getlist("item_perfumado[]")
-            perfumados_hidden = request.form.getlist("item_perfumado_hidden[]")
             punits  = request.form.getlist("item_punit[]")
 
-            items, total = [], 0.0
-            for t, d, cnt, lv, pf, pfh, pu in zip_longest(
-                tipos, descs, cantidades, lavados, perfumados, perfumados_hidden, punits, fillvalue=""
-            ):
-                t = (t or "").strip()
-                d = (d or "").strip()
-                cnt_v = to_float(cnt, 1.0)
-                pu_v = to_float(pu, 0.0)
-                lv = (lv or "Normal").strip()
-
-                # Saltar filas vacías
-                if not t and pu_v == 0 and cnt_v == 0:
-                    continue
-                if not t: t = "kilo"
-                if not d: d = t.capitalize()
-
-                # Importe
-                importe = round(cnt_v * pu_v, 2)
-
-                total += importe
-                items.append(dict(
-                    descripcion=d, tipo=t, cantidad=cnt_v,  # cantidad se usará para prendas o kilos según el tipo
-                    lavado=lv, perfumado=1 if pf == "1" else 0, p_unit=pu_v, importe=importe
-                ))
+            items, total = _armar_items(zip_longest(
+                tipos, descs, cantidades, lavados, perfumados, punits, fillvalue=""
+            ))
 
             if not items:
                 flash("Agrega al menos un ítem con cantidad/precio.", "error")
                 return render_template("boleta_nueva.html")
 
-            saldo = round(total - a_cuenta, 2)
-            fecha_emision = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            cabecera = dict(
-                numero=None, cliente=cliente, direccion=direccion, telefono=telefono,
-                fecha=fecha_emision, entrega_fecha=entrega_fecha, entrega_hora=entrega_hora,
-                metodo_pago=metodo_pago, estado="registrado",
-                a_cuenta=a_cuenta, saldo=saldo, total=round(total, 2), notas=notas
+            cabecera = _armar_cabecera(
+                cliente, direccion, telefono, entrega_fecha, entrega_hora, metodo_pago, a_cuenta, notas, total
             )
+            saldo = cabecera["saldo"]
 
-            # Guardar en nuevo esquema (cabecera + items)
-            boleta_id = database.insertar_boleta_compuesta(cabecera, items)
-
-            # ===== Compatibilidad: UNA SOLA LÍNEA en 'boletas' (resumen consolidado) =====
-            sum_kilos, sum_unidades = 0.0, 0
-            for it in items:
-                t = it["tipo"]
-                if t == "kilo":
-                    sum_kilos += float(it["cantidad"] or 0)
-                else:
-                    sum_unidades += int(it["cantidad"] or 0)
-
-            partes = []
-            if sum_kilos > 0: partes.append(f"{sum_kilos:.2f} kg")
-            if sum_unidades > 0: partes.append(f"{sum_unidades} unidad(es)")
-            tipo_item_resumen = "multi: " + ", ".join(partes) if partes else "multi"
-
-            # Calcular si hay al menos un ítem perfumado
-            tiene_perfumado = any(item["perfumado"] == 1 for item in items)
-            
-            database.insertar_boleta(
-                cliente=cliente,
-                tipo_item=tipo_item_resumen,
-                cantidad=sum_kilos + sum_unidades,
-                lavado="mixto",
-                perfumado=1 if tiene_perfumado else 0,
-                precio=total,
-                metodo_pago=metodo_pago,
-                estado="registrado",
-                fecha=fecha_emision,
-            )
+            # Cabecera + items en una transacción, junto con las boletas que otras
+            # peticiones estén guardando en este momento (group commit)
+            [(_, boleta_id, _)] = escritor.escritor.enviar([dict(clave=None, cabecera=cabecera, items=items)])
 
             # WhatsApp: al cliente si escribió teléfono, si no al número del negocio
             wa_destino = _normalize_phone(telefono) or WHATSAPP_NUMBER
@@ -222,6 +405,12 @@ def boleta_nueva():
             flash("Boleta creada con éxito", "success")
             return redirect(url_for("boleta_detalle", boleta_id=boleta_id, wa=wa_link))
 
+        except escritor.EscritorOcupado as e:
+            flash(f"Sistema ocupado: {e}", "error")
+            return render_template("boleta_nueva.html"), 503
+        except ValueError as e:  # importe distinto de la tarifa (LAVA_PRECIOS_MODO=validar)
+            flash(str(e), "error")
+            return render_template("boleta_nueva.html"), 400
         except Exception as e:
             flash(f"Ocurrió un error: {e}", "error")
             return render_template("boleta_nueva.html")
@@ -229,8 +418,137 @@ def boleta_nueva():
     # GET
     return render_template("boleta_nueva.html")
 
+# ------------------- API: ENVÍO EN LOTE (sincronización PWA offline) -------------------
+MAX_LOTE = 200
+
+def _validar_boleta_json(d):
+    """Valida una boleta del lote. Return: (clave, cabecera, items) o lanza ValueError."""
+    if not isinstance(d, dict):
+        raise ValueError("cada boleta debe ser un objeto JSON")
+    clave = str(d.get("idempotency_key") or "").strip()
+    if not clave or len(clave) > 100:
+        raise ValueError("idempotency_key es obligatoria (máx. 100 caracteres)")
+    cliente = str(d.get("cliente") or "").strip()
+    if not cliente:
+        raise ValueError("El nombre del cliente es obligatorio")
+    items_json = d.get("items")
+    if not isinstance(items_json, list) or not all(isinstance(it, dict) for it in items_json):
+        raise ValueError("items debe ser una lista de objetos")
+    items, total = _armar_items(
+        (it.get("tipo"), it.get("descripcion"), it.get("cantidad"), it.get("lavado"),
+         it.get("perfumado"), it.get("p_unit"))
+        for it in items_json
+    )
+    if not items:
+        raise ValueError("Agrega al menos un ítem con cantidad/precio.")
+    cabecera = _armar_cabecera(
+        cliente, str(d.get("direccion") or "").strip(), str(d.get("telefono") or "").strip(),
+        d.get("entrega_fecha") or "", d.get("entrega_hora") or "", d.get("metodo_pago") or "efectivo",
+        _to_float(d.get("a_cuenta"), 0.0), str(d.get("notas") or "").strip(), total,
+    )
+    return clave, cabecera, items
+
+@app.route("/api/boletas/lote", methods=["POST"])
+def api_boletas_lote():
+    """Recibe {"boletas": [{idempotency_key, cliente, ..., items: [...]}, ...]}.
+    Valida todo el lote y lo guarda en UNA transacción. Reenviar un lote con las mismas
+    claves no duplica boletas: devuelve los IDs ya asignados con duplicado=true."""
+    data = request.get_json(silent=True) or {}
+    lote = data.get("boletas")
+    if not isinstance(lote, list) or not lote:
+        return jsonify(error="Se espera {'boletas': [...]} con al menos una boleta"), 400
+    if len(lote) > MAX_LOTE:
+        return jsonify(error=f"Máximo {MAX_LOTE} boletas por lote"), 413
+
+    entradas, errores = [], []
+    for i, d in enumerate(lote):
+        try:
+            clave, cabecera, items = _validar_boleta_json(d)
+        except ValueError as e:
+            errores.append({"indice": i, "error": str(e)})
+            continue
+        entradas.append(dict(clave=clave, cabecera=cabecera, items=items))
+    if errores:
+        return jsonify(errores=errores), 400
+
+    try:
+        resultados = escritor.escritor.enviar(entradas)
+    except escritor.EscritorOcupado as e:
+        return jsonify(error=str(e)), 503, {"Retry-After": "2"}
+    return jsonify(resultados=[
+        {"idempotency_key": clave, "id": boleta_id, "duplicado": duplicado}
+        for clave, boleta_id, duplicado in resultados
+    ])
+
+# ------------------- API: LECTURA DE BOLETAS -------------------
+_CAMPOS_CABECERA = ("id", "numero", "cliente", "direccion", "telefono", "fecha", "entrega_fecha", "entrega_hora",
+                    "metodo_pago", "estado", "a_cuenta", "saldo", "total", "notas")
+_CAMPOS_ITEM = ("id", "descripcion", "tipo", "cantidad", "lavado", "p_unit", "importe", "perfumado")
+
+def _boleta_json(cab, items):
+    return {**dict(zip(_CAMPOS_CABECERA, cab)), "items": [dict(zip(_CAMPOS_ITEM, it)) for it in items]}
+
+@app.route("/api/boletas/<int:boleta_id>")
+def api_boleta(boleta_id):
+    encontrada = cache_boletas.boletas.obtener([boleta_id]).get(boleta_id)
+    if not encontrada:
+        return jsonify(error="Boleta no encontrada"), 404
+    return jsonify(_boleta_json(*encontrada))
+
+@app.route("/api/boletas")
+def api_boletas():
+    """?ids=12,15,20 -> varias boletas con sus items en una sola petición (en el orden pedido)."""
+    try:
+        ids = [int(x) for x in (request.args.get("ids") or "").split(",") if x.strip()]
+    except ValueError:
+        return jsonify(error="ids debe ser una lista de enteros separados por comas"), 400
+    if not ids:
+        return jsonify(error="Falta ?ids=1,2,3"), 400
+    if len(ids) > MAX_LOTE:
+        return jsonify(error=f"Máximo {MAX_LOTE} boletas por consulta"), 413
+    encontradas = cache_boletas.boletas.obtener(ids)
+    return jsonify(
+        boletas=[_boleta_json(*encontradas[i]) for i in dict.fromkeys(ids) if i in encontradas],
+        no_encontradas=[i for i in dict.fromkeys(ids) if i not in encontradas],
+    )
+
+# ------------------- TABLERO DE ENTREGAS -------------------
+@app.route("/api/boletas/<int:boleta_id>/estado", methods=["POST"])
+def api_boleta_estado(boleta_id):
+    """{"estado": "lavando"} -> avanza un paso (registrado -> lavando -> listo -> entregado)."""
+    estado = str((request.get_json(silent=True) or {}).get("estado") or "").strip()
+    try:
+        anterior = database.cambiar_estado(boleta_id, estado)
+    except ValueError as e:
+        return jsonify(error=str(e)), 409
+    if anterior is None:
+        return jsonify(error="Boleta no encontrada"), 404
+    tablero.difusor.avisar()
+    return jsonify(id=boleta_id, estado=estado, anterior=anterior)
+
+@app.route("/api/tablero")
+def api_tablero():
+    """Vencidas / para hoy / listas, una sola vez (las pantallas usan /api/tablero/eventos)."""
+    return jsonify(tablero.armar())
+
+@app.route("/api/tablero/eventos")
+def api_tablero_eventos():
+    """Server-Sent Events: el tablero completo cada vez que cambia, desde un feed compartido."""
+    try:
+        cola = tablero.difusor.suscribir()
+    except tablero.DemasiadasPantallas as e:
+        return jsonify(error=str(e)), 503, {"Retry-After": "10"}
+    return Response(
+        tablero.eventos(cola),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route("/boleta/<int:boleta_id>")
 def boleta_detalle(boleta_id):
+    return _pagina_condicional(lambda: _render_boleta_detalle(boleta_id))
+
+def _render_boleta_detalle(boleta_id):
     # Obtener la cabecera y los items de la boleta
     cab, items = database.obtener_boleta_detalle(boleta_id)
     
@@ -0,0 +1,162 @@
+"""Mueve las boletas cerradas antiguas a un archivo SQLite por año (particiones).
+
+Uso: python archivo.py [--dias 730] [--lote 1000] [--simular] [--vacuum]
+
+Se archivan las boletas entregadas y sin saldo con fecha anterior a hoy - dias, con sus items,
+en <LAVA_ARCHIVO_DIR>/<bd>_<año>.db. La BD principal queda con las boletas del día a día (y sus
+índices caben en memoria); 'particiones' guarda el rango de fechas de cada archivo y
+'boleta_archivada' el año de cada id, para que database.py adjunte un archivo solo cuando una
+consulta lo necesita. resumen_diario y clientes no cambian: siguen contando lo archivado.
+
+Cada lote se copia primero a su archivo (commit) y luego se borra de la BD principal en otra
+transacción, solo si la boleta no cambió entre medio. Si el proceso se cae, volver a ejecutar el
+mismo comando continúa donde quedó: las copias a medias no se leen hasta que 'main' las da por
+movidas.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import database
+
+DIAS = int(os.getenv("LAVA_ARCHIVO_DIAS", "730"))
+
+
+def _columnas(conn, esquema, tabla):
+    """Columnas guardadas (sin las generadas, que no se insertan)."""
+    return [fila[1] for fila in conn.execute(f"PRAGMA {esquema}.table_xinfo({tabla})") if fila[6] == 0]
+
+
+def _crear_particion(conn, ruta):
+    """Archivo nuevo con el esquema actual de boleta y boleta_items: tablas, índices, la vista
+    'boletas' y el índice FTS de clientes con sus triggers (los demás triggers no: una partición
+    no se modifica desde la app)."""
+    ddl = [fila[0] for fila in conn.execute(
+        "SELECT sql FROM main.sqlite_master WHERE sql IS NOT NULL AND ("
+        "(type IN ('table', 'index') AND tbl_name IN ('boleta', 'boleta_items', 'boleta_fts')) "
+        "OR (type = 'trigger' AND name LIKE 'trg_boleta_fts_%') "
+        "OR (type = 'view' AND name = 'boletas')) "
+        "ORDER BY type = 'trigger', type = 'index', type = 'view'"
+    )]
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    destino = sqlite3.connect(ruta)
+    try:
+        with destino:
+            for sql in ddl:
+                destino.execute(sql)
+    finally:
+        destino.close()
+
+
+def _completar_columnas(conn, esquema, tabla):
+    """Agrega a una partición creada antes las columnas que 'main' ganó después (p. ej. el recargo
+    de los ítems), para que la copia no las pierda."""
+    tiene = set(_columnas(conn, esquema, tabla))
+    for _, nombre, tipo, notnull, defecto, _, oculta in conn.execute(f"PRAGMA main.table_xinfo({tabla})").fetchall():
+        if oculta == 0 and nombre not in tiene:
+            conn.execute(f"ALTER TABLE {esquema}.{tabla} ADD COLUMN {nombre} {tipo}"
+                         + (" NOT NULL" if notnull and defecto is not None else "")
+                         + (f" DEFAULT {defecto}" if defecto is not None else ""))
+
+def _mover(conn, anio, ids):
+    """Mueve las boletas 'ids' (todas del mismo año) a su partición. Return: cuántas se movieron."""
+    archivo = f"{Path(database.DB_PATH).stem}_{anio}.db"
+    ruta = database.ruta_particion(archivo)
+    if not os.path.exists(ruta):
+        _crear_particion(conn, ruta)
+    esquema = database._adjuntar(conn, [(anio, archivo, None)])[1]
+    _completar_columnas(conn, esquema, "boleta")
+    _completar_columnas(conn, esquema, "boleta_items")
+    marcas = ",".join("?" * len(ids))
+    cols_boleta = ", ".join(c for c in _columnas(conn, "main", "boleta") if c in _columnas(conn, esquema, "boleta"))
+    cols_item = ", ".join(c for c in _columnas(conn, "main", "boleta_items")
+                          if c in _columnas(conn, esquema, "boleta_items"))
+
+    # 1) Copia (solo escribe en la partición; repetible)
+    with conn:
+        conn.execute(f"DELETE FROM {esquema}.boleta_items WHERE boleta_id IN ({marcas})", ids)
+        conn.execute(f"DELETE FROM {esquema}.boleta WHERE id IN ({marcas})", ids)
+        conn.execute(f"INSERT INTO {esquema}.boleta ({cols_boleta}) "
+                     f"SELECT {cols_boleta} FROM main.boleta WHERE id IN ({marcas})", ids)
+        conn.execute(f"INSERT INTO {esquema}.boleta_items ({cols_item}) "
+                     f"SELECT {cols_item} FROM main.boleta_items WHERE boleta_id IN ({marcas})", ids)
+
+    # 2) Borrado de la BD principal de las que llegaron sin cambios (solo escribe en 'main')
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        iguales = (f"SELECT b.id FROM main.boleta b JOIN {esquema}.boleta a ON a.id = b.id AND a.cambio IS b.cambio "
+                   f"WHERE b.id IN ({marcas})")
+        conn.execute(
+            "INSERT INTO particiones (anio, archivo, desde, hasta, boletas) "
+            f"SELECT ?, ?, MIN(fecha), MAX(fecha), COUNT(1) FROM main.boleta WHERE id IN ({iguales}) "
+            "GROUP BY 1 ON CONFLICT (anio) DO UPDATE SET desde = MIN(desde, excluded.desde), "
+            "hasta = MAX(hasta, excluded.hasta), boletas = boletas + excluded.boletas",
+            [anio, archivo] + ids,
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO boleta_archivada (id, anio, cambio) "
+            f"SELECT id, ?, cambio FROM main.boleta WHERE id IN ({iguales})",
+            [anio] + ids,
+        )
+        archivadas = f"IN (SELECT id FROM boleta_archivada WHERE id IN ({marcas}))"
+        movidas = conn.execute(f"DELETE FROM main.boleta WHERE id {archivadas}", ids).rowcount
+        conn.execute(f"DELETE FROM main.boleta_items WHERE boleta_id {archivadas}", ids)
+
+    # 3) Las que cambiaron mientras tanto se quedan en 'main': fuera su copia
+    with conn:
+        conn.execute(f"DELETE FROM {esquema}.boleta_items WHERE boleta_id IN ({marcas}) AND boleta_id NOT {archivadas}",
+                     ids + ids)
+        conn.execute(f"DELETE FROM {esquema}.boleta WHERE id IN ({marcas}) AND id NOT {archivadas}", ids + ids)
+    return movidas
+
+
+def archivar(dias=DIAS, lote=1000, simular=False):
+    """Return: {año: boletas movidas (o por mover si simular)}."""
+    corte = (date.today() - timedelta(days=dias)).isoformat()
+    conn = database._conn()
+    por_anio, ultima = {}, ("", 0)
+    while True:
+        # Cursor (fecha, id): las antiguas que no están cerradas no se vuelven a leer
+        filas = conn.execute(
+            "SELECT id, fecha FROM boleta WHERE fecha < ? AND (fecha, id) > (?, ?) "
+            "AND estado = 'entregado' AND saldo_c <= 0 ORDER BY fecha, id LIMIT ?",
+            (corte, *ultima, lote),
+        ).fetchall()
+        if not filas:
+            break
+        ultima = filas[-1][1], filas[-1][0]
+        grupos = {}
+        for boleta_id, fecha in filas:
+            grupos.setdefault(int(fecha[:4]), []).append(boleta_id)
+        for anio, ids in grupos.items():
+            por_anio[anio] = por_anio.get(anio, 0) + (len(ids) if simular else _mover(conn, anio, ids))
+    return por_anio
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--dias", type=int, default=DIAS, help=f"antigüedad mínima en días (por defecto {DIAS})")
+    ap.add_argument("--lote", type=int, default=1000)
+    ap.add_argument("--simular", action="store_true", help="solo cuenta lo que se movería")
+    ap.add_argument("--vacuum", action="store_true", help="compacta la BD principal al terminar")
+    args = ap.parse_args()
+
+    database.crear_bd()
+    t0 = time.perf_counter()
+    por_anio = archivar(args.dias, args.lote, args.simular)
+    for anio, n in sorted(por_anio.items()):
+        print(f"{anio}: {n} boletas{' por mover' if args.simular else ''}")
+    print(f"Total: {sum(por_anio.values())} boletas en {time.perf_counter() - t0:.1f}s")
+    if args.vacuum and not args.simular:
+        conn = database._conn()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM main")
+        print("BD principal compactada.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""Modo de servicio asíncrono opcional: la app Flask detrás de un adaptador ASGI.
+
+Uso: pip install uvicorn && uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+
+Con gunicorn (sync) cada petición ocupa un worker desde que llega hasta que el cliente termina
+de descargar: una exportación larga o un cliente con mala señal bloquea a los demás. Aquí el
+bucle de eventos lee los cuerpos y envía las respuestas, y solo el trabajo bloqueante (la vista
+y cada trozo de una respuesta en streaming, con sus llamadas a database.py) corre en pools de
+hilos acotados; cada hilo usa su propia conexión SQLite (database._conn es por hilo). Hay un
+pool por clase de petición para que las exportaciones y las pantallas del tablero no dejen sin
+hilos a /boleta/nueva:
+
+  escrituras  POST/PUT/DELETE                      LAVA_ASYNC_HILOS_ESCRITURA (4)
+  lecturas    el resto de GET                      LAVA_ASYNC_HILOS (8)
+  lentas      /export.csv, /export/cambios         LAVA_ASYNC_HILOS_LENTOS (2)
+  eventos     /api/tablero/eventos (SSE)           LAVA_TABLERO_PANTALLAS (50)
+
+LAVA_ASYNC=0 vuelve al comportamiento sync sin cambiar el comando: cada petición ocupa un hilo
+de un solo pool hasta terminar de enviarse, como un worker gthread de gunicorn.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import tablero
+from app import app as flask_app
+
+ACTIVO = os.getenv("LAVA_ASYNC", "1") == "1"
+HILOS = int(os.getenv("LAVA_ASYNC_HILOS", "8"))
+HILOS_ESCRITURA = int(os.getenv("LAVA_ASYNC_HILOS_ESCRITURA", "4"))
+HILOS_LENTOS = int(os.getenv("LAVA_ASYNC_HILOS_LENTOS", "2"))
+MAX_CUERPO = int(os.getenv("LAVA_ASYNC_MAX_CUERPO", str(16 * 2**20)))   # bytes
+
+# (prefijo de ruta, pool); lo que no coincide va a 'lecturas' o 'escrituras' según el método
+RUTAS = (("/api/tablero/eventos", "eventos"), ("/export", "lentas"))
+
+
+class AdaptadorASGI:
+    def __init__(self, wsgi, activo=ACTIVO):
+        self.wsgi = wsgi
+        self.activo = activo
+        if activo:
+            self._pools = {
+                "escrituras": ThreadPoolExecutor(HILOS_ESCRITURA, thread_name_prefix="lava-escritura"),
+                "lecturas": ThreadPoolExecutor(HILOS, thread_name_prefix="lava-lectura"),
+                "lentas": ThreadPoolExecutor(HILOS_LENTOS, thread_name_prefix="lava-lenta"),
+                "eventos": ThreadPoolExecutor(tablero.MAX_PANTALLAS, thread_name_prefix="lava-eventos"),
+            }
+        else:
+            self._pools = {"sync": ThreadPoolExecutor(HILOS, thread_name_prefix="lava-sync")}
+
+    def _pool(self, scope):
+        if not self.activo:
+            return self._pools["sync"]
+        for prefijo, nombre in RUTAS:
+            if scope["path"].startswith(prefijo):
+                return self._pools[nombre]
+        return self._pools["lecturas" if scope["method"] in ("GET", "HEAD") else "escrituras"]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._ciclo_de_vida(receive, send)
+            return
+        if scope["type"] != "http":
+            return  # sin websockets
+        cuerpo = await self._leer_cuerpo(receive)
+        if cuerpo is None:
+            await send({"type": "http.response.start", "status": 413, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        environ = _environ(scope, cuerpo)
+        pool = self._pool(scope)
+        desconexion = asyncio.ensure_future(_esperar_desconexion(receive))
+        try:
+            if self.activo:
+                await self._servir(environ, pool, send, desconexion)
+            else:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(pool, self._servir_sync, environ, send, desconexion, loop)
+        finally:
+            desconexion.cancel()
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif mensaje["type"] == "lifespan.shutdown":
+                for pool in self._pools.values():
+                    pool.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _leer_cuerpo(self, receive):
+        """Lee el cuerpo en el bucle de eventos: una subida lenta no ocupa un hilo.
+        Return: bytes, o None si supera MAX_CUERPO."""
+        partes, largo = [], 0
+        while True:
+            mensaje = await receive()
+            if mensaje["type"] == "http.disconnect":
+                break
+            partes.append(mensaje.get("body", b""))
+            largo += len(partes[-1])
+            if largo > MAX_CUERPO:
+                return None
+            if not mensaje.get("more_body"):
+                break
+        return b"".join(partes)
+
+    async def _servir(self, environ, pool, send, desconexion):
+        loop = asyncio.get_running_loop()
+        inicio = {}
+
+        def start_response(status, headers, exc_info=None):
+            inicio.update(_respuesta(status, headers))
+            return _sin_write
+
+        # Todas las llamadas de la petición comparten un contexto: stream_with_context y las
+        # variables de contexto de Flask siguen valiendo aunque cada trozo corra en otro hilo
+        contexto = contextvars.copy_context()
+        en_pool = lambda fn, *args: loop.run_in_executor(pool, contexto.run, fn, *args)
+        iterable = await en_pool(self.wsgi, environ, start_response)
+        iterador = iter(iterable)
+        try:
+            # Cada trozo se produce en el pool y se envía desde el bucle: mientras el cliente
+            # descarga, el hilo queda libre para otra petición
+            trozo = await en_pool(next, iterador, None)
+            await send(inicio)
+            while trozo is not None and not desconexion.done():
+                if trozo:
+                    await send({"type": "http.response.body", "body": trozo, "more_body": True})
+                trozo = await en_pool(next, iterador, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(iterable, "close"):  # libera conexiones propias (iter_boletas) y suscripciones SSE
+                await en_pool(iterable.close)
+
+    def _servir_sync(self, environ, send, desconexion, loop):
+        """LAVA_ASYNC=0: la petición ocupa este hilo hasta enviar el último byte."""
+        enviar = lambda mensaje: asyncio.run_coroutine_threadsafe(send(mensaje), loop).result()
+        inicio = {}
+
+        def start_response(status, headers, exc_info=None):
+            inicio.update(_respuesta(status, headers))
+            return _sin_write
+
+        iterable = self.wsgi(environ, start_response)
+        try:
+            empezada = False
+            for trozo in iterable:
+                if desconexion.done():
+                    break
+                if not empezada:
+                    enviar(inicio)
+                    empezada = True
+                if trozo:
+                    enviar({"type": "http.response.body", "body": trozo, "more_body": True})
+            if not empezada:
+                enviar(inicio)
+            enviar({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+
+
+def _respuesta(status, headers):
+    """Mensaje http.response.start a partir de lo que recibe start_response."""
+    return {"type": "http.response.start", "status": int(status.split(" ", 1)[0]),
+            "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]}
+
+
+def _sin_write(datos):
+    raise RuntimeError("write() de WSGI no está soportado: devuelve un iterable")
+
+
+async def _esperar_desconexion(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def _environ(scope, cuerpo):
+    """environ WSGI (PEP 3333) a partir del scope ASGI de una petición HTTP."""
+    servidor = scope.get("server") or ("localhost", 80)
+    cliente = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": str(servidor[0]),
+        "SERVER_PORT": str(servidor[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": cliente[0],
+        "CONTENT_LENGTH": str(len(cuerpo)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(cuerpo),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for nombre, valor in scope.get("headers", []):
+        nombre, valor = nombre.decode("latin-1").upper().replace("-", "_"), valor.decode("latin-1")
+        if nombre == "CONTENT_LENGTH":
+            continue
+        clave = nombre if nombre == "CONTENT_TYPE" else f"HTTP_{nombre}"
+        environ[clave] = f"{environ[clave]},{valor}" if clave in environ else valor
+    return environ
+
+
+app = AdaptadorASGI(flask_app)
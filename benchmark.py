@@ -0,0 +1,154 @@
+"""Benchmark de la capa de datos y de las rutas principales sobre una base sintética.
+
+Uso: python benchmark.py --boletas 100000 [--repeticiones 30] [--salida resultados.json]
+     python benchmark.py --db /tmp/bench.db --reusar     (reutiliza una base ya generada)
+
+Por cada caso reporta p50/p95/máx en milisegundos y el pico de memoria Python (tracemalloc)
+en un JSON, para comparar corridas y detectar regresiones.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (k - i)
+
+
+def medir(nombre, fn, repeticiones):
+    """Corre fn() 'repeticiones' veces (más una de calentamiento) y una vez más con tracemalloc."""
+    try:
+        fn()
+        tiempos = []
+        for _ in range(repeticiones):
+            t = time.perf_counter()
+            fn()
+            tiempos.append((time.perf_counter() - t) * 1000)
+        tracemalloc.start()
+        fn()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    except Exception as e:  # un caso roto no invalida el resto del reporte
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return {"caso": nombre, "error": f"{type(e).__name__}: {e}"}
+    return {
+        "caso": nombre,
+        "repeticiones": repeticiones,
+        "p50_ms": round(statistics.median(tiempos), 3),
+        "p95_ms": round(_percentil(tiempos, 95), 3),
+        "max_ms": round(max(tiempos), 3),
+        "pico_memoria_kb": round(pico / 1024, 1),
+    }
+
+
+def casos(database, app, rnd, max_id, rango):
+    """(nombre, función, factor de repeticiones) de cada caso medido."""
+    desde, hasta = rango
+    cliente = app.test_client()
+    nueva = dict(
+        numero=None, cliente="Bench Cliente", direccion="", telefono="999000111", fecha=hasta + " 12:00:00",
+        entrega_fecha="", entrega_hora="", metodo_pago="efectivo", estado="registrado",
+        a_cuenta=0, saldo=17.5, total=17.5, notas="",
+    )
+    items = [dict(descripcion="Kilos", tipo="kilo", cantidad=5, lavado="Normal", p_unit=3.5, importe=17.5, perfumado=0)]
+
+    def consumir(url):
+        r = cliente.get(url)
+        for _ in r.response:
+            pass
+        r.close()
+        if r.status_code >= 400:
+            raise RuntimeError(f"HTTP {r.status_code} en {url}")
+
+    ultima_pagina = max(0, database.contar_boletas() - 20)
+    return [
+        ("db.obtener_boletas_paginado:pagina1", lambda: database.obtener_boletas_paginado(limit=20), 1),
+        ("db.obtener_boletas_paginado:profunda", lambda: database.obtener_boletas_paginado(limit=20, offset=ultima_pagina), 1),
+        ("db.obtener_boletas_paginado:rango", lambda: database.obtener_boletas_paginado(
+            limit=20, fecha_desde=desde, fecha_hasta=hasta), 1),
+        ("db.obtener_boletas_paginado:cliente", lambda: database.obtener_boletas_paginado(limit=20, cliente="rios"), 1),
+        ("db.contar_boletas", lambda: database.contar_boletas(), 1),
+        ("db.contar_boletas:rango", lambda: database.contar_boletas(fecha_desde=desde, fecha_hasta=hasta), 1),
+        ("db.total_periodo:rango", lambda: database.total_periodo(fecha_desde=desde, fecha_hasta=hasta), 1),
+        ("db.total_periodo:cliente", lambda: database.total_periodo(cliente="rios"), 1),
+        ("db.obtener_boletas_todas", lambda: database.obtener_boletas_todas(), 0.1),
+        ("db.obtener_boleta_detalle", lambda: database.obtener_boleta_detalle(rnd.randint(1, max_id)), 1),
+        ("db.insertar_boleta_compuesta", lambda: database.insertar_boleta_compuesta(nueva, items), 1),
+        ("http./boletas", lambda: consumir("/boletas"), 1),
+        ("http./boletas:rango+cliente", lambda: consumir(f"/boletas?desde={desde}&hasta={hasta}&cliente=rios"), 1),
+        ("http./export.csv", lambda: consumir("/export.csv"), 0.1),
+        ("http./boleta/<id>", lambda: consumir(f"/boleta/{rnd.randint(1, max_id)}"), 1),
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--boletas", type=int, default=100_000, help="tamaño de la base sintética")
+    ap.add_argument("--db", help="ruta de la base sintética (por defecto un temporal)")
+    ap.add_argument("--reusar", action="store_true", help="no generar: usar --db tal cual")
+    ap.add_argument("--semilla", type=int, default=42)
+    ap.add_argument("--repeticiones", type=int, default=30)
+    ap.add_argument("--solo", help="solo casos cuyo nombre contenga este texto")
+    ap.add_argument("--salida", help="archivo JSON de resultados (por defecto stdout)")
+    args = ap.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="lava_bench_"), "bench.db")
+    os.environ["LAVA_DB_PATH"] = db_path  # antes de importar database/app
+    import datos_sinteticos
+    generacion = None
+    if not args.reusar:
+        generacion = datos_sinteticos.generar(db_path, args.boletas, semilla=args.semilla)
+
+    import database
+    import app as webapp
+    rnd = random.Random(args.semilla)
+    conn = database._conn()
+    max_id, n_boletas = conn.execute("SELECT COALESCE(MAX(id), 1), COUNT(1) FROM boleta").fetchone()
+    ultimo = conn.execute("SELECT MAX(substr(fecha,1,10)) FROM boleta").fetchone()[0] or datetime.now().strftime("%Y-%m-%d")
+    rango = (ultimo[:8] + "01", ultimo)  # el último mes con datos
+
+    resultados = []
+    for nombre, fn, factor in casos(database, webapp.app, rnd, max_id, rango):
+        if args.solo and args.solo not in nombre:
+            continue
+        r = medir(nombre, fn, max(3, int(args.repeticiones * factor)))
+        print(f"  {nombre}: {r.get('p50_ms', r.get('error'))}", file=sys.stderr)
+        resultados.append(r)
+
+    reporte = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "db": db_path,
+        "boletas": n_boletas,
+        "tamano_db_mb": round(os.path.getsize(db_path) / 2**20, 1),
+        "generacion_seg": round(generacion, 2) if generacion else None,
+        "resultados": resultados,
+    }
+    if sys.platform != "win32":
+        import resource
+        reporte["rss_max_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    salida = json.dumps(reporte, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(salida)
+    else:
+        print(salida)
+
+
+if __name__ == "__main__":
+    main()
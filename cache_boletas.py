@@ -0,0 +1,58 @@
+"""Caché LRU de boletas (cabecera + items) para la API de lectura.
+
+Cada entrada guarda el número de cambio (boleta.cambio) con que se leyó. Antes de responder se
+consulta el cambio actual de los ids pedidos (una búsqueda por clave primaria): si otro worker
+cambió el estado, el pago a cuenta, el saldo o los items de una boleta, su cambio ya no coincide
+y se vuelve a leer. Las demás salen de memoria sin tocar boleta_items.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import database
+
+# Boletas en memoria por proceso (las menos consultadas salen primero)
+MAX_BOLETAS = int(os.getenv("LAVA_CACHE_BOLETAS", "2000"))
+
+
+class CacheBoletas:
+    def __init__(self, max_boletas=MAX_BOLETAS):
+        self.max_boletas = max_boletas
+        self._lock = threading.Lock()
+        self._boletas = OrderedDict()   # id -> (cambio, cabecera, items)
+        self.aciertos = self.fallos = 0
+
+    def obtener(self, ids):
+        """Return: {id: (cabecera, items)} de los ids que existen."""
+        vigentes = database.cambios_de(ids)
+        resultado, faltan = {}, []
+        with self._lock:
+            for boleta_id, cambio in vigentes.items():
+                entrada = self._boletas.get(boleta_id)
+                if entrada is not None and entrada[0] == cambio:
+                    self._boletas.move_to_end(boleta_id)
+                    resultado[boleta_id] = entrada[1:]
+                else:
+                    faltan.append(boleta_id)
+            self.aciertos += len(resultado)
+            self.fallos += len(faltan)
+        if faltan:
+            leidas = database.obtener_boletas_detalle(faltan)
+            with self._lock:
+                for boleta_id, entrada in leidas.items():
+                    self._boletas[boleta_id] = entrada
+                    self._boletas.move_to_end(boleta_id)
+                    resultado[boleta_id] = entrada[1:]
+                while len(self._boletas) > self.max_boletas:
+                    self._boletas.popitem(last=False)
+        return resultado
+
+    def invalidar(self, boleta_id=None):
+        with self._lock:
+            if boleta_id is None:
+                self._boletas.clear()
+            else:
+                self._boletas.pop(boleta_id, None)
+
+
+boletas = CacheBoletas()
@@ -0,0 +1,68 @@
+"""Caché LRU de páginas renderizadas y validadores para GET condicional (ETag / Last-Modified).
+
+Todo se indexa por la versión de los datos (contador database.VERSION_BOLETAS, que sube con
+cada escritura de boletas): mientras no cambie, una página ya renderizada sigue siendo válida
+y el navegador puede recibir 304 sin que se consulte la BD.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# Páginas renderizadas en memoria por proceso (las menos usadas salen primero)
+MAX_PAGINAS = int(os.getenv("LAVA_CACHE_PAGINAS", "256"))
+
+
+class CachePaginas:
+    def __init__(self, max_paginas=MAX_PAGINAS):
+        self.max_paginas = max_paginas
+        self._lock = threading.Lock()
+        self._version = None
+        self._desde = None                # cuándo vio este proceso la versión actual
+        self._paginas = OrderedDict()     # ruta con query string -> html
+        self.aciertos = self.fallos = 0
+
+    def _vigente(self, version):
+        """Al cambiar la versión se descarta todo: ninguna página anterior sirve."""
+        if version != self._version:
+            self._paginas.clear()
+            self._version = version
+            # HTTP-date tiene resolución de segundos
+            self._desde = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def validadores(self, version, ruta):
+        """Return: (etag, last_modified) de la página 'ruta' con los datos en 'version'."""
+        with self._lock:
+            self._vigente(version)
+            desde = self._desde
+        etag = hashlib.sha1(f"{version}:{ruta}".encode("utf-8")).hexdigest()[:20]
+        return etag, desde
+
+    def obtener(self, version, ruta):
+        with self._lock:
+            self._vigente(version)
+            html = self._paginas.get(ruta)
+            if html is None:
+                self.fallos += 1
+            else:
+                self._paginas.move_to_end(ruta)
+                self.aciertos += 1
+            return html
+
+    def guardar(self, version, ruta, html):
+        with self._lock:
+            if version != self._version:  # los datos cambiaron mientras se renderizaba
+                return
+            self._paginas[ruta] = html
+            self._paginas.move_to_end(ruta)
+            while len(self._paginas) > self.max_paginas:
+                self._paginas.popitem(last=False)
+
+    def invalidar(self):
+        with self._lock:
+            self._version = None
+            self._paginas.clear()
+
+
+paginas = CachePaginas()
@@ -0,0 +1,286 @@
+"""Prueba de carga concurrente de la app: la hora punta con cajeros guardando boletas mientras
+otros navegan /boletas y alguien descarga /export.csv.
+
+Uso: python carga.py --url http://127.0.0.1:8000 [--mezcla hora_punta] [--duracion 30]
+     python carga.py --lanzar gunicorn --workers 4 --db /tmp/carga.db [--boletas 50000]
+     python carga.py --lanzar werkzeug --db /tmp/carga.db
+     python carga.py --lanzar uvicorn --workers 2 --db /tmp/carga.db   (modo asíncrono, asgi.py)
+
+Cada usuario virtual es una tarea asyncio que repite su acción (con una pausa corta al azar)
+hasta que se acaba el tiempo. Reporta por acción: peticiones por segundo, p50/p99/máx en ms,
+errores HTTP y, en total, los 'database is locked' (en las respuestas y, si el servidor lo
+lanza este script, en su log) y las boletas que no se guardaron. El reporte va en JSON para
+comparar corridas con distinto nº de workers, PRAGMAs o disco.
+
+Solo usa la biblioteca estándar: cliente HTTP/1.1 mínimo, una conexión por petición.
+Con --lanzar nunca apuntar --db a la base real: las boletas de prueba se guardan de verdad.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode, urlsplit
+
+from benchmark import _percentil
+
+# Usuarios virtuales por rol en cada mezcla (--cajeros/--navegantes/--exportadores las ajustan)
+MEZCLAS = {
+    "hora_punta": dict(cajeros=8, navegantes=6, exportadores=1),
+    "escrituras": dict(cajeros=16, navegantes=0, exportadores=0),
+    "lecturas": dict(cajeros=0, navegantes=12, exportadores=2),
+}
+BLOQUEO = b"database is locked"
+_ID_BOLETA = re.compile(rb"/boleta/(\d+)")
+
+
+class Resultados:
+    def __init__(self):
+        self.muestras = {}      # acción -> [(segundos, status, ok)]
+        self.bloqueos = 0
+        self.ids = []           # boletas guardadas (para que los navegantes abran su detalle)
+
+    def anotar(self, accion, segundos, status, ok, cuerpo=b""):
+        self.muestras.setdefault(accion, []).append((segundos, status, ok))
+        if BLOQUEO in cuerpo:
+            self.bloqueos += 1
+
+    def reporte(self, duracion):
+        acciones = {}
+        for accion, muestras in sorted(self.muestras.items()):
+            ms = [s * 1000 for s, _, _ in muestras]
+            acciones[accion] = {
+                "peticiones": len(muestras),
+                "por_segundo": round(len(muestras) / duracion, 2),
+                "p50_ms": round(_percentil(ms, 50), 2),
+                "p99_ms": round(_percentil(ms, 99), 2),
+                "max_ms": round(max(ms), 2),
+                "fallidas": sum(1 for _, _, ok in muestras if not ok),
+                "status": {str(st): sum(1 for _, s, _ in muestras if s == st) for st in {s for _, s, _ in muestras}},
+            }
+        total = sum(a["peticiones"] for a in acciones.values())
+        return {
+            "peticiones": total,
+            "por_segundo": round(total / duracion, 2),
+            "database_is_locked": self.bloqueos,
+            "boletas_no_guardadas": acciones.get("guardar", {}).get("fallidas", 0),
+            "acciones": acciones,
+        }
+
+
+# ------------------- Cliente HTTP mínimo -------------------
+async def pedir(host, port, metodo, ruta, cuerpo=None, timeout=60):
+    """Return: (status, cabeceras en minúsculas, cuerpo). Lee hasta que el servidor cierra."""
+    lector, escritor = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        cabeceras = [f"{metodo} {ruta} HTTP/1.1", f"Host: {host}:{port}", "Connection: close",
+                     "Accept-Encoding: identity"]
+        if cuerpo is not None:
+            cabeceras += ["Content-Type: application/x-www-form-urlencoded", f"Content-Length: {len(cuerpo)}"]
+        escritor.write(("\r\n".join(cabeceras) + "\r\n\r\n").encode("latin-1") + (cuerpo or b""))
+        await escritor.drain()
+        datos = await asyncio.wait_for(lector.read(), timeout)
+    finally:
+        escritor.close()
+    cabeza, _, resto = datos.partition(b"\r\n\r\n")
+    lineas = cabeza.decode("latin-1").split("\r\n")
+    status = int(lineas[0].split()[1]) if lineas and len(lineas[0].split()) > 1 else 0
+    hdrs = {}
+    for linea in lineas[1:]:
+        nombre, _, valor = linea.partition(":")
+        hdrs[nombre.strip().lower()] = valor.strip()
+    return status, hdrs, resto
+
+
+async def _medir(resultados, accion, corrutina, exito):
+    t = time.perf_counter()
+    try:
+        status, hdrs, cuerpo = await corrutina
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+        resultados.anotar(accion, time.perf_counter() - t, 0, False)
+        return None
+    resultados.anotar(accion, time.perf_counter() - t, status, exito(status, hdrs), cuerpo)
+    return status, hdrs, cuerpo
+
+
+# ------------------- Usuarios virtuales -------------------
+def _formulario(rnd, n):
+    # Como sale de la balanza: dos decimales, con servicios y perfumado (recargos del servidor)
+    kilos = round(rnd.uniform(0.2, 9), 2)
+    return urlencode([
+        ("cliente", f"Carga {n}"), ("telefono", f"9{rnd.randrange(10**8):08d}"),
+        ("metodo_pago", rnd.choice(["efectivo", "yape", "plin"])), ("a_cuenta", "0"),
+        ("item_tipo[]", "kilo"), ("item_desc[]", "Kilos"), ("item_cantidad[]", str(kilos)),
+        ("item_lavado[]", rnd.choice(["Normal", "Normal", "Seco", "A mano"])),
+        ("item_perfumado[]", rnd.choice(["0", "0", "1"])), ("item_punit[]", "3.5"),
+    ]).encode("ascii")
+
+
+async def cajero(objetivo, resultados, fin, rnd, pausa):
+    n = 0
+    while time.perf_counter() < fin:
+        n += 1
+        # Guardado correcto = redirección al detalle de la boleta nueva
+        r = await _medir(resultados, "guardar", pedir(*objetivo, "POST", "/boleta/nueva", _formulario(rnd, n)),
+                         lambda st, h, *_: st in (302, 303) and "/boleta/" in h.get("location", ""))
+        if r and r[0] in (302, 303):
+            m = _ID_BOLETA.search(r[1].get("location", "").encode("latin-1"))
+            if m:
+                resultados.ids.append(int(m.group(1)))
+        await asyncio.sleep(rnd.expovariate(1 / pausa) if pausa else 0)
+
+
+async def navegante(objetivo, resultados, fin, rnd, pausa, max_id):
+    ok = lambda st, *_: st in (200, 304)
+    while time.perf_counter() < fin:
+        if rnd.random() < 0.6:
+            params = {"page": rnd.randint(1, 5)}
+            if rnd.random() < 0.3:
+                params["cliente"] = rnd.choice(["rios", "quispe", "carga", "maria"])
+            await _medir(resultados, "listar", pedir(*objetivo, "GET", "/boletas?" + urlencode(params)), ok)
+        else:
+            ids = resultados.ids
+            boleta_id = rnd.choice(ids) if ids and (not max_id or rnd.random() < 0.5) else rnd.randint(1, max_id or 1)
+            await _medir(resultados, "detalle", pedir(*objetivo, "GET", f"/boleta/{boleta_id}"), ok)
+        await asyncio.sleep(rnd.expovariate(1 / pausa) if pausa else 0)
+
+
+async def exportador(objetivo, resultados, fin, rnd, pausa):
+    while time.perf_counter() < fin:
+        await _medir(resultados, "exportar", pedir(*objetivo, "GET", "/export.csv", timeout=600),
+                     lambda st, *_: st == 200)
+        await asyncio.sleep(rnd.expovariate(1 / pausa) if pausa else 0)
+
+
+async def correr(objetivo, roles, duracion, pausa, max_id, semilla):
+    resultados = Resultados()
+    fin = time.perf_counter() + duracion
+    rnd = random.Random(semilla)
+    tareas = []
+    for _ in range(roles["cajeros"]):
+        tareas.append(cajero(objetivo, resultados, fin, random.Random(rnd.random()), pausa))
+    for _ in range(roles["navegantes"]):
+        tareas.append(navegante(objetivo, resultados, fin, random.Random(rnd.random()), pausa, max_id))
+    for _ in range(roles["exportadores"]):
+        tareas.append(exportador(objetivo, resultados, fin, random.Random(rnd.random()), pausa * 10))
+    t = time.perf_counter()
+    await asyncio.gather(*tareas)
+    return resultados, time.perf_counter() - t
+
+
+# ------------------- Servidor propio (--lanzar) -------------------
+def lanzar(servidor, workers, puerto, db_path):
+    """Levanta la app sobre db_path. Return: (proceso, contador de 'database is locked' en su log)."""
+    entorno = {**os.environ, "LAVA_DB_PATH": db_path, "FLASK_DEBUG": "0"}
+    if servidor == "gunicorn":
+        cmd = ["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{puerto}", "app:app"]
+    elif servidor == "uvicorn":
+        cmd = ["uvicorn", "--workers", str(workers), "--host", "127.0.0.1", "--port", str(puerto), "asgi:app"]
+    else:  # un solo proceso con hilos
+        cmd = [sys.executable, "-m", "flask", "--app", "app", "run", "--host", "127.0.0.1",
+               "--port", str(puerto), "--with-threads", "--no-reload", "--no-debugger"]
+    proceso = subprocess.Popen(cmd, env=entorno, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    bloqueos = [0]
+
+    def leer_log():
+        for linea in proceso.stderr:
+            if BLOQUEO in linea:
+                bloqueos[0] += 1
+
+    threading.Thread(target=leer_log, daemon=True).start()
+    return proceso, bloqueos
+
+
+async def esperar_servidor(objetivo, proceso, espera=60):
+    limite = time.perf_counter() + espera
+    while time.perf_counter() < limite:
+        if proceso is not None and proceso.poll() is not None:
+            raise SystemExit(f"el servidor terminó al arrancar (código {proceso.returncode})")
+        try:
+            await pedir(*objetivo, "GET", "/", timeout=5)
+            return
+        except (OSError, asyncio.TimeoutError):
+            await asyncio.sleep(0.2)
+    raise SystemExit("el servidor no respondió a tiempo")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--url", default="http://127.0.0.1:8000", help="app ya levantada (sin --lanzar)")
+    ap.add_argument("--lanzar", choices=("gunicorn", "uvicorn", "werkzeug"), help="levantar la app con este servidor")
+    ap.add_argument("--workers", type=int, default=2, help="procesos (con --lanzar gunicorn/uvicorn)")
+    ap.add_argument("--db", help="base para --lanzar (se crea sintética si no existe)")
+    ap.add_argument("--boletas", type=int, default=20_000, help="tamaño de la base sintética nueva")
+    ap.add_argument("--mezcla", choices=sorted(MEZCLAS), default="hora_punta")
+    ap.add_argument("--cajeros", type=int)
+    ap.add_argument("--navegantes", type=int)
+    ap.add_argument("--exportadores", type=int)
+    ap.add_argument("--duracion", type=float, default=30, help="segundos de carga")
+    ap.add_argument("--pausa", type=float, default=0.2, help="pausa media entre acciones de un usuario (s)")
+    ap.add_argument("--semilla", type=int, default=42)
+    ap.add_argument("--salida", help="archivo JSON de resultados (por defecto stdout)")
+    args = ap.parse_args()
+
+    roles = dict(MEZCLAS[args.mezcla])
+    for rol in roles:
+        if getattr(args, rol) is not None:
+            roles[rol] = getattr(args, rol)
+
+    proceso, bloqueos_log, max_id = None, [0], 0
+    if args.lanzar:
+        if not args.db:
+            ap.error("--lanzar necesita --db (una copia o una base sintética, nunca la real)")
+        if not os.path.exists(args.db):
+            import datos_sinteticos
+            datos_sinteticos.generar(args.db, args.boletas, semilla=args.semilla)
+        import sqlite3
+        with sqlite3.connect(args.db) as conn:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM boleta").fetchone()[0]
+        puerto = 8765
+        objetivo = ("127.0.0.1", puerto)
+        proceso, bloqueos_log = lanzar(args.lanzar, args.workers, puerto, args.db)
+    else:
+        url = urlsplit(args.url)
+        objetivo = (url.hostname, url.port or 80)
+
+    try:
+        asyncio.run(esperar_servidor(objetivo, proceso))
+        print(f"Carga '{args.mezcla}' {roles} durante {args.duracion:.0f}s...", file=sys.stderr)
+        resultados, duracion = asyncio.run(correr(objetivo, roles, args.duracion, args.pausa, max_id, args.semilla))
+    finally:
+        if proceso is not None:
+            proceso.terminate()
+            proceso.wait(timeout=30)
+
+    reporte = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "servidor": args.lanzar or args.url,
+        "workers": args.workers if args.lanzar in ("gunicorn", "uvicorn") else None,
+        "mezcla": args.mezcla,
+        "usuarios": roles,
+        "duracion_seg": round(duracion, 1),
+        **resultados.reporte(duracion),
+    }
+    reporte["database_is_locked"] += bloqueos_log[0]
+    for accion, r in reporte["acciones"].items():
+        print(f"  {accion}: {r['por_segundo']}/s p50 {r['p50_ms']} ms p99 {r['p99_ms']} ms, "
+              f"{r['fallidas']} fallidas", file=sys.stderr)
+    salida = json.dumps(reporte, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            f.write(salida)
+    else:
+        print(salida)
+
+
+if __name__ == "__main__":
+    main()
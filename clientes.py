@@ -0,0 +1,87 @@
+"""Autocompletado de clientes: índice de prefijos en memoria sobre la tabla 'clientes'.
+
+Se reconstruye solo cuando cambia el contador 'clientes' (lo incrementa cada escritura),
+así que cada worker ve las altas de los demás sin consultar la tabla en cada tecla.
+"""
+import bisect
+import os
+import threading
+import unicodedata
+from dataclasses import dataclass, replace
+
+import database
+
+# Tope de clientes en memoria (los más recientes); el resto no aparece en el autocompletado
+MAX_CLIENTES = int(os.getenv("LAVA_AUTOCOMPLETAR_MAX", "50000"))
+
+
+def _normalizar(texto):
+    """'María Ríos' -> 'maria rios'"""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(ch for ch in texto if not unicodedata.combining(ch)).lower().strip()
+
+
+@dataclass(frozen=True)
+class _Indice:
+    """Foto del índice: se reemplaza entera con una sola asignación, así quien busca mientras otro
+    hilo recarga nunca mezcla claves nuevas con clientes viejos."""
+    version: int | None = None
+    claves: tuple = ()     # ((clave, posición en clientes), ...) ordenada
+    clientes: tuple = ()   # filas de database.obtener_clientes()
+    palabras: tuple = ()   # palabras normalizadas del nombre de cada cliente
+
+
+class IndicePrefijos:
+    def __init__(self, max_clientes=MAX_CLIENTES):
+        self.max_clientes = max_clientes
+        self._lock = threading.Lock()
+        self._indice = _Indice()
+
+    def _cargar(self, version):
+        clientes = database.obtener_clientes(limit=self.max_clientes)
+        claves, palabras = [], []
+        for pos, (telefono, nombre, *_resto) in enumerate(clientes):
+            ps = _normalizar(nombre).split()
+            palabras.append(ps)
+            claves += [(p, pos) for p in set(ps)]
+            claves.append((telefono, pos))
+            if telefono.startswith("51"):
+                claves.append((telefono[2:], pos))
+        claves.sort()
+        self._indice = _Indice(version, tuple(claves), tuple(clientes), tuple(palabras))
+
+    def _vigente(self):
+        """Return: el índice al día con el contador 'clientes'."""
+        version = database.leer_contador("clientes")
+        if version != self._indice.version:
+            with self._lock:
+                if version != self._indice.version:
+                    self._cargar(version)
+        return self._indice
+
+    def invalidar(self):
+        self._indice = replace(self._indice, version=None)
+
+    def buscar(self, texto, limite=10):
+        """Clientes cuyo nombre contiene palabras que empiezan con las del texto (en cualquier
+        orden), o cuyo teléfono empieza con los dígitos escritos. Los más frecuentes primero."""
+        consulta = _normalizar(texto).split()
+        if not consulta:
+            return []
+        indice = self._vigente()
+        claves, clientes, palabras = indice.claves, indice.clientes, indice.palabras
+        primera, resto = consulta[0], consulta[1:]
+        i = bisect.bisect_left(claves, (primera,))
+        candidatos = set()
+        while i < len(claves) and claves[i][0].startswith(primera):
+            candidatos.add(claves[i][1])
+            i += 1
+        encontrados = [
+            clientes[pos] for pos in candidatos
+            if all(any(p.startswith(q) for p in palabras[pos]) for q in resto)
+        ]
+        encontrados.sort(key=lambda c: (-c[3], c[1]))
+        return encontrados[:limite]
+
+
+indice = IndicePrefijos()
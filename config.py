@@ -0,0 +1,21 @@
+import os
+
+# === Base de datos (SQLite) — todo se puede sobrescribir con variables de entorno ===
+DB_PATH = os.getenv("LAVA_DB_PATH")  # None -> lavanderia.db junto al código
+# Particiones por año de las boletas archivadas (archivo.py)
+ARCHIVO_DIR = os.getenv("LAVA_ARCHIVO_DIR")  # None -> carpeta 'archivo' junto a la BD
+# Respaldos (respaldo.py)
+RESPALDO_DIR = os.getenv("LAVA_RESPALDO_DIR")  # None -> carpeta 'respaldos' junto a la BD
+
+# WAL: los lectores no bloquean al escritor (varios workers de gunicorn)
+SQLITE_JOURNAL_MODE = os.getenv("LAVA_SQLITE_JOURNAL_MODE", "WAL")
+# NORMAL es seguro con WAL y evita un fsync por cada commit
+SQLITE_SYNCHRONOUS = os.getenv("LAVA_SQLITE_SYNCHRONOUS", "NORMAL")
+# Caché de páginas por conexión, en KiB (~32 MB)
+SQLITE_CACHE_KB = int(os.getenv("LAVA_SQLITE_CACHE_KB", "32768"))
+# Lectura por memoria mapeada, en bytes (0 = desactivado)
+SQLITE_MMAP_SIZE = int(os.getenv("LAVA_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_TEMP_STORE = os.getenv("LAVA_SQLITE_TEMP_STORE", "MEMORY")
+# Cuánto espera una conexión por el lock de escritura antes de 'database is locked'
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("LAVA_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_FOREIGN_KEYS = os.getenv("LAVA_SQLITE_FOREIGN_KEYS", "1") == "1"
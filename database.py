@@ -1,153 +1,576 @@
+import atexit
+import os
+import re
 import sqlite3
+import threading
+import weakref
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+from datetime import date, timedelta
 from pathlib import Path
 
-DB_PATH = str(Path(__file__).with_name("lavanderia.db"))
+import config as cfg
+
+DB_PATH = cfg.DB_PATH or str(Path(__file__).with_name("lavanderia.db"))
+
+# ====== Conexiones: una por hilo (y por proceso), con PRAGMAs de rendimiento ======
+_local = threading.local()
+_abiertas = weakref.WeakSet()
+
+class Conexion(sqlite3.Connection):
+    """Conexión de la app: recuerda con qué versión de las particiones hizo sus ATTACH."""
+    particiones = None
+
+# Clase de las conexiones nuevas; metricas.instalar() la reemplaza por una que mide las consultas
+FABRICA_CONEXION = Conexion
+
+class _ConexionHilo:
+    """Conexión propia de un hilo. Se cierra al terminar el hilo (threading.local suelta el
+    objeto), con cerrar_conexion() o al salir del proceso."""
+    def __init__(self, path):
+        self.path = path
+        self.pid = os.getpid()
+        self.conn = _abrir(path)
+        _abiertas.add(self)
+
+    def cerrar(self):
+        # Nunca cerrar una conexión heredada por fork: pertenece al proceso padre
+        if self.conn is not None and self.pid == os.getpid():
+            self.conn.close()
+        self.conn = None
+
+    def __del__(self):
+        try:
+            self.cerrar()
+        except Exception:
+            pass
+
+def _abrir(path=None):
+    """Abre una conexión nueva con los PRAGMAs configurados en config.py."""
+    conn = sqlite3.connect(
+        path or DB_PATH, timeout=cfg.SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+        factory=FABRICA_CONEXION,
+    )
+    conn.execute(f"PRAGMA journal_mode={cfg.SQLITE_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous={cfg.SQLITE_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size=-{int(cfg.SQLITE_CACHE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(cfg.SQLITE_MMAP_SIZE)}")
+    conn.execute(f"PRAGMA temp_store={cfg.SQLITE_TEMP_STORE}")
+    conn.execute(f"PRAGMA busy_timeout={int(cfg.SQLITE_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA foreign_keys={'ON' if cfg.SQLITE_FOREIGN_KEYS else 'OFF'}")
+    return conn
 
 def _conn():
-    return sqlite3.connect(DB_PATH)
+    """Conexión reutilizable del hilo actual. 'with _conn() as conn' hace commit/rollback
+    pero NO la cierra: se reutiliza en la siguiente llamada del mismo hilo."""
+    h = getattr(_local, "conexion", None)
+    if h is None or h.conn is None or h.pid != os.getpid() or h.path != DB_PATH:
+        h = _local.conexion = _ConexionHilo(DB_PATH)
+    return h.conn
+
+def cerrar_conexion():
+    """Cierra la conexión del hilo actual (la siguiente llamada abre otra)."""
+    h = getattr(_local, "conexion", None)
+    if h is not None:
+        h.cerrar()
+        _local.conexion = None
+
+@atexit.register
+def cerrar_conexiones():
+    """Cierra todas las conexiones abiertas por este proceso."""
+    for h in list(_abiertas):
+        h.cerrar()
+
+def _leer_dia(valor):
+    try:
+        return date.fromisoformat(str(valor).strip()[:10]) if valor else None
+    except (TypeError, ValueError):
+        return None
+
+def _limites_fecha(fecha_desde, fecha_hasta):
+    """Convierte el rango de días [desde, hasta] en límites comparables con 'fecha' (texto
+    'YYYY-MM-DD HH:MM:SS'): fecha >= inicio AND fecha < fin. Así el filtro es un rango
+    simple sobre la columna y SQLite puede usar el índice. Fechas inválidas se ignoran."""
+    inicio, fin = _leer_dia(fecha_desde), _leer_dia(fecha_hasta)
+    return (
+        inicio.isoformat() if inicio else None,
+        (fin + timedelta(days=1)).isoformat() if fin else None,
+    )
+
+_EPOCA = date(1970, 1, 1).toordinal()
+
+def _limites_dia(fecha_desde, fecha_hasta):
+    """Igual que _limites_fecha pero para la columna entera 'dia' (días desde 1970-01-01)."""
+    inicio, fin = _leer_dia(fecha_desde), _leer_dia(fecha_hasta)
+    return (
+        inicio.toordinal() - _EPOCA if inicio else None,
+        fin.toordinal() - _EPOCA + 1 if fin else None,
+    )
+
+# ====== Particiones por año (boletas archivadas) ======
+# archivo.py mueve las boletas cerradas antiguas a un archivo SQLite por año. La BD principal
+# guarda el rango de fechas de cada archivo ('particiones') y dónde quedó cada id
+# ('boleta_archivada', migración 13). Un archivo se adjunta (ATTACH) solo cuando el rango de una
+# consulta llega hasta él: el día a día lee solo la BD principal.
+MAX_ADJUNTAS = 8  # SQLite admite 10 bases adjuntas por conexión
+
+def ruta_particion(archivo):
+    carpeta = cfg.ARCHIVO_DIR or os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "archivo")
+    return os.path.join(carpeta, archivo)
+
+def _particiones(conn, fecha_desde=None, fecha_hasta=None):
+    """Particiones cuyo rango de fechas se cruza con [desde, hasta]. Return: [(anio, archivo, hasta)]"""
+    inicio, fin = _limites_fecha(fecha_desde, fecha_hasta)
+    conds, params = [], []
+    if inicio:
+        conds.append("hasta >= ?"); params.append(inicio)
+    if fin:
+        conds.append("desde < ?"); params.append(fin)
+    where = " WHERE " + " AND ".join(conds) if conds else ""
+    return conn.execute(f"SELECT anio, archivo, hasta FROM particiones{where} ORDER BY anio", params).fetchall()
+
+def _adjuntar(conn, particiones):
+    """ATTACH de las particiones que falten (fuera de una transacción).
+    Return: esquemas a consultar, 'main' primero."""
+    if not particiones:
+        return ["main"]
+    adjuntas = {fila[1] for fila in conn.execute("PRAGMA database_list")} - {"main", "temp"}
+    nuevas = [p for p in particiones if f"archivo_{p[0]}" not in adjuntas]
+    # respaldo.restaurar() reemplaza los archivos y sube este contador: lo adjuntado antes seguiría
+    # leyendo los archivos viejos (ya borrados del disco), así que se adjunta todo de nuevo
+    fila = conn.execute("SELECT valor FROM contadores WHERE nombre = ?", (VERSION_PARTICIONES,)).fetchone()
+    version = fila[0] if fila else 0
+    if conn.particiones != version or len(adjuntas) + len(nuevas) > MAX_ADJUNTAS:
+        for esquema in adjuntas:
+            conn.execute(f"DETACH DATABASE {esquema}")
+        nuevas = particiones
+    conn.particiones = version
+    for anio, archivo, _ in nuevas:
+        ruta = ruta_particion(archivo)
+        if not os.path.exists(ruta):  # ATTACH crearía una BD vacía sin avisar
+            raise FileNotFoundError(f"falta la partición {anio}: {ruta}")
+        conn.execute("ATTACH DATABASE ? AS ?", (ruta, f"archivo_{anio}"))
+    return ["main"] + [f"archivo_{p[0]}" for p in particiones]
+
+def _archivadas(esquema, columna="id"):
+    """Condición para leer de una partición solo las boletas que la BD principal da por movidas
+    (si archivo.py se interrumpe, el archivo puede tener copias que siguen en 'main').
+    Con '+' SQLite no la usa para recorrer boleta_archivada: sigue el índice (fecha, id)."""
+    return None if esquema == "main" else f"+{columna} IN (SELECT id FROM main.boleta_archivada)"
+
+# ====== Montos ======
+# En la BD cada monto REAL se guarda redondeado al centavo y tiene su columna generada <monto>_c
+# con los centavos enteros (migración 9). Las sumas se hacen sobre *_c: son exactas.
+_MONTOS_CABECERA = ("a_cuenta", "saldo", "total")
+_MONTOS_ITEM = ("p_unit", "recargo", "importe")
+
+def a_centavos(valor) -> int:
+    """Soles (float, str o Decimal) -> centavos enteros, redondeando medio centavo hacia arriba."""
+    return int((Decimal(str(valor or 0)) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+
+def _al_centavo(fila, campos):
+    """Copia de 'fila' con los montos redondeados al centavo (lo que se guarda en la BD)."""
+    return {**fila, **{c: a_centavos(fila[c]) / 100 for c in campos if c in fila}}
+
+# ====== Búsqueda de clientes (FTS5) ======
+_FTS_DISPONIBLE = {}  # DB_PATH -> existe el índice FTS5 (lo crea una migración si SQLite trae FTS5)
+
+def _fts_disponible():
+    disponible = _FTS_DISPONIBLE.get(DB_PATH)
+    if disponible is None:
+        disponible = _FTS_DISPONIBLE[DB_PATH] = bool(_conn().execute(
+            "SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE name = 'boleta_fts')"
+        ).fetchone()[0])
+    return disponible
+
+# Índice de texto "external content" sobre boleta(cliente, telefono, notas); lo crea la migración 6
+_FTS_TABLAS = ("boleta",)
+
+def _consulta_fts(texto):
+    """'ríos mar' -> '"ríos"* "mar"*' (todas las palabras, por prefijo, en cualquier orden)."""
+    palabras = re.findall(r"\w+", texto or "")
+    return " ".join(f'"{p}"*' for p in palabras) or None
+
+@dataclass(frozen=True)
+class FiltroBoletas:
+    """Filtros de listado (cliente, rango de días) sobre 'boleta' o la vista 'boletas' (mismos ids)."""
+    cliente: str | None = None
+    fecha_desde: str | None = None
+    fecha_hasta: str | None = None
+
+    def where(self, despues_de=None, por_dia=False, esquema="main"):
+        """Return: (" WHERE ..." o "", params). despues_de=(fecha, id) agrega el cursor keyset.
+        por_dia=True filtra el rango sobre la columna entera 'dia' (para sumas) en vez de 'fecha'.
+        esquema='archivo_<año>' filtra una partición adjunta (con su propio índice FTS)."""
+        params, conds = [], []
+        if _archivadas(esquema):
+            conds.append(_archivadas(esquema))
+        if self.cliente:
+            consulta = _consulta_fts(self.cliente) if _fts_disponible() else None
+            if consulta:
+                # Índice FTS5 sin tildes: 'rios' encuentra 'Ríos', el orden de palabras no importa
+                fts = "boleta_fts" if esquema == "main" else f"{esquema}.boleta_fts"
+                conds.append(f"id IN (SELECT rowid FROM {fts} WHERE boleta_fts MATCH ?)")
+                params.append(consulta)
+            else:
+                conds.append("cliente LIKE ?"); params.append(f"%{self.cliente}%")
+        columna = "dia" if por_dia else "fecha"
+        inicio, fin = (_limites_dia if por_dia else _limites_fecha)(self.fecha_desde, self.fecha_hasta)
+        if inicio is not None:
+            conds.append(f"{columna} >= ?"); params.append(inicio)
+        if fin is not None:
+            conds.append(f"{columna} < ?"); params.append(fin)
+        if despues_de:
+            conds.append("(fecha, id) < (?, ?)"); params += list(despues_de)
+        return (" WHERE " + " AND ".join(conds) if conds else ""), params
+
+    def resumen_sql(self, esquemas=("main",)):
+        """SELECT de (n, suma en centavos) del conjunto filtrado. Sin filtro de cliente se responde
+        desde resumen_diario (unas filas por día, incluye las boletas archivadas) en vez de
+        recorrer 'boleta'. Con cliente se suma cada esquema de 'esquemas' (ver _adjuntar)."""
+        if self.cliente:
+            partes, params = [], []
+            for esquema in esquemas:
+                where, p = self.where(por_dia=True, esquema=esquema)
+                tabla = "boleta" if esquema == "main" else f"{esquema}.boleta"
+                partes.append(f"SELECT COUNT(1) AS n, COALESCE(SUM(total_c), 0) AS suma FROM {tabla}{where}")
+                params += p
+            if len(partes) == 1:
+                return partes[0], params
+            return f"SELECT SUM(n) AS n, SUM(suma) AS suma FROM ({' UNION ALL '.join(partes)})", params
+        inicio, fin = _limites_fecha(self.fecha_desde, self.fecha_hasta)
+        conds, params = ["dimension = 'total'"], []
+        if inicio:
+            conds.append("dia >= ?"); params.append(inicio)
+        if fin:
+            conds.append("dia < ?"); params.append(fin)
+        return (
+            "SELECT COALESCE(SUM(boletas), 0) AS n, COALESCE(SUM(centavos), 0) AS suma "
+            f"FROM resumen_diario WHERE {' AND '.join(conds)}"
+        ), params
 
 def crear_bd():
-    """Crea la BD original (boletas) y además el nuevo esquema (boleta + boleta_items)."""
+    """Deja la BD en la última versión del esquema aplicando las migraciones pendientes
+    (ver migraciones.py). Si ya está al día solo lee PRAGMA user_version."""
+    import migraciones  # aquí para evitar el import circular (migraciones usa database)
+    return migraciones.migrar()
+
+# ====== Directorio de clientes ======
+def normalizar_telefono(raw: str|None) -> str|None:
+    """'987 654 321' -> '51987654321' (formato de wa.me). None si no hay dígitos."""
+    if not raw: return None
+    digits = "".join(ch for ch in raw if ch.isdigit())
+    if not digits: return None
+    if not digits.startswith("51"):
+        digits = "51" + digits.lstrip("0")
+    return digits
+
+_UPSERT_CLIENTE = """
+    INSERT INTO clientes (telefono, nombre, direccion, boletas, total, primera_fecha, ultima_fecha)
+    VALUES (:telefono, :nombre, :direccion, :boletas, :total, :primera_fecha, :ultima_fecha)
+    ON CONFLICT (telefono) DO UPDATE SET
+        -- una boleta más vieja (importación, sincronización atrasada) no pisa el nombre actual
+        nombre = CASE WHEN excluded.ultima_fecha >= COALESCE(ultima_fecha, '') THEN excluded.nombre ELSE nombre END,
+        direccion = COALESCE(NULLIF(excluded.direccion, ''), direccion),
+        boletas = boletas + excluded.boletas,
+        total = ROUND(total + excluded.total, 2),
+        primera_fecha = MIN(primera_fecha, excluded.primera_fecha),
+        ultima_fecha = MAX(ultima_fecha, excluded.ultima_fecha)
+"""
+
+def _registrar_clientes(cur, cabeceras):
+    """Suma cada boleta al acumulado de su cliente (dentro de la transacción de la boleta)."""
+    filas = []
+    for c in cabeceras:
+        tel = normalizar_telefono(c.get("telefono"))
+        if tel:
+            filas.append(dict(telefono=tel, nombre=c["cliente"], direccion=c.get("direccion") or "",
+                              boletas=1, total=c.get("total") or 0,
+                              primera_fecha=c["fecha"], ultima_fecha=c["fecha"]))
+    if filas:
+        cur.executemany(_UPSERT_CLIENTE, filas)
+        _incrementar_contador(cur, "clientes")
+
+# Contador que sube con cada escritura de boletas: versión de los datos para cachés y ETags
+VERSION_BOLETAS = "boletas"
+VERSION_PARTICIONES = "particiones"   # sube al restaurar un respaldo (ver _adjuntar)
+
+def _incrementar_contador(cur, nombre):
+    cur.execute(
+        "INSERT INTO contadores (nombre, valor) VALUES (?, 1) "
+        "ON CONFLICT (nombre) DO UPDATE SET valor = valor + 1",
+        (nombre,)
+    )
+
+def leer_contador(nombre) -> int:
     with _conn() as conn:
+        fila = conn.execute("SELECT valor FROM contadores WHERE nombre = ?", (nombre,)).fetchone()
+        return fila[0] if fila else 0
+
+def reconstruir_clientes(lote=1000):
+    """Recalcula 'clientes' a partir de todas las boletas con teléfono (también las archivadas)."""
+    conn = _conn()
+    esquemas = _adjuntar(conn, _particiones(conn))
+    with conn:
         cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        return _reconstruir_clientes(cur, lote, esquemas)
 
-        # ===== Esquema ORIGINAL (lo mantenemos para compatibilidad) =====
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS boletas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cliente TEXT NOT NULL,
-                tipo_item TEXT NOT NULL,
-                kilos REAL DEFAULT 0,
-                cantidad INTEGER DEFAULT 0,
-                servicio TEXT DEFAULT 'normal',
-                perfumado INTEGER DEFAULT 0,
-                precio REAL NOT NULL,
-                fecha TEXT NOT NULL,
-                metodo_pago TEXT DEFAULT 'efectivo',
-                estado TEXT DEFAULT 'registrado'
-            )
-            """
-        )
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_boletas_fecha ON boletas(fecha)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_boletas_cliente ON boletas(cliente)")
+def _reconstruir_clientes(cur, lote=1000, esquemas=("main",)):
+    """Igual que reconstruir_clientes() pero dentro de la transacción de quien llama."""
+    acumulado = {}
+    cur.execute(" UNION ALL ".join(
+        f"SELECT cliente, direccion, telefono, fecha, total, id FROM {esquema}.boleta "
+        "WHERE COALESCE(telefono,'') <> ''" + (f" AND {_archivadas(esquema)}" if _archivadas(esquema) else "")
+        for esquema in esquemas
+    ) + " ORDER BY fecha, id")
+    while True:
+        filas = cur.fetchmany(lote)
+        if not filas:
+            break
+        for nombre, direccion, telefono, fecha, total, _ in filas:
+            tel = normalizar_telefono(telefono)
+            if not tel:
+                continue
+            c = acumulado.setdefault(tel, dict(telefono=tel, direccion="", boletas=0, centavos=0,
+                                                primera_fecha=fecha))
+            c["nombre"] = nombre
+            c["direccion"] = direccion or c["direccion"]
+            c["boletas"] += 1
+            c["centavos"] += a_centavos(total)
+            c["ultima_fecha"] = fecha
+    cur.execute("DELETE FROM clientes")
+    cur.executemany(_UPSERT_CLIENTE, [{**c, "total": c["centavos"] / 100} for c in acumulado.values()])
+    _incrementar_contador(cur, "clientes")
+    return len(acumulado)
 
-        # ===== NUEVO ESQUEMA (Cabecera + Items) =====
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS boleta (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero TEXT,                  -- opcional: correlativo impreso (N° 007601)
-                cliente TEXT NOT NULL,
-                direccion TEXT,
-                telefono TEXT,
-                fecha TEXT NOT NULL,          -- fecha de emisión
-                entrega_fecha TEXT,           -- fecha prometida
-                entrega_hora TEXT,            -- hora prometida (ej. '17:00')
-                metodo_pago TEXT DEFAULT 'efectivo',
-                estado TEXT DEFAULT 'registrado',
-                a_cuenta REAL DEFAULT 0,      -- pago parcial
-                saldo REAL DEFAULT 0,
-                total REAL DEFAULT 0,         -- total de la boleta (suma items)
-                notas TEXT                    -- observaciones (ej. 'Martes 5 pm')
-            )
-            """
-        )
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_boleta_fecha ON boleta(fecha)")
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_boleta_cliente ON boleta(cliente)")
+def obtener_cliente(telefono):
+    """Perfil con acumulados: (telefono, nombre, direccion, boletas, total, primera_fecha, ultima_fecha)."""
+    tel = normalizar_telefono(telefono)
+    if not tel:
+        return None
+    with _conn() as conn:
+        return conn.execute(
+            "SELECT telefono, nombre, direccion, boletas, total, primera_fecha, ultima_fecha "
+            "FROM clientes WHERE telefono = ?", (tel,)
+        ).fetchone()
 
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS boleta_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                boleta_id INTEGER NOT NULL REFERENCES boleta(id) ON DELETE CASCADE,
-                descripcion TEXT,             -- 'Frazadas', 'Edredón', 'Kilos', etc.
-                tipo TEXT,                    -- kilos | edredon | terno | otro
-                prendas INTEGER DEFAULT 0,    -- nº de prendas (para terno/edredón)
-                kilos REAL DEFAULT 0,         -- para servicio por kilos
-                lavado TEXT,                  -- 'Normal', 'Seco', 'A mano'...
-                secado TEXT,                  -- 'Secadora', 'Tendedero'...
-                p_unit REAL DEFAULT 0,        -- precio unitario (por kilo o por prenda)
-                importe REAL DEFAULT 0,       -- subtotal del item
-                perfumado INTEGER DEFAULT 0   -- si está perfumado (1) o no (0)
-            )
-            """
-        )
-        cur.execute("CREATE INDEX IF NOT EXISTS idx_bitems_boleta ON boleta_items(boleta_id)")
-        conn.commit()
+def obtener_clientes(limit=None):
+    """Clientes para el índice de autocompletado, los más recientes primero."""
+    with _conn() as conn:
+        q = ("SELECT telefono, nombre, direccion, boletas, total FROM clientes "
+             "ORDER BY ultima_fecha DESC")
+        if limit:
+            return conn.execute(q + " LIMIT ?", (limit,)).fetchall()
+        return conn.execute(q).fetchall()
 
-# ====== API ORIGINAL (se mantiene tal cual para tu app actual) ======
-def insertar_boleta(cliente, tipo_item, cantidad, lavado, perfumado, precio, metodo_pago, estado, fecha):
+def reconstruir_fts():
+    """Reconstruye los índices de búsqueda desde sus tablas (tras una carga sin triggers)."""
+    if not _fts_disponible():
+        return
     with _conn() as conn:
+        for tabla in _FTS_TABLAS:
+            conn.execute(f"INSERT INTO {tabla}_fts ({tabla}_fts) VALUES ('rebuild')")
+
+# ====== Resumen diario (rollup) ======
+def reconstruir_resumen():
+    """Recalcula resumen_diario desde cero (para datos existentes o si se sospecha desfase).
+    Incluye las boletas archivadas en particiones."""
+    conn = _conn()
+    esquemas = _adjuntar(conn, _particiones(conn))
+    with conn:
         cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        return _reconstruir_resumen(cur, esquemas)
+
+_SUMAR_RESUMEN = (" ON CONFLICT (dia, dimension, valor) DO UPDATE SET "
+                  "boletas = boletas + excluded.boletas, centavos = centavos + excluded.centavos")
+
+def _reconstruir_resumen(cur, esquemas=("main",)):
+    """Igual que reconstruir_resumen() pero dentro de la transacción de quien llama."""
+    cur.execute("DELETE FROM resumen_diario")
+    for esquema in esquemas:
+        # Un mismo día puede tener boletas en la BD principal y en su partición: se suman
+        archivadas = _archivadas(esquema, "b.id") or "1"
+        for dimension, valor in (("total", "''"), ("metodo_pago", "COALESCE(b.metodo_pago,'')"),
+                                 ("estado", "COALESCE(b.estado,'')")):
+            cur.execute(
+                "INSERT INTO resumen_diario (dia, dimension, valor, boletas, centavos) "
+                f"SELECT substr(b.fecha,1,10), '{dimension}', {valor}, COUNT(1), COALESCE(SUM(b.total_c),0) "
+                f"FROM {esquema}.boleta b WHERE {archivadas} GROUP BY 1, 3" + _SUMAR_RESUMEN
+            )
         cur.execute(
-            """
-            INSERT INTO boletas (cliente, tipo_item, cantidad, servicio, perfumado, precio, fecha, metodo_pago, estado)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            (cliente, tipo_item, cantidad, lavado, perfumado, precio, fecha, metodo_pago, estado),
+            "INSERT INTO resumen_diario (dia, dimension, valor, boletas, centavos) "
+            "SELECT substr(b.fecha,1,10), 'tipo', COALESCE(i.tipo,''), COUNT(1), COALESCE(SUM(i.importe_c),0) "
+            f"FROM {esquema}.boleta_items i JOIN {esquema}.boleta b ON b.id = i.boleta_id "
+            f"WHERE {archivadas} GROUP BY 1, 3" + _SUMAR_RESUMEN
         )
-        conn.commit()
+    return cur.execute("SELECT COUNT(1) FROM resumen_diario").fetchone()[0]
 
-def obtener_boletas_paginado(limit=20, offset=0, cliente=None, fecha_desde=None, fecha_hasta=None):
+_PERIODOS = {
+    "dia": "dia",
+    "semana": "strftime('%Y-W%W', dia)",
+    "mes": "substr(dia,1,7)",
+}
+
+def reporte_ingresos(periodo="dia", dimension="total", fecha_desde=None, fecha_hasta=None):
+    """Ingresos agrupados por dia | semana | mes (y por valor de la dimensión), leídos del resumen.
+    Return: lista de (periodo, valor, boletas, monto)"""
+    if periodo not in _PERIODOS:
+        raise ValueError(f"periodo inválido: {periodo}")
+    inicio, fin = _limites_fecha(fecha_desde, fecha_hasta)
+    conds, params = ["dimension = ?"], [dimension]
+    if inicio:
+        conds.append("dia >= ?"); params.append(inicio)
+    if fin:
+        conds.append("dia < ?"); params.append(fin)
     with _conn() as conn:
         cur = conn.cursor()
-        q = (
-            "SELECT id, cliente, tipo_item, kilos, cantidad, servicio, perfumado, precio, fecha, metodo_pago, estado "
-            "FROM boletas"
+        cur.execute(
+            f"SELECT {_PERIODOS[periodo]} AS p, valor, SUM(boletas), SUM(centavos) / 100.0 "
+            f"FROM resumen_diario WHERE {' AND '.join(conds)} GROUP BY p, valor ORDER BY p, valor",
+            params,
         )
-        params, conds = [], []
-        if cliente:
-            conds.append("cliente LIKE ?"); params.append(f"%{cliente}%")
-        if fecha_desde:
-            conds.append("date(substr(fecha,1,10)) >= date(?)"); params.append(fecha_desde)
-        if fecha_hasta:
-            conds.append("date(substr(fecha,1,10)) <= date(?)"); params.append(fecha_hasta)
-        if conds: q += " WHERE " + " AND ".join(conds)
-        q += " ORDER BY fecha DESC, id DESC LIMIT ? OFFSET ?"
-        params += [limit, offset]
-        cur.execute(q, params)
         return cur.fetchall()
 
-def contar_boletas(cliente=None, fecha_desde=None, fecha_hasta=None):
+# ====== API ORIGINAL (se mantiene para los scripts que aún la usan) ======
+def insertar_boleta(cliente, tipo_item, cantidad, lavado, perfumado, precio, metodo_pago, estado, fecha):
+    """La tabla 'boletas' ahora es una vista (migración 11): se guarda como boleta de un solo ítem."""
+    tipo = "kilo" if tipo_item in ("kilo", "kilos") else tipo_item
+    cabecera = dict(numero=None, cliente=cliente, direccion=None, telefono=None, fecha=fecha, entrega_fecha=None,
+                    entrega_hora=None, metodo_pago=metodo_pago, estado=estado, a_cuenta=0, saldo=precio,
+                    total=precio, notas=None)
+    item = dict(descripcion=tipo_item, tipo=tipo, cantidad=cantidad, lavado=lavado, p_unit=precio,
+                importe=precio, perfumado=perfumado)
+    return insertar_boleta_compuesta(cabecera, [item])
+
+# Filas con las columnas de la tabla 'boletas' original, armadas desde boleta + boleta_items:
+# kilos = suma de los ítems por kilo, cantidad = kilos + unidades (como la guardaba app.py),
+# servicio = el lavado de los ítems o 'mixto', perfumado = alguno lo está. Los listados no leen
+# la vista 'boletas': GROUP BY (fecha, id) sobre 'boleta' recorre el índice (fecha, id) en el
+# orden pedido y corta en el LIMIT, juntando los items de cada boleta en la misma pasada.
+_KILOS = "COALESCE(SUM(CASE WHEN i.tipo = 'kilo' THEN i.kilos END), 0)"
+_UNIDADES = "COALESCE(SUM(CASE WHEN i.tipo <> 'kilo' THEN i.prendas END), 0)"
+_COLS_BOLETAS = (
+    "b.id, b.cliente, "
+    f"CASE WHEN {_KILOS} > 0 AND {_UNIDADES} > 0 THEN printf('multi: %.2f kg, %d unidad(es)', {_KILOS}, {_UNIDADES}) "
+    f"WHEN {_KILOS} > 0 THEN printf('multi: %.2f kg', {_KILOS}) "
+    f"WHEN {_UNIDADES} > 0 THEN printf('multi: %d unidad(es)', {_UNIDADES}) ELSE 'multi' END AS tipo_item, "
+    f"{_KILOS} AS kilos, {_KILOS} + {_UNIDADES} AS cantidad, "
+    "CASE WHEN MIN(i.lavado) = MAX(i.lavado) THEN MIN(i.lavado) ELSE 'mixto' END AS servicio, "
+    "COALESCE(MAX(i.perfumado), 0) AS perfumado, b.total AS precio, b.fecha, b.metodo_pago, b.estado"
+)
+
+def _select_boletas(filtro, esquema="main", despues_de=None):
+    """SELECT de boletas con las columnas de la tabla original, sin ORDER BY. Return: (sql, params)"""
+    where, params = filtro.where(despues_de, esquema=esquema)
+    prefijo = "" if esquema == "main" else f"{esquema}."
+    # Los items van en una subconsulta sin 'id': así id/fecha/cliente del filtro y del ORDER BY
+    # son los de la boleta (SQLite la aplana, el plan es el mismo que con el JOIN directo)
+    items = f"(SELECT boleta_id, tipo, kilos, prendas, lavado, perfumado FROM {prefijo}boleta_items)"
+    return (f"SELECT {_COLS_BOLETAS} FROM {prefijo}boleta b "
+            f"LEFT JOIN {items} i ON i.boleta_id = b.id{where} GROUP BY b.fecha, b.id"), params
+
+def obtener_boletas_paginado(limit=20, offset=0, cliente=None, fecha_desde=None, fecha_hasta=None, despues_de=None):
+    """Página de 'boletas' ordenada por (fecha, id) DESC.
+    despues_de=(fecha, id) de la última fila vista activa la paginación por cursor (keyset):
+    se ignora offset y la consulta busca directo en el índice (fecha, id)."""
+    sql, params = _select_boletas(FiltroBoletas(cliente, fecha_desde, fecha_hasta), despues_de=despues_de)
+    if despues_de:
+        offset = 0
     with _conn() as conn:
         cur = conn.cursor()
-        q = "SELECT COUNT(1) FROM boletas"
-        params, conds = [], []
-        if cliente:
-            conds.append("cliente LIKE ?"); params.append(f"%{cliente}%")
-        if fecha_desde:
-            conds.append("date(substr(fecha,1,10)) >= date(?)"); params.append(fecha_desde)
-        if fecha_hasta:
-            conds.append("date(substr(fecha,1,10)) <= date(?)"); params.append(fecha_hasta)
-        if conds: q += " WHERE " + " AND ".join(conds)
-        cur.execute(q, params)
-        return cur.fetchone()[0]
+        cur.execute(f"{sql} ORDER BY fecha DESC, id DESC LIMIT ? OFFSET ?", params + [limit, offset])
+        return cur.fetchall()
+
+def _resumen(filtro):
+    """(n, suma en centavos) del filtro; con cliente suma también las particiones del rango."""
+    conn = _conn()
+    esquemas = ["main"]
+    if filtro.cliente:
+        esquemas = _adjuntar(conn, _particiones(conn, filtro.fecha_desde, filtro.fecha_hasta))
+    sql, params = filtro.resumen_sql(esquemas)
+    with conn:
+        return conn.execute(sql, params).fetchone()
+
+def contar_boletas(cliente=None, fecha_desde=None, fecha_hasta=None):
+    return _resumen(FiltroBoletas(cliente, fecha_desde, fecha_hasta))[0]
 
 def total_periodo(cliente=None, fecha_desde=None, fecha_hasta=None):
-    with _conn() as conn:
+    return _resumen(FiltroBoletas(cliente, fecha_desde, fecha_hasta))[1] / 100
+
+def _union_boletas(filtro, esquemas, despues_de=None):
+    """_select_boletas filtrado en cada esquema, unidos con UNION ALL. Return: (sql, params)"""
+    partes, params = [], []
+    for esquema in esquemas:
+        sql, p = _select_boletas(filtro, esquema, despues_de)
+        partes.append(sql)
+        params += p
+    return " UNION ALL ".join(partes), params
+
+def listar_boletas(filtro, limit=20, offset=0, despues_de=None):
+    """Página + conteo + total del periodo en UNA consulta (y una sola conexión).
+    Si el rango llega a boletas archivadas se leen también sus particiones, salvo que la página
+    se complete con boletas más nuevas que todo lo archivado.
+    Return: (filas, total_registros, total_periodo)"""
+    conn = _conn()
+    particiones = _particiones(conn, filtro.fecha_desde, filtro.fecha_hasta)
+    if particiones and not filtro.cliente:  # sin cliente el conteo sale de resumen_diario
+        filas, total_registros, suma = _listar(conn, filtro, limit, offset, despues_de, ["main"])
+        if len(filas) == limit and filas[-1][8] > max(p[2] for p in particiones):
+            return filas, total_registros, suma
+    esquemas = _adjuntar(conn, particiones)
+    return _listar(conn, filtro, limit, offset, despues_de, esquemas)
+
+def _listar(conn, filtro, limit, offset, despues_de, esquemas):
+    sql_resumen, params = filtro.resumen_sql(esquemas)
+    sql_pagina, params_pag = _union_boletas(filtro, esquemas, despues_de)
+    if despues_de:
+        offset = 0
+    q = f"""
+        WITH resumen AS ({sql_resumen}),
+        pagina AS (
+            {sql_pagina}
+            ORDER BY fecha DESC, id DESC LIMIT ? OFFSET ?
+        )
+        SELECT resumen.n, resumen.suma, pagina.*
+        FROM resumen LEFT JOIN pagina ON 1
+        ORDER BY pagina.fecha DESC, pagina.id DESC
+    """
+    with conn:
         cur = conn.cursor()
-        q = "SELECT COALESCE(SUM(precio), 0) FROM boletas"
-        params, conds = [], []
-        if cliente:
-            conds.append("cliente LIKE ?"); params.append(f"%{cliente}%")
-        if fecha_desde:
-            conds.append("date(substr(fecha,1,10)) >= date(?)"); params.append(fecha_desde)
-        if fecha_hasta:
-            conds.append("date(substr(fecha,1,10)) <= date(?)"); params.append(fecha_hasta)
-        if conds: q += " WHERE " + " AND ".join(conds)
-        cur.execute(q, params)
-        return float(cur.fetchone()[0])
+        cur.execute(q, params + params_pag + [limit, offset])
+        resultado = cur.fetchall()
+    total_registros, suma = resultado[0][0], resultado[0][1] / 100
+    # LEFT JOIN: si la página está vacía llega una sola fila con NULLs
+    filas = [r[2:] for r in resultado if r[2] is not None]
+    return filas, total_registros, suma
 
 def obtener_boletas_todas():
     with _conn() as conn:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT id, cliente, tipo_item, kilos, cantidad, servicio, perfumado, precio, fecha, metodo_pago, estado "
-            "FROM boletas ORDER BY fecha DESC, id DESC"
-        )
+        cur.execute(f"{_select_boletas(FiltroBoletas())[0]} ORDER BY fecha DESC, id DESC")
         return cur.fetchall()
 
+def iter_boletas(cliente=None, fecha_desde=None, fecha_hasta=None, lote=500):
+    """Genera las filas de 'boletas' por lotes (fetchmany) sin cargar toda la tabla en memoria,
+    incluidas las particiones archivadas del rango. La conexión queda abierta mientras se consume
+    el generador y se cierra al terminar."""
+    filtro = FiltroBoletas(cliente, fecha_desde, fecha_hasta)
+    conn = _abrir()  # conexión propia: el generador puede vivir más que la petición
+    try:
+        esquemas = _adjuntar(conn, _particiones(conn, fecha_desde, fecha_hasta))
+        sql, params = _union_boletas(filtro, esquemas)
+        cur = conn.cursor()
+        cur.execute(f"{sql} ORDER BY fecha DESC, id DESC", params)
+        while True:
+            filas = cur.fetchmany(lote)
+            if not filas:
+                break
+            yield from filas
+    finally:
+        conn.close()
+
 # ====== NUEVA API (Boleta con múltiples items) ======
 def insertar_boleta_compuesta(cabecera: dict, items: list[dict]) -> int:
     """
@@ -157,6 +580,7 @@ def insertar_boleta_compuesta(cabecera: dict, items: list[dict]) -> int:
     items: lista de dicts con keys: descripcion, tipo, prendas, kilos, lavado, secado, p_unit, importe
     Return: boleta_id (int)
     """
+    cabecera = _al_centavo(cabecera, _MONTOS_CABECERA)
     with _conn() as conn:
         cur = conn.cursor()
         cur.execute(
@@ -171,55 +595,265 @@ def insertar_boleta_compuesta(cabecera: dict, items: list[dict]) -> int:
         boleta_id = cur.lastrowid
 
         for it in items:
-            it = {**it, "boleta_id": boleta_id}
+            it = {"recargo": 0, **_al_centavo(it, _MONTOS_ITEM), "boleta_id": boleta_id}
             cur.execute(
                 """
-                INSERT INTO boleta_items (boleta_id, descripcion, tipo, prendas, kilos, lavado, p_unit, importe, perfumado)
-                VALUES (:boleta_id, :descripcion, :tipo, CASE WHEN :tipo = 'kilo' THEN 0 ELSE :cantidad END, CASE WHEN :tipo = 'kilo' THEN :cantidad ELSE 0 END, :lavado, :p_unit, :importe, :perfumado)
+                INSERT INTO boleta_items (boleta_id, descripcion, tipo, prendas, kilos, lavado, p_unit, recargo, importe, perfumado)
+                VALUES (:boleta_id, :descripcion, :tipo, CASE WHEN :tipo = 'kilo' THEN 0 ELSE :cantidad END, CASE WHEN :tipo = 'kilo' THEN :cantidad ELSE 0 END, :lavado, :p_unit, :recargo, :importe, :perfumado)
                 """,
                 it
             )
+        _registrar_clientes(cur, [cabecera])
+        _incrementar_contador(cur, VERSION_BOLETAS)
         conn.commit()
         return boleta_id
 
-def obtener_boletas_cabecera(limit=20, offset=0, cliente=None, fecha_desde=None, fecha_hasta=None):
+def insertar_boletas_lote(entradas: list[dict]) -> list[tuple]:
+    """
+    Inserta un lote de boletas en UNA transacción (executemany para cabeceras e items).
+    entradas: lista de dicts con keys: clave (idempotencia, o None si no hace falta), cabecera, items
+    Return: lista de (clave, boleta_id, duplicado) en el mismo orden de entrada.
+    """
+    conn = _conn()
+    with conn:
+        cur = conn.cursor()
+        # IMMEDIATE: tomamos el lock de escritura desde el inicio, así los IDs que asignamos
+        # abajo no pueden ser ocupados por otro proceso a mitad del lote.
+        cur.execute("BEGIN IMMEDIATE")
+        claves = list(dict.fromkeys(e["clave"] for e in entradas if e["clave"] is not None))
+        existentes = {}
+        for i in range(0, len(claves), 500):
+            trozo = claves[i:i + 500]
+            cur.execute(
+                f"SELECT clave, boleta_id FROM boleta_idempotencia WHERE clave IN ({','.join('?' * len(trozo))})",
+                trozo,
+            )
+            existentes.update(cur.fetchall())
+
+        cur.execute(
+            "SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'boleta'), 0), "
+            "COALESCE((SELECT MAX(id) FROM boleta), 0))"
+        )
+        siguiente = cur.fetchone()[0] + 1
+        # Número de cambio de cada boleta nueva (migración 10): se asigna aquí en bloque en vez
+        # de dejarlo al trigger, que haría un UPDATE por boleta
+        cur.execute("SELECT COALESCE((SELECT valor FROM contadores WHERE nombre = 'cambios'), 0)")
+        cambio = cur.fetchone()[0]
+
+        resultados, cabeceras, items, asignadas = [], [], [], {}
+        for e in entradas:
+            clave = e["clave"]
+            if clave in existentes:
+                resultados.append((clave, existentes[clave], True))
+                continue
+            if clave in asignadas:  # misma clave repetida dentro del lote
+                resultados.append((clave, asignadas[clave], True))
+                continue
+            boleta_id = siguiente
+            siguiente += 1
+            if clave is not None:
+                asignadas[clave] = boleta_id
+            cambio += 1
+            cabeceras.append({**_al_centavo(e["cabecera"], _MONTOS_CABECERA), "id": boleta_id, "cambio": cambio})
+            items += [{"recargo": 0, **_al_centavo(it, _MONTOS_ITEM), "boleta_id": boleta_id} for it in e["items"]]
+            resultados.append((clave, boleta_id, False))
+
+        cur.executemany(
+            """
+            INSERT INTO boleta (id, numero, cliente, direccion, telefono, fecha, entrega_fecha, entrega_hora,
+                                metodo_pago, estado, a_cuenta, saldo, total, notas, cambio)
+            VALUES (:id, :numero, :cliente, :direccion, :telefono, :fecha, :entrega_fecha, :entrega_hora,
+                    :metodo_pago, :estado, :a_cuenta, :saldo, :total, :notas, :cambio)
+            """,
+            cabeceras
+        )
+        if cabeceras:
+            cur.execute("UPDATE contadores SET valor = ? WHERE nombre = 'cambios'", (cambio,))
+        cur.executemany(
+            """
+            INSERT INTO boleta_items (boleta_id, descripcion, tipo, prendas, kilos, lavado, p_unit, recargo, importe, perfumado)
+            VALUES (:boleta_id, :descripcion, :tipo, CASE WHEN :tipo = 'kilo' THEN 0 ELSE :cantidad END, CASE WHEN :tipo = 'kilo' THEN :cantidad ELSE 0 END, :lavado, :p_unit, :recargo, :importe, :perfumado)
+            """,
+            items
+        )
+        cur.executemany(
+            "INSERT INTO boleta_idempotencia (clave, boleta_id) VALUES (?, ?)",
+            list(asignadas.items())
+        )
+        _registrar_clientes(cur, cabeceras)
+        if cabeceras:
+            _incrementar_contador(cur, VERSION_BOLETAS)
+    return resultados
+
+def obtener_boletas_cabecera(limit=20, offset=0, cliente=None, fecha_desde=None, fecha_hasta=None, despues_de=None):
+    """Igual que obtener_boletas_paginado pero sobre la tabla 'boleta' (cabeceras)."""
+    where, params = FiltroBoletas(cliente, fecha_desde, fecha_hasta).where(despues_de)
+    if despues_de:
+        offset = 0
     with _conn() as conn:
         cur = conn.cursor()
-        q = ("SELECT id, numero, cliente, fecha, entrega_fecha, entrega_hora, metodo_pago, estado, a_cuenta, saldo, total "
-             "FROM boleta")
-        params, conds = [], []
-        if cliente:
-            conds.append("cliente LIKE ?"); params.append(f"%{cliente}%")
-        if fecha_desde:
-            conds.append("date(substr(fecha,1,10)) >= date(?)"); params.append(fecha_desde)
-        if fecha_hasta:
-            conds.append("date(substr(fecha,1,10)) <= date(?)"); params.append(fecha_hasta)
-        if conds: q += " WHERE " + " AND ".join(conds)
-        q += " ORDER BY date(substr(fecha,1,10)) DESC, id DESC LIMIT ? OFFSET ?"
-        params += [limit, offset]
-        cur.execute(q, params)
+        cur.execute(
+            "SELECT id, numero, cliente, fecha, entrega_fecha, entrega_hora, metodo_pago, estado, a_cuenta, saldo, total "
+            f"FROM boleta{where} ORDER BY fecha DESC, id DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        )
         return cur.fetchall()
 
+_COLS_DETALLE = ("id, numero, cliente, direccion, telefono, fecha, entrega_fecha, entrega_hora, "
+                 "metodo_pago, estado, a_cuenta, saldo, total, notas")
+
 def obtener_boleta_detalle(boleta_id: int):
     """Devuelve (cabecera, items[])"""
+    _, cab, items = obtener_boletas_detalle([boleta_id]).get(boleta_id, (None, None, []))
+    return cab, items
+
+def obtener_boletas_detalle(ids) -> dict:
+    """Cabecera + items de varias boletas con una consulta IN (...) para cada tabla.
+    Return: {id: (cambio, cabecera, items[])}; los ids inexistentes no aparecen."""
+    ids = list(dict.fromkeys(ids))
+    resultado = {}
+    conn = _conn()
+    _detalle_de(conn, "main", ids, resultado)
+    faltan = [i for i in ids if i not in resultado]
+    if faltan:
+        por_anio = {}
+        for boleta_id, anio in _en_trozos(conn, "SELECT id, anio FROM boleta_archivada WHERE id IN ({})", faltan):
+            por_anio.setdefault(anio, []).append(boleta_id)
+        if por_anio:
+            marcas = ",".join("?" * len(por_anio))
+            _adjuntar(conn, conn.execute(
+                f"SELECT anio, archivo, hasta FROM particiones WHERE anio IN ({marcas})", list(por_anio)
+            ).fetchall())
+            for anio, ids_anio in por_anio.items():
+                _detalle_de(conn, f"archivo_{anio}", ids_anio, resultado)
+    return resultado
+
+def _en_trozos(conn, sql, ids, trozo=500):
+    """Ejecuta 'sql' con IN ({}) para los ids en trozos de hasta 500 parámetros."""
+    filas = []
+    for i in range(0, len(ids), trozo):
+        parte = ids[i:i + trozo]
+        filas += conn.execute(sql.format(",".join("?" * len(parte))), parte).fetchall()
+    return filas
+
+def _detalle_de(conn, esquema, ids, resultado):
+    with conn:
+        cur = conn.cursor()
+        for i in range(0, len(ids), 500):
+            trozo = ids[i:i + 500]
+            marcas = ",".join("?" * len(trozo))
+            for cambio, *cab in cur.execute(
+                f"SELECT cambio, {_COLS_DETALLE} FROM {esquema}.boleta WHERE id IN ({marcas})", trozo
+            ):
+                resultado[cab[0]] = (cambio, tuple(cab), [])
+            for boleta_id, *item in cur.execute(
+                f"""
+                SELECT boleta_id, id, descripcion, tipo,
+                       CASE WHEN tipo = 'kilo' THEN kilos ELSE prendas END as cantidad,
+                       lavado, p_unit, importe, perfumado
+                FROM {esquema}.boleta_items WHERE boleta_id IN ({marcas}) ORDER BY boleta_id, id ASC
+                """,
+                trozo,
+            ):
+                if boleta_id in resultado:
+                    resultado[boleta_id][2].append(tuple(item))
+
+def cambios_de(ids) -> dict:
+    """{id: cambio} de las boletas pedidas (búsqueda por clave primaria; para validar cachés).
+    Las archivadas no cambian: su número queda en boleta_archivada, sin abrir la partición."""
+    ids = list(dict.fromkeys(ids))
     with _conn() as conn:
+        resultado = dict(_en_trozos(conn, "SELECT id, cambio FROM boleta WHERE id IN ({})", ids))
+        faltan = [i for i in ids if i not in resultado]
+        if faltan:
+            resultado.update(_en_trozos(conn, "SELECT id, cambio FROM boleta_archivada WHERE id IN ({})", faltan))
+    return resultado
+
+# ====== Exportación incremental ======
+_COLS_CAMBIO = ("id, cambio, numero, fecha, cliente, telefono, direccion, entrega_fecha, entrega_hora, "
+                "metodo_pago, estado, a_cuenta, saldo, total, notas")
+
+def hasta_cambio(desde=0, limite=None):
+    """Último número de cambio a exportar: el de la fila 'limite' después de 'desde' (o el último).
+    Solo lee el índice de 'cambio'. Return: desde si no hay nada nuevo."""
+    sql, params = "SELECT cambio FROM boleta WHERE cambio > ? ORDER BY cambio", [desde]
+    if limite:
+        sql += " LIMIT ?"; params.append(limite)
+    with _conn() as conn:
+        fila = conn.execute(f"SELECT MAX(cambio) FROM ({sql})", params).fetchone()
+    return fila[0] if fila[0] is not None else desde
+
+def iter_cambios(desde, hasta, lote=500):
+    """Boletas nuevas o modificadas con desde < cambio <= hasta, en orden de cambio, con sus items.
+    Genera (cabecera, items) por lotes; conexión propia como iter_boletas. Las boletas borradas
+    no aparecen."""
+    conn = _abrir()
+    try:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT id, numero, cliente, direccion, telefono, fecha, entrega_fecha, entrega_hora, "
-            "metodo_pago, estado, a_cuenta, saldo, total, notas "
-            "FROM boleta WHERE id = ?",
-            (boleta_id,)
-        )
-        cab = cur.fetchone()
+        while desde < hasta:
+            cabeceras = cur.execute(
+                f"SELECT {_COLS_CAMBIO} FROM boleta WHERE cambio > ? AND cambio <= ? ORDER BY cambio LIMIT ?",
+                (desde, hasta, lote),
+            ).fetchall()
+            if not cabeceras:
+                break
+            items = {}
+            ids = [c[0] for c in cabeceras]
+            for fila in cur.execute(
+                "SELECT boleta_id, descripcion, tipo, CASE WHEN tipo = 'kilo' THEN kilos ELSE prendas END, "
+                f"lavado, p_unit, importe, perfumado FROM boleta_items WHERE boleta_id IN ({','.join('?' * len(ids))}) "
+                "ORDER BY id",
+                ids,
+            ):
+                items.setdefault(fila[0], []).append(fila[1:])
+            for cab in cabeceras:
+                yield cab, items.get(cab[0], [])
+            desde = cabeceras[-1][1]
+    finally:
+        conn.close()
 
-        cur.execute(
-            """
-            SELECT id, descripcion, tipo,
-                   CASE WHEN tipo = 'kilo' THEN kilos ELSE prendas END as cantidad,
-                   lavado, p_unit, importe, perfumado
-            FROM boleta_items WHERE boleta_id = ? ORDER BY id ASC
-            """,
-            (boleta_id,)
-        )
-        items = cur.fetchall()
-        return cab, items
+# ====== Estados y tablero de entregas ======
+ESTADOS = ("registrado", "lavando", "listo", "entregado")
+_SIGUIENTE_ESTADO = dict(zip(ESTADOS, ESTADOS[1:]))
+_COLS_TABLERO = "id, numero, cliente, telefono, entrega_fecha, entrega_hora, estado, saldo"
+
+def cambiar_estado(boleta_id: int, estado: str):
+    """Avanza la boleta un paso: registrado -> lavando -> listo -> entregado. Repetir el estado
+    actual no hace nada (reintentos). Return: estado anterior, o None si la boleta no existe.
+    Lanza ValueError si el paso no es válido."""
+    if estado not in ESTADOS:
+        raise ValueError(f"estado inválido: {estado}")
+    conn = _conn()
+    with conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        fila = cur.execute("SELECT estado FROM boleta WHERE id = ?", (boleta_id,)).fetchone()
+        if fila is None:
+            return None
+        anterior = fila[0]
+        if estado == anterior:
+            return anterior
+        if _SIGUIENTE_ESTADO.get(anterior) != estado:
+            raise ValueError(f"no se puede pasar de {anterior} a {estado}")
+        cur.execute("UPDATE boleta SET estado = ? WHERE id = ?", (estado, boleta_id))
+        _incrementar_contador(cur, VERSION_BOLETAS)
+        return anterior
+
+_PENDIENTES_TABLERO = " UNION ALL ".join(
+    f"SELECT {_COLS_TABLERO} FROM boleta WHERE estado = '{estado}' AND entrega_fecha > '' AND entrega_fecha <= :hoy"
+    for estado in ("registrado", "lavando")
+) + " ORDER BY entrega_fecha, entrega_hora LIMIT :limite"
+
+def tablero(hoy: str, limite=500):
+    """Boletas en proceso con fecha prometida hasta 'hoy' ('YYYY-MM-DD') y las que están listas;
+    cada boleta sale en una sola lista. Cada estado es un rango ya ordenado del índice (estado,
+    entrega_fecha, entrega_hora): SQLite los intercala sin el B-tree temporal de 'estado IN (...)'.
+    Return: (pendientes, listas) ordenadas por fecha y hora de entrega."""
+    with _conn() as conn:
+        cur = conn.cursor()
+        pendientes = cur.execute(_PENDIENTES_TABLERO, {"hoy": hoy, "limite": limite}).fetchall()
+        listas = cur.execute(
+            f"SELECT {_COLS_TABLERO} FROM boleta WHERE estado = 'listo' ORDER BY entrega_fecha, entrega_hora LIMIT ?",
+            (limite,),
+        ).fetchall()
+    return pendientes, listas
@@ -0,0 +1,110 @@
+"""Genera una base de datos sintética (y reproducible) para benchmarks.
+
+Uso: python datos_sinteticos.py --db /tmp/lavanderia_bench.db --boletas 100000 [--semilla 42]
+
+Crea boletas con sus items y el directorio de clientes, repartidas en los últimos años.
+Nunca usar sobre la base real.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+NOMBRES = ["María", "José", "Ana", "Luis", "Rosa", "Carlos", "Lucía", "Jorge", "Carmen", "Pedro",
+           "Elena", "Miguel", "Sofía", "Juan", "Isabel", "Raúl", "Patricia", "Víctor", "Julia", "Andrés"]
+APELLIDOS = ["Ríos", "Quispe", "Flores", "Sánchez", "Rojas", "Díaz", "Torres", "Mendoza", "Huamán",
+             "Castillo", "Vargas", "Ramírez", "Chávez", "Núñez", "Espinoza", "Peña", "Cruz", "Salazar"]
+METODOS = ["efectivo", "efectivo", "efectivo", "yape", "yape", "plin", "tarjeta"]
+ESTADOS = ["entregado"] * 8 + ["listo", "lavando", "registrado"]
+TIPOS = [("kilo", "Kilos", 3.5), ("kilo", "Kilos", 3.5), ("edredon", "Edredón", 15.0),
+         ("terno", "Terno", 20.0), ("otro", "Frazada", 12.0)]
+LAVADOS = ["Normal", "Normal", "Normal", "Seco", "A mano"]
+
+
+def generar(db_path, boletas=100_000, clientes=None, anios=3, semilla=42, lote=5_000, progreso=True):
+    """Llena db_path (se crea si no existe) con 'boletas' boletas. Return: segundos empleados."""
+    os.environ["LAVA_DB_PATH"] = db_path
+    import database
+    database.DB_PATH = db_path
+    database.crear_bd()
+
+    rnd = random.Random(semilla)
+    clientes = clientes or max(10, boletas // 8)
+    padron = [
+        (f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}",
+         f"9{rnd.randrange(10**8):08d}",
+         f"Jr. {rnd.choice(APELLIDOS)} {rnd.randint(100, 2000)}, Huánuco")
+        for _ in range(clientes)
+    ]
+    fin = datetime.now().replace(microsecond=0)
+    segundos_rango = int(timedelta(days=365 * anios).total_seconds())
+
+    conn = database._conn()
+    cur = conn.cursor()
+    siguiente_id = (cur.execute("SELECT COALESCE(MAX(id), 0) FROM boleta").fetchone()[0]) + 1
+    cambio = database.leer_contador("cambios")
+    t0 = time.perf_counter()
+    hechas = 0
+    while hechas < boletas:
+        n = min(lote, boletas - hechas)
+        # fechas crecientes dentro del lote para imitar el orden real de inserción
+        fechas = sorted(fin - timedelta(seconds=rnd.randrange(segundos_rango)) for _ in range(n))
+        cabeceras, items = [], []
+        for fecha in fechas:
+            nombre, telefono, direccion = rnd.choice(padron)
+            boleta_id = siguiente_id
+            siguiente_id += 1
+            cambio += 1
+            total = 0.0
+            for _ in range(rnd.choice((1, 1, 1, 2, 2, 3, 4))):
+                tipo, desc, precio = rnd.choice(TIPOS)
+                cantidad = round(rnd.uniform(1, 9), 1) if tipo == "kilo" else rnd.randint(1, 3)
+                perfumado = 1 if rnd.random() < 0.3 else 0
+                importe = round(cantidad * precio, 2)
+                total += importe
+                items.append((boleta_id, desc, tipo, 0 if tipo == "kilo" else cantidad,
+                              cantidad if tipo == "kilo" else 0, rnd.choice(LAVADOS), precio, importe, perfumado))
+            total = round(total, 2)
+            a_cuenta = round(total * rnd.choice((0, 0, 0.5, 1)), 2)
+            f = fecha.strftime("%Y-%m-%d %H:%M:%S")
+            entrega = (fecha + timedelta(days=rnd.randint(1, 3))).strftime("%Y-%m-%d")
+            metodo, estado = rnd.choice(METODOS), rnd.choice(ESTADOS)
+            cabeceras.append((boleta_id, nombre, direccion, telefono, f, entrega, rnd.choice(("10:00", "17:00", "19:00")),
+                              metodo, estado, a_cuenta, round(total - a_cuenta, 2), total, "", cambio))
+        with conn:
+            cur.executemany(
+                "INSERT INTO boleta (id, cliente, direccion, telefono, fecha, entrega_fecha, entrega_hora, "
+                "metodo_pago, estado, a_cuenta, saldo, total, notas, cambio) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+                cabeceras,
+            )
+            cur.executemany(
+                "INSERT INTO boleta_items (boleta_id, descripcion, tipo, prendas, kilos, lavado, p_unit, importe, perfumado) "
+                "VALUES (?,?,?,?,?,?,?,?,?)",
+                items,
+            )
+            # número de cambio asignado arriba (sin él, el trigger haría un UPDATE por boleta)
+            cur.execute("UPDATE contadores SET valor = ? WHERE nombre = 'cambios'", (cambio,))
+        hechas += n
+        if progreso:
+            print(f"  {hechas}/{boletas} boletas", file=sys.stderr)
+    database.reconstruir_clientes()
+    conn.execute("ANALYZE")
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--db", required=True, help="archivo SQLite de destino (no la base real)")
+    ap.add_argument("--boletas", type=int, default=100_000)
+    ap.add_argument("--clientes", type=int, default=None, help="por defecto boletas/8")
+    ap.add_argument("--anios", type=int, default=3)
+    ap.add_argument("--semilla", type=int, default=42)
+    args = ap.parse_args()
+    seg = generar(args.db, args.boletas, args.clientes, args.anios, args.semilla)
+    print(f"{args.boletas} boletas en {seg:.1f} s ({args.boletas / seg:,.0f}/s) -> {args.db}")
+
+
+if __name__ == "__main__":
+    main()
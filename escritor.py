@@ -0,0 +1,121 @@
+"""Escritor único de boletas con group commit.
+
+Las peticiones no escriben en SQLite: encolan su trabajo (una o varias boletas) y esperan el
+resultado. Un hilo por proceso junta lo que haya en la cola (hasta LAVA_ESCRITOR_LOTE boletas
+o LAVA_ESCRITOR_ESPERA_MS de espera) y lo guarda en UNA transacción con
+database.insertar_boletas_lote. Así, en hora punta, N peticiones toman el lock de escritura una
+vez en lugar de N (o 2N), y con varios workers de gunicorn la contención es entre pocos lotes.
+
+Si la cola está llena (LAVA_ESCRITOR_COLA trabajos) enviar() falla rápido con EscritorOcupado
+en vez de acumular peticiones colgadas. Cada trabajo lleva la medición de SQL de su petición
+(metricas.py): el tiempo del lote se atribuye al endpoint que esperó por él.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent import futures
+
+import database
+import metricas
+
+MAX_LOTE = int(os.getenv("LAVA_ESCRITOR_LOTE", "64"))             # boletas por transacción
+ESPERA_MS = float(os.getenv("LAVA_ESCRITOR_ESPERA_MS", "5"))      # espera máx. para llenar el lote
+MAX_COLA = int(os.getenv("LAVA_ESCRITOR_COLA", "500"))            # trabajos pendientes (backpressure)
+TIMEOUT_S = float(os.getenv("LAVA_ESCRITOR_TIMEOUT", "15"))       # espera máx. de quien envía
+REINTENTOS = 3                                                    # si otro proceso tiene el lock
+
+log = logging.getLogger("lavanderia.escritor")
+
+
+class EscritorOcupado(Exception):
+    """La cola de escritura está llena o el lote no se guardó a tiempo."""
+
+
+class Escritor:
+    def __init__(self, max_lote=MAX_LOTE, espera_ms=ESPERA_MS, max_cola=MAX_COLA):
+        self.max_lote = max_lote
+        self.espera = espera_ms / 1000
+        self._cola = queue.Queue(maxsize=max_cola)
+        self._lock = threading.Lock()
+        self._pid = None
+        self.lotes = self.boletas = 0
+
+    def _arrancar(self):
+        # Un hilo por proceso: tras el fork de gunicorn el hilo del padre no existe en el hijo
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._cola = queue.Queue(maxsize=self._cola.maxsize)
+                threading.Thread(target=self._bucle, name="escritor-boletas", daemon=True).start()
+                self._pid = os.getpid()
+
+    def enviar(self, entradas, timeout=TIMEOUT_S):
+        """Encola entradas de insertar_boletas_lote (se guardan juntas, en la misma transacción).
+        Return: lista de (clave, boleta_id, duplicado), igual que insertar_boletas_lote."""
+        self._arrancar()
+        futuro = futures.Future()
+        try:
+            self._cola.put_nowait((list(entradas), futuro, metricas.medicion_actual()))
+        except queue.Full:
+            raise EscritorOcupado("demasiadas boletas en espera, intenta de nuevo")
+        try:
+            return futuro.result(timeout=timeout)
+        except futures.TimeoutError:
+            raise EscritorOcupado("la boleta no se guardó a tiempo, revisa antes de reenviar")
+
+    def _juntar(self):
+        """Bloquea hasta el primer trabajo y suma los que lleguen antes del límite de lote/espera."""
+        trabajos = [self._cola.get()]
+        n = len(trabajos[0][0])
+        limite = time.perf_counter() + self.espera
+        while n < self.max_lote:
+            resta = limite - time.perf_counter()
+            try:
+                trabajo = self._cola.get(timeout=resta) if resta > 0 else self._cola.get_nowait()
+            except queue.Empty:
+                break
+            trabajos.append(trabajo)
+            n += len(trabajo[0])
+        return trabajos
+
+    def _bucle(self):
+        while True:
+            trabajos = self._juntar()
+            try:
+                self._guardar(trabajos)
+            except Exception as e:
+                if len(trabajos) == 1:
+                    trabajos[0][1].set_exception(e)
+                    continue
+                # Un trabajo inválido no debe tumbar a los demás: se reintenta cada uno solo
+                for trabajo in trabajos:
+                    try:
+                        self._guardar([trabajo])
+                    except Exception as e_trabajo:
+                        trabajo[1].set_exception(e_trabajo)
+
+    def _guardar(self, trabajos):
+        entradas = [e for trabajo, _, _ in trabajos for e in trabajo]
+        with metricas.medir_para([medicion for _, _, medicion in trabajos]):
+            for intento in range(REINTENTOS):
+                try:
+                    resultados = database.insertar_boletas_lote(entradas)
+                    break
+                except sqlite3.OperationalError as e:
+                    if "locked" not in str(e) or intento == REINTENTOS - 1:
+                        raise
+                    log.warning("BD bloqueada por otro proceso, reintento %d", intento + 1)
+                    time.sleep(0.05 * (intento + 1))
+        self.lotes += 1
+        self.boletas += len(entradas)
+        inicio = 0
+        for trabajo, futuro, _ in trabajos:
+            futuro.set_result(resultados[inicio:inicio + len(trabajo)])
+            inicio += len(trabajo)
+
+
+escritor = Escritor()
@@ -0,0 +1,163 @@
+"""Archivos estáticos con huella de contenido, precomprimidos, y service worker del shell (PWA).
+
+- Al arrancar se lee static/ una vez: cada archivo recibe una huella (hash del contenido) y los
+  de texto (css, js, svg...) se comprimen con gzip y, si está instalado el paquete brotli, br.
+- url_for('static', filename=...) agrega ?v=<huella>. Con esa huella el archivo se sirve con
+  'Cache-Control: immutable' por un año: en visitas repetidas el navegador no pide nada.
+  Si el archivo cambia, cambia la URL.
+- /sw.js es un service worker generado que precachea los estáticos y las páginas del shell
+  (inicio y formulario de boleta nueva) para que abran al instante, también sin conexión.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import Response, request, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ACTIVOS = os.getenv("LAVA_ESTATICOS", "1") == "1"
+UN_ANIO = 365 * 24 * 3600
+MIN_COMPRIMIR = 512    # bytes; por debajo no compensa
+_COMPRIMIBLES = (".css", ".js", ".mjs", ".json", ".webmanifest", ".svg", ".html", ".txt", ".map", ".ico")
+PAGINAS_SHELL = ("home", "boleta_nueva")    # endpoints que el service worker guarda
+
+_activos = {}    # ruta relativa a static/ -> Activo
+
+
+class Activo:
+    def __init__(self, ruta_abs, nombre):
+        with open(ruta_abs, "rb") as f:
+            contenido = f.read()
+        self.huella = hashlib.sha256(contenido).hexdigest()[:12]
+        self.mimetype = mimetypes.guess_type(nombre)[0] or "application/octet-stream"
+        self.variantes = {}    # codificación -> bytes; vacío = lo sirve Flask desde disco
+        if nombre.lower().endswith(_COMPRIMIBLES):
+            self.variantes["identity"] = contenido
+            if len(contenido) >= MIN_COMPRIMIR:
+                self.variantes["gzip"] = gzip.compress(contenido, 9, mtime=0)
+                if brotli is not None:
+                    self.variantes["br"] = brotli.compress(contenido, quality=11)
+
+
+def _leer_estaticos(carpeta):
+    activos = {}
+    for raiz, _, archivos in os.walk(carpeta):
+        for archivo in archivos:
+            ruta_abs = os.path.join(raiz, archivo)
+            nombre = os.path.relpath(ruta_abs, carpeta).replace(os.sep, "/")
+            activos[nombre] = Activo(ruta_abs, nombre)
+    return activos
+
+
+def version():
+    """Huella de todos los estáticos juntos: nombre de la caché del service worker."""
+    huellas = json.dumps(sorted((nombre, a.huella) for nombre, a in _activos.items()))
+    return hashlib.sha256(huellas.encode("utf-8")).hexdigest()[:12]
+
+
+def _agregar_huella(endpoint, valores):
+    if endpoint == "static" and "v" not in valores:
+        activo = _activos.get(valores.get("filename"))
+        if activo is not None:
+            valores["v"] = activo.huella
+
+
+def _codificacion(activo):
+    for cod in ("br", "gzip"):
+        if cod in activo.variantes and request.accept_encodings[cod]:
+            return cod
+    return "identity"
+
+
+def _servir(app, filename):
+    activo = _activos.get(filename)
+    if activo is None or not activo.variantes:
+        respuesta = app.send_static_file(filename)
+    else:
+        cod = _codificacion(activo)
+        respuesta = Response(activo.variantes[cod], mimetype=activo.mimetype)
+        if cod != "identity":
+            respuesta.headers["Content-Encoding"] = cod
+        respuesta.vary.add("Accept-Encoding")
+        respuesta.set_etag(f"{activo.huella}-{cod}")
+        respuesta.make_conditional(request)
+    if activo is not None and request.args.get("v") == activo.huella:
+        respuesta.cache_control.public = True
+        respuesta.cache_control.max_age = UN_ANIO
+        respuesta.cache_control.immutable = True
+    else:
+        # Sin huella (o con una vieja) la URL puede servir otro contenido mañana: revalidar
+        respuesta.cache_control.no_cache = True
+    return respuesta
+
+
+_SW = """\
+const CACHE = "lava-%(version)s";
+const SHELL = %(shell)s;
+const PRECACHE = SHELL.concat(%(estaticos)s);
+
+self.addEventListener("install", (e) => {
+  e.waitUntil(caches.open(CACHE).then((c) => c.addAll(PRECACHE)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener("activate", (e) => {
+  e.waitUntil(
+    caches.keys()
+      .then((ks) => Promise.all(ks.filter((k) => k.startsWith("lava-") && k !== CACHE).map((k) => caches.delete(k))))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener("fetch", (e) => {
+  const req = e.request;
+  const url = new URL(req.url);
+  if (req.method !== "GET" || url.origin !== location.origin) return;
+  if (url.pathname.startsWith("%(prefijo)s")) {
+    // Con huella el contenido de una URL nunca cambia: caché primero
+    e.respondWith(caches.match(req).then((r) => r || fetch(req)));
+  } else if (SHELL.includes(url.pathname)) {
+    // Shell: se muestra lo guardado al instante y se actualiza en segundo plano
+    e.respondWith(caches.open(CACHE).then((c) => c.match(url.pathname).then((guardada) => {
+      const red = fetch(req).then((r) => {
+        if (r.ok) c.put(url.pathname, r.clone());
+        return r;
+      }).catch(() => guardada);
+      return guardada || red;
+    })));
+  }
+});
+"""
+
+
+def service_worker(app):
+    shell = [url_for(endpoint) for endpoint in PAGINAS_SHELL]
+    estaticos = [url_for("static", filename=nombre) for nombre in sorted(_activos)]
+    return _SW % dict(
+        version=version(),
+        shell=json.dumps(shell),
+        estaticos=json.dumps(estaticos),
+        prefijo=app.static_url_path.rstrip("/") + "/",
+    )
+
+
+def instalar(app):
+    """Lee y comprime static/, agrega la huella a url_for('static') y registra /sw.js."""
+    if not ACTIVOS:
+        return
+    if app.static_folder and os.path.isdir(app.static_folder):
+        _activos.update(_leer_estaticos(app.static_folder))
+    app.url_defaults(_agregar_huella)
+    app.view_functions["static"] = lambda filename: _servir(app, filename)
+
+    @app.route("/sw.js")
+    def service_worker_js():
+        respuesta = Response(service_worker(app), mimetype="application/javascript")
+        respuesta.cache_control.no_cache = True    # el navegador revisa si hay versión nueva
+        respuesta.headers["Service-Worker-Allowed"] = "/"
+        return respuesta
@@ -0,0 +1,261 @@
+"""Importa boletas históricas (CSV o JSON lines) en lotes grandes, reanudable.
+
+Uso: python importar.py archivo.csv|archivo.jsonl [--lote 5000] [--diferir-indices]
+
+JSON lines: una boleta por línea, con sus ítems:
+  {"numero": "7601", "fecha": "2021-03-05 10:20", "cliente": "Ana Ríos", "telefono": "987654321",
+   "metodo_pago": "efectivo", "estado": "entregado", "a_cuenta": 0,
+   "items": [{"descripcion": "Kilos", "tipo": "kilo", "cantidad": 3, "p_unit": 3.5}]}
+CSV: un ítem por fila; las filas seguidas con el mismo (numero, fecha, cliente) forman una boleta.
+  Columnas: numero, fecha, cliente, telefono, direccion, entrega_fecha, entrega_hora, metodo_pago,
+  estado, a_cuenta, notas, descripcion, tipo, cantidad, lavado, p_unit, importe, perfumado
+
+Cada boleta lleva una clave de idempotencia sacada de su contenido ya normalizado (no del nombre
+ni de la posición en el archivo): renombrar el archivo, agregarle filas al final o importar dos
+exportaciones que se solapan no duplica boletas. El avance se guarda en la tabla 'importaciones':
+si el proceso se cae, volver a ejecutar el mismo comando continúa donde quedó. Las filas
+inválidas van a <archivo>.rechazados.jsonl.
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from itertools import groupby
+
+import database
+
+FORMATOS_FECHA = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%d/%m/%Y %H:%M", "%d/%m/%Y")
+CAMPOS_CABECERA = ("numero", "fecha", "cliente", "telefono", "direccion", "entrega_fecha", "entrega_hora",
+                   "metodo_pago", "estado", "a_cuenta", "notas")
+
+
+def _num(valor, campo, defecto=0.0):
+    if valor is None or valor == "":
+        return defecto
+    try:
+        n = float(str(valor).replace(",", "."))
+    except ValueError:
+        raise ValueError(f"{campo} no es un número: {valor!r}")
+    if n < 0:
+        raise ValueError(f"{campo} negativo: {valor!r}")
+    return n
+
+
+def _fecha(valor):
+    texto = str(valor or "").strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            pass
+    raise ValueError(f"fecha inválida: {valor!r}")
+
+
+def validar(reg):
+    """Registro crudo -> (cabecera, items) con el formato de insertar_boletas_lote. Lanza ValueError."""
+    cliente = str(reg.get("cliente") or "").strip()
+    if not cliente:
+        raise ValueError("falta cliente")
+    fecha = _fecha(reg.get("fecha"))
+    items, total = [], 0.0
+    for it in reg.get("items") or []:
+        cantidad = _num(it.get("cantidad"), "cantidad", 1.0)
+        p_unit = _num(it.get("p_unit"), "p_unit", None)
+        importe = _num(it.get("importe"), "importe", None)
+        if importe is None and p_unit is None:
+            raise ValueError("ítem sin p_unit ni importe")
+        if importe is None:
+            importe = round(cantidad * p_unit, 2)
+        if p_unit is None:
+            p_unit = round(importe / cantidad, 2) if cantidad else importe
+        tipo = str(it.get("tipo") or "otro").strip().lower()
+        total += importe
+        items.append(dict(
+            descripcion=str(it.get("descripcion") or tipo.capitalize()).strip(), tipo=tipo,
+            cantidad=cantidad, lavado=str(it.get("lavado") or "Normal").strip(),
+            perfumado=1 if str(it.get("perfumado") or "0").strip().lower() in ("1", "true", "si", "sí") else 0,
+            p_unit=p_unit, importe=round(importe, 2),
+        ))
+    if not items:
+        raise ValueError("boleta sin ítems")
+    total = round(total, 2)
+    a_cuenta = _num(reg.get("a_cuenta"), "a_cuenta", 0.0)
+    cabecera = dict(
+        numero=str(reg.get("numero") or "").strip() or None, cliente=cliente,
+        direccion=str(reg.get("direccion") or "").strip(), telefono=str(reg.get("telefono") or "").strip(),
+        fecha=fecha, entrega_fecha=str(reg.get("entrega_fecha") or ""), entrega_hora=str(reg.get("entrega_hora") or ""),
+        metodo_pago=str(reg.get("metodo_pago") or "efectivo").strip(),
+        estado=str(reg.get("estado") or "entregado").strip(),  # histórico: por defecto ya entregado
+        a_cuenta=a_cuenta, saldo=round(total - a_cuenta, 2), total=total,
+        notas=str(reg.get("notas") or "").strip(),
+    )
+    return cabecera, items
+
+
+def leer_jsonl(ruta):
+    with open(ruta, encoding="utf-8-sig") as f:
+        for linea in f:
+            if linea.strip():
+                try:
+                    yield json.loads(linea)
+                except json.JSONDecodeError as e:
+                    yield {"_error": f"JSON inválido: {e}"}
+
+
+def leer_csv(ruta):
+    with open(ruta, encoding="utf-8-sig", newline="") as f:
+        filas = csv.DictReader(f)
+        for _, grupo in groupby(filas, key=lambda r: (r.get("numero"), r.get("fecha"), r.get("cliente"))):
+            grupo = list(grupo)
+            reg = {k: grupo[0].get(k) for k in CAMPOS_CABECERA}
+            reg["items"] = [r for r in grupo if r.get("descripcion") or r.get("tipo") or r.get("importe") or r.get("p_unit")]
+            yield reg
+
+
+def _clave(cabecera, items, vistas):
+    """Clave de idempotencia: sha1 de la boleta normalizada + cuántas veces salió ese mismo
+    contenido en el archivo ('vistas'), para que dos boletas idénticas se importen las dos."""
+    contenido = json.dumps([cabecera, items], sort_keys=True, ensure_ascii=False)
+    h = hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:24]
+    vistas[h] = n = vistas.get(h, 0) + 1
+    return f"imp:{h}:{n}"
+
+
+def _huella(ruta):
+    """Identifica el archivo (inicio y tamaño) solo para saber desde qué registro reanudar;
+    si cambia se relee desde el principio y las claves por contenido saltan lo ya importado."""
+    h = hashlib.sha1()
+    with open(ruta, "rb") as f:
+        h.update(f.read(1 << 20))
+    return f"{os.path.basename(ruta)}:{os.path.getsize(ruta)}:{h.hexdigest()[:16]}"
+
+
+def _suspender_indices(conn, guardado):
+    """Quita índices secundarios y triggers de las tablas de boletas. Su SQL queda en 'guardado'
+    (crear_bd ya no los recrea: la base sigue marcada con la última versión del esquema)."""
+    if os.path.exists(guardado):  # una corrida anterior se cayó con los índices ya quitados
+        with open(guardado, encoding="utf-8") as f:
+            return len(json.load(f))
+    filas = conn.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE sql IS NOT NULL AND type IN ('index', 'trigger') "
+        "AND tbl_name IN ('boleta', 'boleta_items')"
+    ).fetchall()
+    with open(guardado, "w", encoding="utf-8") as f:
+        json.dump([sql for _, _, sql in filas], f, ensure_ascii=False, indent=1)
+    with conn:
+        for tipo, nombre, _ in filas:
+            conn.execute(f"DROP {tipo.upper()} IF EXISTS {nombre}")
+    return len(filas)
+
+
+def _reconstruir(conn, guardado):
+    t = time.perf_counter()
+    with open(guardado, encoding="utf-8") as f:
+        sentencias = json.load(f)
+    with conn:
+        for sql in sentencias:
+            conn.execute(sql.replace("CREATE INDEX ", "CREATE INDEX IF NOT EXISTS ", 1)
+                         .replace("CREATE TRIGGER ", "CREATE TRIGGER IF NOT EXISTS ", 1))
+    os.remove(guardado)
+    database.reconstruir_fts()
+    database.reconstruir_resumen()
+    database.reconstruir_clientes()
+    return time.perf_counter() - t
+
+
+def importar(ruta, lote=5000, diferir_indices=False, salida=sys.stderr):
+    database.crear_bd()
+    conn = database._conn()
+    huella = _huella(ruta)
+    fila = conn.execute("SELECT registros FROM importaciones WHERE archivo = ?", (huella,)).fetchone()
+    hechos = fila[0] if fila else 0
+    if hechos:
+        print(f"Reanudando desde el registro {hechos}", file=salida)
+    guardado = ruta + ".indices.json"
+    if diferir_indices:
+        n = _suspender_indices(conn, guardado)
+        print(f"Índices y triggers suspendidos: {n} (se reconstruyen al final)", file=salida)
+
+    registros = leer_jsonl(ruta) if ruta.lower().endswith((".jsonl", ".ndjson", ".json")) else leer_csv(ruta)
+    rechazos_ruta = ruta + ".rechazados.jsonl"
+    rechazados = importadas = duplicadas = 0
+    entradas = []
+    t0 = ultimo_reporte = time.perf_counter()
+    posicion = 0
+    vistas = {}
+
+    def volcar(posicion):
+        nonlocal importadas, duplicadas
+        if entradas:
+            for _, _, dup in database.insertar_boletas_lote(entradas):
+                if dup: duplicadas += 1
+                else: importadas += 1
+            entradas.clear()
+        with conn:
+            conn.execute(
+                "INSERT INTO importaciones (archivo, registros, tamano, actualizado) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (archivo) DO UPDATE SET registros = excluded.registros, actualizado = excluded.actualizado",
+                (huella, posicion, os.path.getsize(ruta), datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+
+    with open(rechazos_ruta, "a", encoding="utf-8") as rechazos:
+        pendientes = 0
+        for posicion, reg in enumerate(registros, 1):
+            # Lo ya hecho también se valida: las repeticiones de cada contenido cuentan desde el inicio
+            try:
+                if "_error" in reg:
+                    raise ValueError(reg["_error"])
+                cabecera, items = validar(reg)
+                clave, error = _clave(cabecera, items, vistas), None
+            except ValueError as e:
+                error = str(e)
+            if posicion <= hechos:
+                continue
+            if error is None:
+                entradas.append(dict(clave=clave, cabecera=cabecera, items=items))
+            else:
+                rechazados += 1
+                rechazos.write(json.dumps({"registro": posicion, "error": error, "datos": reg},
+                                          ensure_ascii=False, default=str) + "\n")
+            pendientes += 1
+            if pendientes >= lote:
+                volcar(posicion)
+                pendientes = 0
+                ahora = time.perf_counter()
+                if ahora - ultimo_reporte >= 5:
+                    ultimo_reporte = ahora
+                    print(f"  {importadas:,} boletas ({importadas / (ahora - t0):,.0f}/s)", file=salida)
+        volcar(max(posicion, hechos))
+
+    seg_carga = time.perf_counter() - t0
+    diferir_indices = diferir_indices or os.path.exists(guardado)  # quedaron suspendidos de antes
+    seg_indices = _reconstruir(conn, guardado) if diferir_indices else 0.0
+    if not rechazados and os.path.getsize(rechazos_ruta) == 0:
+        os.remove(rechazos_ruta)
+    print(
+        f"Importadas: {importadas:,}  duplicadas (ya importadas): {duplicadas:,}  rechazadas: {rechazados:,}\n"
+        f"Carga: {seg_carga:.1f} s ({importadas / seg_carga if seg_carga else 0:,.0f} boletas/s)"
+        + (f"  reconstrucción de índices: {seg_indices:.1f} s" if diferir_indices else ""),
+        file=salida,
+    )
+    if rechazados:
+        print(f"Detalle de rechazos: {rechazos_ruta}", file=salida)
+    return importadas, duplicadas, rechazados
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("archivo")
+    ap.add_argument("--lote", type=int, default=5000, help="boletas por transacción")
+    ap.add_argument("--diferir-indices", action="store_true",
+                    help="quitar índices/triggers durante la carga y reconstruirlos al final (no usar la app mientras tanto)")
+    args = ap.parse_args()
+    importar(args.archivo, args.lote, args.diferir_indices)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Métricas de la app en formato Prometheus (GET /metrics).
+
+- Latencia y conteo de cada petición por endpoint (siempre; cuesta dos perf_counter).
+- Nº y tiempo de consultas SQL atribuidos a la petición, solo en una muestra de peticiones
+  (LAVA_METRICAS_MUESTREO, 0..1) para poder dejarlo encendido en producción. El tiempo incluye
+  la lectura de las filas y las escrituras que el hilo de escritor.py hace por la petición.
+- Consultas más lentas que LAVA_SQL_LENTA_MS se registran en el log con su EXPLAIN QUERY PLAN.
+
+Con varios workers de gunicorn cada proceso expone sus propios contadores.
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+import database
+
+ACTIVAS = os.getenv("LAVA_METRICAS", "1") == "1"
+MUESTREO = float(os.getenv("LAVA_METRICAS_MUESTREO", "0.1"))
+SQL_LENTA_MS = float(os.getenv("LAVA_SQL_LENTA_MS", "200"))
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+log = logging.getLogger("lavanderia.sql")
+
+_lock = threading.Lock()
+_peticiones = {}     # (endpoint, método, status) -> n
+_latencias = {}      # endpoint -> [cuenta por bucket..., +Inf, suma]
+_sql = {}            # endpoint -> [peticiones muestreadas, consultas, segundos]
+_sql_lentas = [0]
+_local = threading.local()  # _local.medicion = [consultas, segundos] de la petición muestreada
+
+
+# ------------------- Conexiones medidas -------------------
+def medicion_actual():
+    """[consultas, segundos] de la petición en curso si está en la muestra, si no None."""
+    return getattr(_local, "medicion", None)
+
+
+@contextmanager
+def medir_para(mediciones):
+    """Mide el SQL que este hilo corre dentro del bloque y lo suma a cada medición (de
+    medicion_actual() en el hilo de la petición). Un lote compartido cuenta entero para cada
+    petición: todas esperaron la transacción completa."""
+    mediciones = [m for m in mediciones if m is not None]
+    if not mediciones:
+        yield
+        return
+    anterior, _local.medicion = getattr(_local, "medicion", None), [0, 0.0]
+    try:
+        yield
+    finally:
+        propia, _local.medicion = _local.medicion, anterior
+        for m in mediciones:
+            m[0] += propia[0]
+            m[1] += propia[1]
+
+
+def _registrar_lenta(conn, sql, params, seg):
+    with _lock:
+        _sql_lentas[0] += 1
+    plan = ""
+    if sql.lstrip().upper().startswith(("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")):
+        try:
+            filas = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+            plan = "\n".join(f"    {fila[-1]}" for fila in filas)
+        except sqlite3.Error as e:
+            plan = f"    (sin plan: {e})"
+    log.warning("SQL lenta (%.1f ms): %s\n%s", seg * 1000, " ".join(sql.split()), plan)
+
+
+_siguiente = sqlite3.Cursor.__next__
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Mide execute() y también la lectura de las filas: SQLite hace casi todo el trabajo de un
+    SELECT al ir pidiendo filas (fetch*, iteración), no en execute()."""
+    _sql = _params = None
+    _seg = 0.0   # tiempo acumulado de la sentencia actual (para el log de SQL lenta)
+
+    def _medir(self, llamar, consulta=False):
+        medicion = getattr(_local, "medicion", None)
+        t = time.perf_counter()
+        try:
+            return llamar()
+        finally:
+            seg = time.perf_counter() - t
+            if medicion is not None:
+                medicion[0] += consulta
+                medicion[1] += seg
+            ya_lenta = self._seg * 1000 >= SQL_LENTA_MS
+            self._seg += seg
+            if not ya_lenta and self._seg * 1000 >= SQL_LENTA_MS:
+                _registrar_lenta(self.connection, self._sql, self._params, self._seg)
+
+    def execute(self, sql, params=()):
+        self._sql, self._params, self._seg = sql, params, 0.0
+        return self._medir(lambda: super(CursorMedido, self).execute(sql, params), consulta=True)
+
+    def executemany(self, sql, seq):
+        self._sql, self._params, self._seg = sql, None, 0.0
+        return self._medir(lambda: super(CursorMedido, self).executemany(sql, seq), consulta=True)
+
+    def fetchone(self):
+        return self._medir(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._medir(lambda: super(CursorMedido, self).fetchmany(self.arraysize if size is None else size))
+
+    def fetchall(self):
+        return self._medir(super().fetchall)
+
+    def __next__(self):
+        # Fila a fila el reloj pesa: fuera de la muestra solo se miden execute y fetch*
+        if getattr(_local, "medicion", None) is None:
+            return _siguiente(self)
+        return self._medir(super().__next__)
+
+
+class ConexionMedida(database.Conexion):
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        return self.cursor().executemany(sql, seq)
+
+
+# ------------------- Peticiones -------------------
+def _antes():
+    g._metricas_t0 = time.perf_counter()
+    _local.medicion = [0, 0.0] if random.random() < MUESTREO else None
+
+
+def _despues(resp):
+    t0 = g.pop("_metricas_t0", None)
+    if t0 is None:
+        return resp
+    seg = time.perf_counter() - t0
+    endpoint = request.endpoint or "sin_ruta"
+    medicion, _local.medicion = _local.medicion, None
+    with _lock:
+        clave = (endpoint, request.method, resp.status_code)
+        _peticiones[clave] = _peticiones.get(clave, 0) + 1
+        h = _latencias.setdefault(endpoint, [0] * (len(BUCKETS) + 2))
+        for i, limite in enumerate(BUCKETS):
+            if seg <= limite:
+                h[i] += 1
+        h[len(BUCKETS)] += 1      # +Inf
+        h[len(BUCKETS) + 1] += seg  # suma
+        if medicion is not None:
+            s = _sql.setdefault(endpoint, [0, 0, 0.0])
+            s[0] += 1
+            s[1] += medicion[0]
+            s[2] += medicion[1]
+    return resp
+
+
+def exposicion():
+    """Texto en formato de exposición de Prometheus."""
+    lineas = []
+    with _lock:
+        lineas += ["# HELP lavanderia_http_requests_total Peticiones atendidas.",
+                   "# TYPE lavanderia_http_requests_total counter"]
+        for (endpoint, metodo, status), n in sorted(_peticiones.items()):
+            lineas.append(f'lavanderia_http_requests_total{{endpoint="{endpoint}",method="{metodo}",status="{status}"}} {n}')
+        lineas += ["# HELP lavanderia_http_request_duration_seconds Latencia hasta el primer byte.",
+                   "# TYPE lavanderia_http_request_duration_seconds histogram"]
+        for endpoint, h in sorted(_latencias.items()):
+            for limite, n in zip(BUCKETS, h):
+                lineas.append(f'lavanderia_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{limite}"}} {n}')
+            lineas.append(f'lavanderia_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {h[len(BUCKETS)]}')
+            lineas.append(f'lavanderia_http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {h[len(BUCKETS) + 1]:.6f}')
+            lineas.append(f'lavanderia_http_request_duration_seconds_count{{endpoint="{endpoint}"}} {h[len(BUCKETS)]}')
+        lineas += ["# HELP lavanderia_sql_sampled_requests_total Peticiones con SQL medido (muestra).",
+                   "# TYPE lavanderia_sql_sampled_requests_total counter",
+                   "# HELP lavanderia_sql_queries_total Consultas SQL en las peticiones muestreadas.",
+                   "# TYPE lavanderia_sql_queries_total counter",
+                   "# HELP lavanderia_sql_query_seconds_total Tiempo en SQL en las peticiones muestreadas.",
+                   "# TYPE lavanderia_sql_query_seconds_total counter"]
+        for endpoint, (n, consultas, seg) in sorted(_sql.items()):
+            lineas.append(f'lavanderia_sql_sampled_requests_total{{endpoint="{endpoint}"}} {n}')
+            lineas.append(f'lavanderia_sql_queries_total{{endpoint="{endpoint}"}} {consultas}')
+            lineas.append(f'lavanderia_sql_query_seconds_total{{endpoint="{endpoint}"}} {seg:.6f}')
+        lineas += ["# HELP lavanderia_sql_slow_queries_total Consultas sobre el umbral de SQL lenta.",
+                   "# TYPE lavanderia_sql_slow_queries_total counter",
+                   f"lavanderia_sql_slow_queries_total {_sql_lentas[0]}",
+                   "# HELP lavanderia_sql_sample_ratio Fracción de peticiones con SQL medido.",
+                   "# TYPE lavanderia_sql_sample_ratio gauge",
+                   f"lavanderia_sql_sample_ratio {MUESTREO}"]
+    return "\n".join(lineas) + "\n"
+
+
+def instalar(app):
+    """Registra el middleware y /metrics. Llamar antes de abrir conexiones (antes de crear_bd)."""
+    if not ACTIVAS:
+        return
+    database.FABRICA_CONEXION = ConexionMedida
+    app.before_request(_antes)
+    app.after_request(_despues)
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(exposicion(), mimetype="text/plain; version=0.0.4; charset=utf-8")
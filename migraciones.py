@@ -0,0 +1,807 @@
+"""Migraciones del esquema, numeradas y sin borrar datos.
+
+La versión aplicada se guarda en PRAGMA user_version. crear_bd()/migrar() compara esa versión
+con len(MIGRACIONES): si la base ya está al día no ejecuta ningún DDL (el arranque de cada
+worker es una sola lectura del pragma). Para cambiar el esquema se AGREGA una función al final
+de MIGRACIONES; nunca se edita ni se reordena una ya publicada. Por eso cada migración lleva su
+propio SQL: no llama a funciones de database.py, que cambian con el esquema.
+
+Uso: python migraciones.py            (aplica las pendientes y muestra la versión)
+"""
+import fcntl
+import sqlite3
+import sys
+
+import database
+
+# Filas por transacción en los rellenos de tablas grandes
+LOTE = 5000
+
+
+def version_actual(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _columnas(cur, tabla):
+    return {fila[1] for fila in cur.execute(f"PRAGMA table_info({tabla})")}
+
+
+def _en_lotes(conn, tabla, asignaciones, lote=LOTE):
+    """UPDATE por rangos de rowid, con commit entre lotes, para no bloquear al escritor."""
+    maximo = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {tabla}").fetchone()[0]
+    for inicio in range(0, maximo, lote):
+        with conn:
+            conn.execute(f"UPDATE {tabla} SET {asignaciones} WHERE rowid > ? AND rowid <= ?",
+                         (inicio, inicio + lote))
+
+
+def por_lotes(fn):
+    """Marca una migración que maneja sus propias transacciones (debe ser repetible)."""
+    fn.por_lotes = True
+    return fn
+
+
+class _Cerrojo:
+    """Lock de archivo junto a la BD ('<bd>-migrar'): un solo proceso migra a la vez. Las
+    migraciones por lotes hacen commit entre lotes, así que BEGIN IMMEDIATE no alcanza para que dos
+    workers no copien las mismas filas. Si el proceso muere, el sistema suelta el lock."""
+    def __init__(self, conn):
+        ruta = conn.execute("PRAGMA database_list").fetchone()[2]
+        self._f = open(ruta + "-migrar", "w") if ruta else None  # BD en memoria: no hace falta
+
+    def __enter__(self):
+        if self._f:
+            fcntl.flock(self._f, fcntl.LOCK_EX)   # espera a que termine el que está migrando
+        return self
+
+    def __exit__(self, *exc):
+        if self._f:
+            self._f.close()   # suelta el lock
+
+
+# ====== 1: esquema base ======
+def m001_esquema_base(cur):
+    """Tablas originales. Con IF NOT EXISTS: las bases creadas antes de las migraciones no cambian."""
+    # ===== Esquema ORIGINAL (lo mantenemos para compatibilidad) =====
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS boletas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cliente TEXT NOT NULL,
+            tipo_item TEXT NOT NULL,
+            kilos REAL DEFAULT 0,
+            cantidad INTEGER DEFAULT 0,
+            servicio TEXT DEFAULT 'normal',
+            perfumado INTEGER DEFAULT 0,
+            precio REAL NOT NULL,
+            fecha TEXT NOT NULL,
+            metodo_pago TEXT DEFAULT 'efectivo',
+            estado TEXT DEFAULT 'registrado'
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_boletas_cliente ON boletas(cliente)")
+
+    # ===== NUEVO ESQUEMA (Cabecera + Items) =====
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS boleta (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero TEXT,                  -- opcional: correlativo impreso (N° 007601)
+            cliente TEXT NOT NULL,
+            direccion TEXT,
+            telefono TEXT,
+            fecha TEXT NOT NULL,          -- fecha de emisión
+            entrega_fecha TEXT,           -- fecha prometida
+            entrega_hora TEXT,            -- hora prometida (ej. '17:00')
+            metodo_pago TEXT DEFAULT 'efectivo',
+            estado TEXT DEFAULT 'registrado',
+            a_cuenta REAL DEFAULT 0,      -- pago parcial
+            saldo REAL DEFAULT 0,
+            total REAL DEFAULT 0,         -- total de la boleta (suma items)
+            notas TEXT                    -- observaciones (ej. 'Martes 5 pm')
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_boleta_cliente ON boleta(cliente)")
+
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS boleta_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            boleta_id INTEGER NOT NULL REFERENCES boleta(id) ON DELETE CASCADE,
+            descripcion TEXT,             -- 'Frazadas', 'Edredón', 'Kilos', etc.
+            tipo TEXT,                    -- kilos | edredon | terno | otro
+            prendas INTEGER DEFAULT 0,    -- nº de prendas (para terno/edredón)
+            kilos REAL DEFAULT 0,         -- para servicio por kilos
+            lavado TEXT,                  -- 'Normal', 'Seco', 'A mano'...
+            secado TEXT,                  -- 'Secadora', 'Tendedero'...
+            p_unit REAL DEFAULT 0,        -- precio unitario (por kilo o por prenda)
+            importe REAL DEFAULT 0,       -- subtotal del item
+            perfumado INTEGER DEFAULT 0   -- si está perfumado (1) o no (0)
+        )
+        """
+    )
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_bitems_boleta ON boleta_items(boleta_id)")
+
+
+# ====== 2: columnas que fix_db.py / recreate_db.py crearon distinto ======
+@por_lotes
+def m002_reconciliar_columnas(conn):
+    """fix_db.py dejaba boletas(cantidad REAL, lavado) y boleta_items(cantidad): se agregan las
+    columnas que usa la app y se copian los datos por lotes (los UPDATE son repetibles)."""
+    cur = conn.cursor()
+    with conn:
+        for tabla, columnas in (
+            ("boletas", (("kilos", "REAL DEFAULT 0"), ("servicio", "TEXT DEFAULT 'normal'"))),
+            ("boleta_items", (("prendas", "INTEGER DEFAULT 0"), ("kilos", "REAL DEFAULT 0"), ("secado", "TEXT"))),
+        ):
+            existentes = _columnas(cur, tabla)
+            for col, tipo in columnas:
+                if col not in existentes:
+                    cur.execute(f"ALTER TABLE {tabla} ADD COLUMN {col} {tipo}")
+    if "lavado" in _columnas(cur, "boletas"):
+        _en_lotes(conn, "boletas",
+                  "servicio = COALESCE(lavado, 'normal'), "
+                  "kilos = CASE WHEN tipo_item IN ('kilo', 'kilos') THEN cantidad ELSE kilos END")
+    if "cantidad" in _columnas(cur, "boleta_items"):
+        _en_lotes(conn, "boleta_items",
+                  "kilos = CASE WHEN tipo = 'kilo' THEN cantidad ELSE 0 END, "
+                  "prendas = CASE WHEN tipo = 'kilo' THEN 0 ELSE cantidad END")
+
+
+# ====== 3: índices (fecha, id) para rangos y paginación por cursor ======
+def m003_indices_fecha_id(cur):
+    # (fecha, id): filtros por rango y paginación por cursor sin ordenar en memoria
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_boletas_fecha_id ON boletas(fecha, id)")
+    cur.execute("DROP INDEX IF EXISTS idx_boletas_fecha")  # prefijo redundante del anterior
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_boleta_fecha_id ON boleta(fecha, id)")
+    cur.execute("DROP INDEX IF EXISTS idx_boleta_fecha")
+
+
+# ====== 4: idempotencia del envío en lote ======
+def m004_idempotencia(cur):
+    # Claves de idempotencia de los envíos en lote (reintentos de la PWA no duplican)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS boleta_idempotencia (
+            clave TEXT PRIMARY KEY,
+            boleta_id INTEGER NOT NULL REFERENCES boleta(id) ON DELETE CASCADE
+        ) WITHOUT ROWID
+        """
+    )
+
+
+# ====== 5: resumen diario de ingresos ======
+# 'total', 'metodo_pago' y 'estado' siguen a la tabla 'boletas' (la que suma total_periodo);
+# 'tipo' sigue a boleta_items usando la fecha de su cabecera.
+_UPSERT_RESUMEN = (
+    " ON CONFLICT (dia, dimension, valor) DO UPDATE SET "
+    "boletas = boletas + excluded.boletas, monto = monto + excluded.monto"
+)
+
+def _resumen_boletas_sql(ref, signo):
+    return (
+        "INSERT INTO resumen_diario (dia, dimension, valor, boletas, monto) VALUES "
+        f"(substr({ref}.fecha,1,10), 'total', '', {signo}1, {signo}{ref}.precio), "
+        f"(substr({ref}.fecha,1,10), 'metodo_pago', COALESCE({ref}.metodo_pago,''), {signo}1, {signo}{ref}.precio), "
+        f"(substr({ref}.fecha,1,10), 'estado', COALESCE({ref}.estado,''), {signo}1, {signo}{ref}.precio)"
+        + _UPSERT_RESUMEN + ";"
+    )
+
+def _resumen_item_sql(ref, signo):
+    return (
+        "INSERT INTO resumen_diario (dia, dimension, valor, boletas, monto) "
+        f"SELECT substr(b.fecha,1,10), 'tipo', COALESCE({ref}.tipo,''), {signo}1, {signo}{ref}.importe "
+        f"FROM boleta b WHERE b.id = {ref}.boleta_id"
+        + _UPSERT_RESUMEN + ";"
+    )
+
+def _resumen_items_de_boleta_sql(dia, signo):
+    return (
+        "INSERT INTO resumen_diario (dia, dimension, valor, boletas, monto) "
+        f"SELECT substr({dia},1,10), 'tipo', COALESCE(tipo,''), {signo}COUNT(1), {signo}SUM(importe) "
+        "FROM boleta_items WHERE boleta_id = NEW.id GROUP BY COALESCE(tipo,'')"
+        + _UPSERT_RESUMEN + ";"
+    )
+
+_TRIGGERS_RESUMEN = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_boletas_ins AFTER INSERT ON boletas
+        BEGIN {_resumen_boletas_sql("NEW", "")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_boletas_del AFTER DELETE ON boletas
+        BEGIN {_resumen_boletas_sql("OLD", "-")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_boletas_upd AFTER UPDATE OF fecha, precio, metodo_pago, estado ON boletas
+        BEGIN {_resumen_boletas_sql("OLD", "-")} {_resumen_boletas_sql("NEW", "")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_items_ins AFTER INSERT ON boleta_items
+        BEGIN {_resumen_item_sql("NEW", "")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_items_del AFTER DELETE ON boleta_items
+        BEGIN {_resumen_item_sql("OLD", "-")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_items_upd AFTER UPDATE OF tipo, importe, boleta_id ON boleta_items
+        BEGIN {_resumen_item_sql("OLD", "-")} {_resumen_item_sql("NEW", "")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_boleta_fecha AFTER UPDATE OF fecha ON boleta
+        WHEN substr(OLD.fecha,1,10) IS NOT substr(NEW.fecha,1,10)
+        BEGIN {_resumen_items_de_boleta_sql("OLD.fecha", "-")} {_resumen_items_de_boleta_sql("NEW.fecha", "")} END""",
+]
+
+
+def _llenar_resumen(cur, tabla, col_total, col_resumen, col_importe):
+    """Recalcula resumen_diario desde 'tabla' (cabeceras) y boleta_items, con los nombres de
+    columna del esquema de la migración que llama."""
+    cur.execute("DELETE FROM resumen_diario")
+    for dimension, valor in (("total", "''"), ("metodo_pago", "COALESCE(metodo_pago,'')"),
+                             ("estado", "COALESCE(estado,'')")):
+        cur.execute(
+            f"INSERT INTO resumen_diario (dia, dimension, valor, boletas, {col_resumen}) "
+            f"SELECT substr(fecha,1,10), '{dimension}', {valor}, COUNT(1), COALESCE(SUM({col_total}),0) "
+            f"FROM {tabla} GROUP BY 1, 3"
+        )
+    cur.execute(
+        f"INSERT INTO resumen_diario (dia, dimension, valor, boletas, {col_resumen}) "
+        f"SELECT substr(b.fecha,1,10), 'tipo', COALESCE(i.tipo,''), COUNT(1), COALESCE(SUM(i.{col_importe}),0) "
+        "FROM boleta_items i JOIN boleta b ON b.id = i.boleta_id GROUP BY 1, 3"
+    )
+
+
+def m005_resumen_diario(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS resumen_diario (
+            dia TEXT NOT NULL,            -- 'YYYY-MM-DD'
+            dimension TEXT NOT NULL,      -- total | metodo_pago | estado | tipo
+            valor TEXT NOT NULL,          -- '' para total; 'yape', 'registrado', 'kilo'...
+            boletas INTEGER NOT NULL DEFAULT 0,  -- nº de boletas (o de items para 'tipo')
+            monto REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, dimension, valor)
+        ) WITHOUT ROWID
+        """
+    )
+    for sql in _TRIGGERS_RESUMEN:
+        cur.execute(sql)
+    _llenar_resumen(cur, "boletas", "precio", "monto", "importe")
+
+
+# ====== 6: búsqueda FTS5 ======
+# Índices de texto "external content": el texto vive en la tabla original, el índice solo
+# guarda los tokens. unicode61 + remove_diacritics quita tildes al indexar y al buscar.
+_FTS_TABLAS = {
+    "boleta": ("cliente", "telefono", "notas"),
+    "boletas": ("cliente",),  # la quita m011 ('boletas' pasa a ser una vista)
+}
+
+def _crear_fts(cur):
+    """Crea los índices FTS5 y sus triggers. Devuelve False si este SQLite no tiene FTS5."""
+    for tabla, columnas in _FTS_TABLAS.items():
+        fts = f"{tabla}_fts"
+        existe = cur.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,)).fetchone()
+        cols = ", ".join(columnas)
+        new_cols = ", ".join(f"new.{c}" for c in columnas)
+        old_cols = ", ".join(f"old.{c}" for c in columnas)
+        try:
+            cur.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"{cols}, content='{tabla}', content_rowid='id', "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+        except sqlite3.OperationalError:
+            return False
+        cur.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{fts}_ins AFTER INSERT ON {tabla} BEGIN
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols}); END"""
+        )
+        cur.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{fts}_del AFTER DELETE ON {tabla} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END"""
+        )
+        cur.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{fts}_upd AFTER UPDATE OF {cols} ON {tabla} BEGIN
+                INSERT INTO {fts} ({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                INSERT INTO {fts} (rowid, {cols}) VALUES (new.id, {new_cols}); END"""
+        )
+        if not existe:  # índice recién creado sobre datos existentes
+            cur.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    return True
+
+
+def m006_busqueda_fts(cur):
+    _crear_fts(cur)
+    database._FTS_DISPONIBLE.clear()
+
+
+# ====== 7: directorio de clientes ======
+def m007_clientes(cur):
+    # ===== Directorio de clientes (clave: teléfono normalizado) =====
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS clientes (
+            telefono TEXT PRIMARY KEY,    -- normalizado: '51' + dígitos
+            nombre TEXT NOT NULL,         -- último nombre usado
+            direccion TEXT,
+            boletas INTEGER NOT NULL DEFAULT 0,   -- acumulados de toda la vida
+            total REAL NOT NULL DEFAULT 0,
+            primera_fecha TEXT,
+            ultima_fecha TEXT
+        ) WITHOUT ROWID
+        """
+    )
+    # Contadores de cambios (los cachés en memoria comparan contra ellos)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS contadores (
+            nombre TEXT PRIMARY KEY,
+            valor INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        """
+    )
+    _llenar_clientes(cur)
+
+
+def _llenar_clientes(cur, lote=1000):
+    """Acumulados por teléfono de todas las boletas (esquema de la versión 7)."""
+    acumulado = {}
+    cur.execute(
+        "SELECT cliente, direccion, telefono, fecha, total FROM boleta "
+        "WHERE COALESCE(telefono,'') <> '' ORDER BY fecha, id"
+    )
+    while True:
+        filas = cur.fetchmany(lote)
+        if not filas:
+            break
+        for nombre, direccion, telefono, fecha, total in filas:
+            tel = database.normalizar_telefono(telefono)
+            if not tel:
+                continue
+            c = acumulado.setdefault(tel, dict(telefono=tel, direccion="", boletas=0, total=0.0,
+                                                primera_fecha=fecha))
+            c["nombre"] = nombre
+            c["direccion"] = direccion or c["direccion"]
+            c["boletas"] += 1
+            c["total"] += total or 0
+            c["ultima_fecha"] = fecha
+    cur.execute("DELETE FROM clientes")
+    cur.executemany(
+        "INSERT INTO clientes (telefono, nombre, direccion, boletas, total, primera_fecha, ultima_fecha) "
+        "VALUES (:telefono, :nombre, :direccion, :boletas, :total, :primera_fecha, :ultima_fecha)",
+        list(acumulado.values()),
+    )
+    cur.execute("INSERT INTO contadores (nombre, valor) VALUES ('clientes', 1) "
+                "ON CONFLICT (nombre) DO UPDATE SET valor = valor + 1")
+
+
+# ====== 8: avance de importaciones ======
+def m008_importaciones(cur):
+    # Avance de las importaciones masivas (importar.py), para reanudar tras una caída
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS importaciones (
+            archivo TEXT PRIMARY KEY,
+            registros INTEGER NOT NULL DEFAULT 0,   -- boletas ya procesadas del archivo
+            tamano INTEGER,
+            actualizado TEXT
+        ) WITHOUT ROWID
+        """
+    )
+
+
+# ====== 9: montos en centavos enteros y día como entero ======
+# Columnas generadas VIRTUAL (no ocupan espacio, ALTER TABLE las agrega sin reescribir la tabla):
+# *_c = monto en centavos, dia = días desde 1970-01-01. database.py redondea al centavo al escribir,
+# así que *_c es exacto, y toda suma o filtro por rango se hace sobre enteros indexados.
+_DIA_SQL = "CAST(julianday(substr(fecha,1,10)) - 2440587.5 AS INTEGER)"
+_COLUMNAS_CENTAVOS = {
+    "boletas": ("precio",),
+    "boleta": ("total", "a_cuenta", "saldo"),
+    "boleta_items": ("p_unit", "importe"),
+}
+
+def _resumen_centavos_boletas_sql(ref, signo):
+    return (
+        "INSERT INTO resumen_diario (dia, dimension, valor, boletas, centavos) VALUES "
+        f"(substr({ref}.fecha,1,10), 'total', '', {signo}1, {signo}{ref}.precio_c), "
+        f"(substr({ref}.fecha,1,10), 'metodo_pago', COALESCE({ref}.metodo_pago,''), {signo}1, {signo}{ref}.precio_c), "
+        f"(substr({ref}.fecha,1,10), 'estado', COALESCE({ref}.estado,''), {signo}1, {signo}{ref}.precio_c)"
+        + _UPSERT_CENTAVOS + ";"
+    )
+
+def _resumen_centavos_item_sql(ref, signo):
+    return (
+        "INSERT INTO resumen_diario (dia, dimension, valor, boletas, centavos) "
+        f"SELECT substr(b.fecha,1,10), 'tipo', COALESCE({ref}.tipo,''), {signo}1, {signo}{ref}.importe_c "
+        f"FROM boleta b WHERE b.id = {ref}.boleta_id"
+        + _UPSERT_CENTAVOS + ";"
+    )
+
+def _resumen_centavos_items_de_boleta_sql(dia, signo):
+    return (
+        "INSERT INTO resumen_diario (dia, dimension, valor, boletas, centavos) "
+        f"SELECT substr({dia},1,10), 'tipo', COALESCE(tipo,''), {signo}COUNT(1), {signo}SUM(importe_c) "
+        "FROM boleta_items WHERE boleta_id = NEW.id GROUP BY COALESCE(tipo,'')"
+        + _UPSERT_CENTAVOS + ";"
+    )
+
+_UPSERT_CENTAVOS = (
+    " ON CONFLICT (dia, dimension, valor) DO UPDATE SET "
+    "boletas = boletas + excluded.boletas, centavos = centavos + excluded.centavos"
+)
+
+_TRIGGERS_RESUMEN_CENTAVOS = [
+    f"""CREATE TRIGGER trg_resumen_boletas_ins AFTER INSERT ON boletas
+        BEGIN {_resumen_centavos_boletas_sql("NEW", "")} END""",
+    f"""CREATE TRIGGER trg_resumen_boletas_del AFTER DELETE ON boletas
+        BEGIN {_resumen_centavos_boletas_sql("OLD", "-")} END""",
+    f"""CREATE TRIGGER trg_resumen_boletas_upd AFTER UPDATE OF fecha, precio, metodo_pago, estado ON boletas
+        BEGIN {_resumen_centavos_boletas_sql("OLD", "-")} {_resumen_centavos_boletas_sql("NEW", "")} END""",
+    f"""CREATE TRIGGER trg_resumen_items_ins AFTER INSERT ON boleta_items
+        BEGIN {_resumen_centavos_item_sql("NEW", "")} END""",
+    f"""CREATE TRIGGER trg_resumen_items_del AFTER DELETE ON boleta_items
+        BEGIN {_resumen_centavos_item_sql("OLD", "-")} END""",
+    f"""CREATE TRIGGER trg_resumen_items_upd AFTER UPDATE OF tipo, importe, boleta_id ON boleta_items
+        BEGIN {_resumen_centavos_item_sql("OLD", "-")} {_resumen_centavos_item_sql("NEW", "")} END""",
+    f"""CREATE TRIGGER trg_resumen_boleta_fecha AFTER UPDATE OF fecha ON boleta
+        WHEN substr(OLD.fecha,1,10) IS NOT substr(NEW.fecha,1,10)
+        BEGIN {_resumen_centavos_items_de_boleta_sql("OLD.fecha", "-")} {_resumen_centavos_items_de_boleta_sql("NEW.fecha", "")} END""",
+]
+
+
+def m009_centavos_y_dia(cur):
+    for tabla, montos in _COLUMNAS_CENTAVOS.items():
+        existentes = _columnas(cur, tabla)
+        for col in montos:
+            if f"{col}_c" not in existentes:
+                cur.execute(f"ALTER TABLE {tabla} ADD COLUMN {col}_c INTEGER "
+                            f"GENERATED ALWAYS AS (CAST(round({col} * 100) AS INTEGER)) VIRTUAL")
+        if tabla != "boleta_items" and "dia" not in existentes:
+            cur.execute(f"ALTER TABLE {tabla} ADD COLUMN dia INTEGER GENERATED ALWAYS AS ({_DIA_SQL}) VIRTUAL")
+    # Sumas por rango de días: recorren solo este índice
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_boletas_dia ON boletas(dia, precio_c)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_boleta_dia ON boleta(dia, total_c)")
+
+    # resumen_diario: 'monto' REAL acumulaba error de redondeo con cada trigger; ahora 'centavos'
+    for sql in _TRIGGERS_RESUMEN:
+        nombre = sql.split()[5]  # CREATE TRIGGER IF NOT EXISTS <nombre> ...
+        cur.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+    cur.execute("DROP TABLE IF EXISTS resumen_diario")
+    cur.execute(
+        """
+        CREATE TABLE resumen_diario (
+            dia TEXT NOT NULL,            -- 'YYYY-MM-DD'
+            dimension TEXT NOT NULL,      -- total | metodo_pago | estado | tipo
+            valor TEXT NOT NULL,          -- '' para total; 'yape', 'registrado', 'kilo'...
+            boletas INTEGER NOT NULL DEFAULT 0,  -- nº de boletas (o de items para 'tipo')
+            centavos INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, dimension, valor)
+        ) WITHOUT ROWID
+        """
+    )
+    for sql in _TRIGGERS_RESUMEN_CENTAVOS:
+        cur.execute(sql)
+    _llenar_resumen(cur, "boletas", "precio_c", "centavos", "importe_c")
+
+    # Los acumulados de clientes también se sumaban en float
+    cur.execute("UPDATE clientes SET total = ROUND(total, 2)")
+
+# ====== 10: secuencia de cambios (exportación incremental) ======
+# boleta.cambio = número de la última escritura que tocó la boleta (o sus items). Se asigna
+# dentro de la transacción de escritura, así que el orden de 'cambio' es el orden de commit y
+# "cambio > cursor" nunca se salta una boleta. Los triggers cubren cualquier escritura;
+# insertar_boletas_lote asigna el número él mismo para no pagar un UPDATE extra por boleta.
+_COLUMNAS_BOLETA = ("numero, cliente, direccion, telefono, fecha, entrega_fecha, entrega_hora, "
+                    "metodo_pago, estado, a_cuenta, saldo, total, notas")
+_SIGUIENTE_CAMBIO = (
+    "INSERT INTO contadores (nombre, valor) VALUES ('cambios', 1) "
+    "ON CONFLICT (nombre) DO UPDATE SET valor = valor + 1;"
+)
+
+def _marcar_cambio_sql(id_sql):
+    return (_SIGUIENTE_CAMBIO + " UPDATE boleta SET cambio = (SELECT valor FROM contadores "
+            f"WHERE nombre = 'cambios') WHERE id = {id_sql};")
+
+_TRIGGERS_CAMBIOS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cambio_boleta_ins AFTER INSERT ON boleta WHEN NEW.cambio IS NULL
+        BEGIN {_marcar_cambio_sql("NEW.id")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cambio_boleta_upd AFTER UPDATE OF {_COLUMNAS_BOLETA} ON boleta
+        WHEN NEW.cambio IS OLD.cambio
+        BEGIN {_marcar_cambio_sql("NEW.id")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cambio_items_upd AFTER UPDATE ON boleta_items
+        BEGIN {_marcar_cambio_sql("OLD.boleta_id")} {_marcar_cambio_sql("NEW.boleta_id")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cambio_items_del AFTER DELETE ON boleta_items
+        BEGIN {_marcar_cambio_sql("OLD.boleta_id")} END""",
+]
+
+
+@por_lotes
+def m010_secuencia_cambios(conn):
+    cur = conn.cursor()
+    with conn:
+        if "cambio" not in _columnas(cur, "boleta"):
+            cur.execute("ALTER TABLE boleta ADD COLUMN cambio INTEGER")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_boleta_cambio ON boleta(cambio)")
+    # Las boletas existentes toman su id como número de cambio
+    _en_lotes(conn, "boleta", "cambio = COALESCE(cambio, id)")
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cur.execute("UPDATE boleta SET cambio = id WHERE cambio IS NULL")  # las creadas mientras tanto
+        cur.execute(
+            "INSERT INTO contadores (nombre, valor) SELECT 'cambios', COALESCE(MAX(cambio), 0) FROM boleta WHERE 1 "
+            "ON CONFLICT (nombre) DO UPDATE SET valor = MAX(valor, excluded.valor)"
+        )
+        for sql in _TRIGGERS_CAMBIOS:
+            cur.execute(sql)
+
+# ====== 11: 'boletas' pasa a ser una vista de solo lectura ======
+# Hasta aquí cada venta se escribía dos veces: boleta + boleta_items y una fila resumen en
+# 'boletas'. Las filas de 'boletas' sin boleta equivalente (ventas anteriores al esquema
+# cabecera + items) se copian como boleta de un ítem; luego la tabla se reemplaza por una vista
+# con las mismas columnas calculada desde boleta/boleta_items.
+_VISTA_BOLETAS = """
+CREATE VIEW boletas AS
+SELECT id, cliente,
+       CASE WHEN kilos > 0 AND unidades > 0 THEN printf('multi: %.2f kg, %d unidad(es)', kilos, unidades)
+            WHEN kilos > 0 THEN printf('multi: %.2f kg', kilos)
+            WHEN unidades > 0 THEN printf('multi: %d unidad(es)', unidades)
+            ELSE 'multi' END AS tipo_item,
+       kilos, unidades AS cantidad, servicio, perfumado, precio, fecha, metodo_pago, estado
+FROM (
+    SELECT b.id, b.cliente, b.total AS precio, b.fecha, b.metodo_pago, b.estado,
+           (SELECT COALESCE(SUM(kilos), 0) FROM boleta_items WHERE boleta_id = b.id AND tipo = 'kilo') AS kilos,
+           (SELECT COALESCE(SUM(prendas), 0) FROM boleta_items WHERE boleta_id = b.id AND tipo <> 'kilo') AS unidades,
+           (SELECT CASE WHEN COUNT(DISTINCT lavado) = 1 THEN MAX(lavado) ELSE 'mixto' END
+              FROM boleta_items WHERE boleta_id = b.id) AS servicio,
+           (SELECT COALESCE(MAX(perfumado), 0) FROM boleta_items WHERE boleta_id = b.id) AS perfumado
+    FROM boleta b
+)
+"""
+
+def _resumen_boleta_sql(ref, signo):
+    return (
+        "INSERT INTO resumen_diario (dia, dimension, valor, boletas, centavos) VALUES "
+        f"(substr({ref}.fecha,1,10), 'total', '', {signo}1, {signo}{ref}.total_c), "
+        f"(substr({ref}.fecha,1,10), 'metodo_pago', COALESCE({ref}.metodo_pago,''), {signo}1, {signo}{ref}.total_c), "
+        f"(substr({ref}.fecha,1,10), 'estado', COALESCE({ref}.estado,''), {signo}1, {signo}{ref}.total_c)"
+        + _UPSERT_CENTAVOS + ";"
+    )
+
+_TRIGGERS_RESUMEN_BOLETA = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_boleta_ins AFTER INSERT ON boleta
+        BEGIN {_resumen_boleta_sql("NEW", "")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_boleta_del AFTER DELETE ON boleta
+        BEGIN {_resumen_boleta_sql("OLD", "-")} END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_resumen_boleta_upd AFTER UPDATE OF fecha, total, metodo_pago, estado ON boleta
+        BEGIN {_resumen_boleta_sql("OLD", "-")} {_resumen_boleta_sql("NEW", "")} END""",
+]
+
+_SIN_BOLETA = """
+    FROM boletas l WHERE l.id > ? AND NOT EXISTS (
+        SELECT 1 FROM boleta b WHERE b.fecha = l.fecha AND b.cliente = l.cliente AND b.total_c = l.precio_c)
+    ORDER BY l.id LIMIT ?
+"""
+
+def _copiar_boletas_sueltas(conn, ultimo=0, lote=LOTE):
+    """Copia a boleta + boleta_items un lote de filas de 'boletas' sin cabecera equivalente, en la
+    transacción abierta. Repetible: una fila ya copiada encuentra su boleta y se salta.
+    Return: id de la última fila revisada, o None si no quedan."""
+    filas = conn.execute(
+        "SELECT l.id, l.cliente, l.tipo_item, l.kilos, l.cantidad, l.servicio, l.perfumado, l.precio, "
+        "l.fecha, l.metodo_pago, l.estado" + _SIN_BOLETA, (ultimo, lote)
+    ).fetchall()
+    for id_, cliente, tipo_item, kilos, cantidad, servicio, perfumado, precio, fecha, metodo, estado in filas:
+        tipo = "kilo" if tipo_item in ("kilo", "kilos") else "otro"
+        kilos = (kilos or cantidad or 0) if tipo == "kilo" else 0
+        boleta_id = conn.execute(
+            "INSERT INTO boleta (cliente, fecha, metodo_pago, estado, a_cuenta, saldo, total, notas) "
+            "VALUES (?, ?, ?, ?, 0, 0, ?, 'copiada de la tabla boletas')",
+            (cliente, fecha, metodo, estado, precio),
+        ).lastrowid
+        conn.execute(
+            "INSERT INTO boleta_items (boleta_id, descripcion, tipo, prendas, kilos, lavado, p_unit, importe, perfumado) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (boleta_id, tipo_item, tipo, 0 if tipo == "kilo" else int(cantidad or 0), kilos, servicio,
+             precio, precio, perfumado or 0),
+        )
+    return filas[-1][0] if len(filas) == lote else None
+
+
+@por_lotes
+def m011_vista_boletas(conn):
+    def es_tabla():
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'boletas'").fetchone()
+
+    tope = conn.execute("SELECT COALESCE(MAX(id), 0) FROM boletas").fetchone()[0] if es_tabla() else None
+    ultimo = 0 if es_tabla() else None
+    while ultimo is not None:
+        with conn:
+            ultimo = _copiar_boletas_sueltas(conn, ultimo)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if es_tabla():
+            ultimo = tope or 0
+            while ultimo is not None:  # las escritas por workers viejos mientras tanto
+                ultimo = _copiar_boletas_sueltas(conn, ultimo)
+            conn.execute("DROP TABLE IF EXISTS boletas_fts")
+            conn.execute("DROP TABLE boletas")  # con sus índices y triggers
+        conn.execute("DROP VIEW IF EXISTS boletas")
+        conn.execute(_VISTA_BOLETAS)
+        cur = conn.cursor()
+        for sql in _TRIGGERS_RESUMEN_BOLETA:
+            cur.execute(sql)
+        _llenar_resumen(cur, "boleta", "total_c", "centavos", "importe_c")
+    database._FTS_DISPONIBLE.clear()
+
+# ====== 12: tablero de entregas ======
+def m012_indice_entregas(cur):
+    # Vencidas / para hoy / listas: rango por estado y fecha prometida, ya ordenado por hora
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_boleta_estado_entrega ON boleta(estado, entrega_fecha, entrega_hora)")
+
+# ====== 13: particiones por año (archivo.py) ======
+# Al mover una boleta a su partición se borra de 'boleta': el resumen diario y la secuencia de
+# cambios no deben tomarlo como una anulación. archivo.py registra la boleta en boleta_archivada
+# antes de borrarla y estos triggers la saltan.
+_NO_ARCHIVADA = "NOT EXISTS (SELECT 1 FROM boleta_archivada WHERE id = {})"
+
+_TRIGGERS_ARCHIVO = [
+    f"""CREATE TRIGGER trg_resumen_boleta_del AFTER DELETE ON boleta
+        WHEN {_NO_ARCHIVADA.format("OLD.id")}
+        BEGIN {_resumen_boleta_sql("OLD", "-")} END""",
+    f"""CREATE TRIGGER trg_cambio_items_del AFTER DELETE ON boleta_items
+        WHEN {_NO_ARCHIVADA.format("OLD.boleta_id")}
+        BEGIN {_marcar_cambio_sql("OLD.boleta_id")} END""",
+]
+
+def m013_particiones(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS particiones (
+            anio INTEGER PRIMARY KEY,
+            archivo TEXT NOT NULL,        -- nombre del archivo en LAVA_ARCHIVO_DIR
+            desde TEXT NOT NULL,          -- fecha de la boleta más antigua archivada
+            hasta TEXT NOT NULL,          -- y de la más nueva
+            boletas INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS boleta_archivada (
+            id INTEGER PRIMARY KEY,       -- id de la boleta (se conserva en la partición)
+            anio INTEGER NOT NULL,
+            cambio INTEGER
+        )
+        """
+    )
+    for sql in _TRIGGERS_ARCHIVO:
+        cur.execute(f"DROP TRIGGER IF EXISTS {sql.split()[2]}")
+        cur.execute(sql)
+
+# ====== 14: dimensión 'tipo' del resumen al borrar una boleta ======
+# El trigger de items busca el día en la cabecera, pero con DELETE FROM boleta la cascada borra
+# los items cuando la cabecera ya no está: el 'tipo' nunca se restaba. Ahora lo resta la boleta
+# ANTES de borrarse (sus items siguen ahí) y el de items solo actúa cuando la cabecera existe.
+# Ambos saltan las boletas que archivo.py mueve a una partición. Las filas 'tipo' que ya quedaron
+# de más se corrigen con python reconstruir_resumen.py.
+_TRIGGERS_TIPO_DEL = [
+    f"""CREATE TRIGGER trg_resumen_boleta_items_del BEFORE DELETE ON boleta
+        WHEN {_NO_ARCHIVADA.format("OLD.id")}
+        BEGIN
+            INSERT INTO resumen_diario (dia, dimension, valor, boletas, centavos)
+            SELECT substr(OLD.fecha,1,10), 'tipo', COALESCE(tipo,''), -COUNT(1), -SUM(importe_c)
+            FROM boleta_items WHERE boleta_id = OLD.id GROUP BY COALESCE(tipo,'')
+            {_UPSERT_CENTAVOS};
+        END""",
+    f"""CREATE TRIGGER trg_resumen_items_del AFTER DELETE ON boleta_items
+        WHEN {_NO_ARCHIVADA.format("OLD.boleta_id")}
+        BEGIN {_resumen_centavos_item_sql("OLD", "-")} END""",
+]
+
+def m014_tipo_al_borrar_boleta(cur):
+    for sql in _TRIGGERS_TIPO_DEL:
+        cur.execute(f"DROP TRIGGER IF EXISTS {sql.split()[2]}")
+        cur.execute(sql)
+
+# ====== 15: vista 'boletas' en una sola pasada ======
+# La vista de la migración 11 hacía 4 subconsultas correlacionadas por fila (~7 búsquedas en
+# boleta_items). Ahora junta los items de cada boleta con un solo LEFT JOIN agrupado y vuelve a dar
+# 'cantidad' como la tabla original: kilos + unidades (la 11 daba solo las unidades).
+_VISTA_BOLETAS_V15 = """
+CREATE VIEW boletas AS
+SELECT id, cliente,
+       CASE WHEN kilos > 0 AND unidades > 0 THEN printf('multi: %.2f kg, %d unidad(es)', kilos, unidades)
+            WHEN kilos > 0 THEN printf('multi: %.2f kg', kilos)
+            WHEN unidades > 0 THEN printf('multi: %d unidad(es)', unidades)
+            ELSE 'multi' END AS tipo_item,
+       kilos, kilos + unidades AS cantidad, servicio, perfumado, precio, fecha, metodo_pago, estado
+FROM (
+    SELECT b.id, b.cliente, b.total AS precio, b.fecha, b.metodo_pago, b.estado,
+           COALESCE(SUM(CASE WHEN i.tipo = 'kilo' THEN i.kilos END), 0) AS kilos,
+           COALESCE(SUM(CASE WHEN i.tipo <> 'kilo' THEN i.prendas END), 0) AS unidades,
+           CASE WHEN MIN(i.lavado) = MAX(i.lavado) THEN MIN(i.lavado) ELSE 'mixto' END AS servicio,
+           COALESCE(MAX(i.perfumado), 0) AS perfumado
+    FROM boleta b LEFT JOIN boleta_items i ON i.boleta_id = b.id
+    GROUP BY b.fecha, b.id
+)
+"""
+
+def m015_vista_boletas_agrupada(cur):
+    cur.execute("DROP VIEW IF EXISTS boletas")
+    cur.execute(_VISTA_BOLETAS_V15)
+
+# ====== 16: recargos del ítem aparte ======
+# El servidor guarda p_unit = tarifa por kilo/prenda; los recargos de servicio y perfumado van en
+# su propia columna para que importe = p_unit × cantidad + recargo (0 en las filas anteriores).
+def m016_recargo_item(cur):
+    if "recargo" not in _columnas(cur, "boleta_items"):
+        cur.execute("ALTER TABLE boleta_items ADD COLUMN recargo REAL NOT NULL DEFAULT 0")
+
+# ====== 17: claves de idempotencia sin cascada ======
+# Con ON DELETE CASCADE, archivar una boleta (archivo.py la borra de 'main') borraba también su
+# clave y un reintento con esa clave creaba otra boleta. Se rehace la tabla sin la FK; las claves
+# se borran solo si la boleta se borra de verdad, no cuando pasa a una partición.
+_TRIGGER_IDEMPOTENCIA_DEL = f"""CREATE TRIGGER trg_idempotencia_del AFTER DELETE ON boleta
+    WHEN {_NO_ARCHIVADA.format("OLD.id")}
+    BEGIN DELETE FROM boleta_idempotencia WHERE boleta_id = OLD.id; END"""
+
+def m017_idempotencia_sin_cascada(cur):
+    cur.execute("DROP TABLE IF EXISTS boleta_idempotencia_v17")
+    cur.execute("CREATE TABLE boleta_idempotencia_v17 (clave TEXT PRIMARY KEY, boleta_id INTEGER NOT NULL) "
+                "WITHOUT ROWID")
+    cur.execute("INSERT INTO boleta_idempotencia_v17 (clave, boleta_id) SELECT clave, boleta_id FROM boleta_idempotencia")
+    cur.execute("DROP TABLE boleta_idempotencia")
+    cur.execute("ALTER TABLE boleta_idempotencia_v17 RENAME TO boleta_idempotencia")
+    cur.execute("CREATE INDEX idx_idempotencia_boleta ON boleta_idempotencia (boleta_id)")
+    cur.execute("DROP TRIGGER IF EXISTS trg_idempotencia_del")
+    cur.execute(_TRIGGER_IDEMPOTENCIA_DEL)
+
+
+MIGRACIONES = [
+    m001_esquema_base,
+    m002_reconciliar_columnas,
+    m003_indices_fecha_id,
+    m004_idempotencia,
+    m005_resumen_diario,
+    m006_busqueda_fts,
+    m007_clientes,
+    m008_importaciones,
+    m009_centavos_y_dia,
+    m010_secuencia_cambios,
+    m011_vista_boletas,
+    m012_indice_entregas,
+    m013_particiones,
+    m014_tipo_al_borrar_boleta,
+    m015_vista_boletas_agrupada,
+    m016_recargo_item,
+    m017_idempotencia_sin_cascada,
+]
+VERSION = len(MIGRACIONES)
+
+
+def migrar(conn=None):
+    """Aplica las migraciones pendientes. Return: versión final."""
+    conn = conn or database._conn()
+    if version_actual(conn) >= VERSION:  # camino rápido: ningún DDL
+        return VERSION
+    # Lock + volver a leer la versión: si varios workers arrancan a la vez, el primero migra y
+    # los demás esperan y encuentran cada migración ya aplicada.
+    with _Cerrojo(conn):
+        for numero, migracion in enumerate(MIGRACIONES, 1):
+            if version_actual(conn) >= numero:
+                continue
+            if getattr(migracion, "por_lotes", False):
+                migracion(conn)
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")
+                    if version_actual(conn) < numero:
+                        conn.execute(f"PRAGMA user_version = {numero}")
+                continue
+            with conn:
+                # La migración y su número de versión en una misma transacción de escritura
+                conn.execute("BEGIN IMMEDIATE")
+                if version_actual(conn) < numero:
+                    migracion(conn.cursor())
+                    conn.execute(f"PRAGMA user_version = {numero}")
+        return version_actual(conn)
+
+
+if __name__ == "__main__":
+    conn = database._conn()
+    antes = version_actual(conn)
+    despues = migrar(conn)
+    print(f"Esquema: versión {antes} -> {despues} (última: {VERSION})")
+    sys.exit(0 if despues == VERSION else 1)
@@ -1,24 +1,203 @@
 from decimal import Decimal, ROUND_HALF_UP
+from dataclasses import dataclass, field
+from functools import lru_cache
+from types import MappingProxyType
+import importlib
+import os
+import threading
+import time
+import unicodedata
+
 import config_precios as cfg
 
+CENTIMO = Decimal("0.01")
+_CERO = Decimal("0.00")
+_MAX_MEMO = 4096
+# Cada cuántos segundos se revisa si config_precios.py cambió (0 = en cada llamada)
+RECARGA_SEG = float(os.getenv("LAVA_PRECIOS_RECARGA_SEG", "5"))
+
+# El formulario guarda "kilo"; versiones anteriores usaban "kilos"
+_ALIAS_TIPO = {"kilo": "kilo", "kilos": "kilo", "edredon": "edredon", "terno": "terno"}
+# Valores del <select> de lavado -> claves de RECARGO_SERVICIO
+_ALIAS_SERVICIO = {"a mano": "mano"}
+
 
 def _money(x):
-    return Decimal(x).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    return Decimal(x).quantize(CENTIMO, rounding=ROUND_HALF_UP)
+
+
+@lru_cache(maxsize=512)
+def _clave(texto):
+    """'Edredón ' -> 'edredon'"""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(ch for ch in texto if not unicodedata.combining(ch)).lower().strip()
+
+
+@dataclass(frozen=True)
+class TablaPrecios:
+    """Tarifas ya convertidas a Decimal exacto (a partir del texto, no del float)."""
+    base: MappingProxyType            # tipo -> precio por kilo / por prenda
+    recargo_servicio: MappingProxyType
+    recargo_perfumado: Decimal
+    firma: tuple = ()                 # (mtime_ns, tamaño) de config_precios.py al compilar
+    # Desgloses ya calculados con ESTA tabla: (tipo, cantidad, servicio, perfumado) -> desglose()
+    memo: dict = field(default_factory=dict, compare=False, repr=False)
+
+
+def compilar(modulo=cfg, firma=()):
+    d = lambda v: _money(str(v))
+    return TablaPrecios(
+        base=MappingProxyType({
+            "kilo": d(modulo.PRECIO_KILO),
+            "edredon": d(modulo.PRECIO_EDREDON),
+            "terno": d(modulo.PRECIO_TERNO),
+        }),
+        recargo_servicio=MappingProxyType({_clave(k): d(v) for k, v in modulo.RECARGO_SERVICIO.items()}),
+        recargo_perfumado=d(modulo.RECARGO_PERFUMADO),
+        firma=firma,
+    )
+
+
+@lru_cache(maxsize=1024)
+def _cantidad(valor):
+    return Decimal(str(valor or 0))
+
+
+def _firma():
+    try:
+        st = os.stat(cfg.__file__)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return ()
+
+
+_lock = threading.Lock()
+_tabla = compilar(cfg, _firma())
+_revisado = time.monotonic()
+
+
+def tabla():
+    """Tabla vigente. Si config_precios.py cambió en disco se recarga sin reiniciar el worker."""
+    global _tabla, _revisado
+    ahora = time.monotonic()
+    if ahora - _revisado >= RECARGA_SEG:
+        with _lock:
+            if ahora - _revisado >= RECARGA_SEG:
+                _revisado = ahora
+                firma = _firma()
+                if firma != _tabla.firma:
+                    importlib.reload(cfg)
+                    _tabla = compilar(cfg, firma)
+    return _tabla
+
+
+def desglose(tipo, cantidad, servicio="normal", perfumado=False, t=None, p_unit=None):
+    """(precio unitario, cantidad × precio unitario, recargos de servicio + perfumado) en Decimal.
+    Con 'p_unit' se usa ese precio en vez de la tarifa (para rehacer la cuenta del cliente).
+    None si el tipo no tiene tarifa (precio libre, p. ej. 'otro')."""
+    t = t or tabla()
+    clave = (tipo, cantidad, servicio, bool(perfumado)) if p_unit is None else None
+    try:
+        return t.memo[clave]
+    except KeyError:
+        pass
+    except TypeError:  # valores no hasheables: se calcula sin memo
+        clave = None
+    base = t.base.get(_ALIAS_TIPO.get(_clave(tipo)))
+    if base is None:
+        partes = None
+    else:
+        if p_unit is not None:
+            base = _money(str(p_unit))
+        servicio = _clave(servicio)
+        recargo = t.recargo_servicio.get(_ALIAS_SERVICIO.get(servicio, servicio), _CERO)
+        if perfumado:
+            recargo += t.recargo_perfumado
+        partes = (base, (base * _cantidad(cantidad)).quantize(CENTIMO, rounding=ROUND_HALF_UP), recargo)
+    if clave is not None:
+        if len(t.memo) >= _MAX_MEMO:
+            t.memo.clear()
+        t.memo[clave] = partes
+    return partes
+
+
+def precio_item(tipo, cantidad, servicio="normal", perfumado=False, t=None):
+    """Importe de un ítem: cantidad × tarifa + recargo del servicio + perfumado.
+    None si el tipo no tiene tarifa (precio libre, p. ej. 'otro')."""
+    partes = desglose(tipo, cantidad, servicio, perfumado, t)
+    return None if partes is None else partes[1] + partes[2]
+
+
+def tarifa(tipo, t=None):
+    """Precio unitario (por kilo / por prenda) del tipo, sin recargos. None si no tiene tarifa."""
+    return (t or tabla()).base.get(_ALIAS_TIPO.get(_clave(tipo)))
+
+
+def cotizar(items, t=None):
+    """Precia una lista de ítems (dicts con tipo, cantidad, lavado, perfumado) con UNA sola tabla.
+    Return: (importes, total) — importe None para tipos sin tarifa."""
+    t = t or tabla()
+    importes = [
+        precio_item(it.get("tipo"), it.get("cantidad"), it.get("lavado"), it.get("perfumado"), t)
+        for it in items
+    ]
+    return importes, sum((i for i in importes if i is not None), Decimal("0.00"))
 
 
 def calcular_precio(tipo_item, kilos, cantidad, servicio, perfumado):
-    subtotal = Decimal("0.00")
+    importe = precio_item(tipo_item, kilos if _ALIAS_TIPO.get(_clave(tipo_item)) == "kilo" else cantidad,
+                          servicio, perfumado)
+    if importe is None:  # como antes: sin tarifa solo cuentan los recargos
+        t = tabla()
+        importe = t.recargo_servicio.get(_clave(servicio), Decimal("0.00"))
+        if perfumado:
+            importe += t.recargo_perfumado
+    return float(importe)
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: implementación anterior (Decimal desde float + if/elif en cada llamada)
+    # contra cotizar() sobre la tabla precompilada.
+    import timeit
+
+    def _calcular_precio_anterior(tipo_item, kilos, cantidad, servicio, perfumado):
+        subtotal = Decimal("0.00")
+        if tipo_item == "kilos":
+            subtotal = _money(Decimal(kilos) * Decimal(cfg.PRECIO_KILO))
+        elif tipo_item == "edredon":
+            subtotal = _money(Decimal(cantidad) * Decimal(cfg.PRECIO_EDREDON))
+        elif tipo_item == "terno":
+            subtotal = _money(Decimal(cantidad) * Decimal(cfg.PRECIO_TERNO))
+        subtotal += _money(cfg.RECARGO_SERVICIO.get(servicio, 0))
+        if perfumado:
+            subtotal += _money(cfg.RECARGO_PERFUMADO)
+        return float(subtotal)
+
+    import random
 
-    if tipo_item == "kilos":
-        subtotal = _money(Decimal(kilos) * Decimal(cfg.PRECIO_KILO))
-    elif tipo_item == "edredon":
-        subtotal = _money(Decimal(cantidad) * Decimal(cfg.PRECIO_EDREDON))
-    elif tipo_item == "terno":
-        subtotal = _money(Decimal(cantidad) * Decimal(cfg.PRECIO_TERNO))
+    # Como en el mostrador: los kilos salen de la balanza con dos decimales y casi nunca se
+    # repiten, así que la mayoría de llamadas no encuentra el importe en el memo
+    azar = random.Random(1)
+    n, por_lote = 50, 1000
 
-    # Recargos opcionales por servicio
-    subtotal += _money(cfg.RECARGO_SERVICIO.get(servicio, 0))
-    if perfumado:
-        subtotal += _money(cfg.RECARGO_PERFUMADO)
+    def _item():
+        tipo = azar.choice(("kilo", "kilo", "kilo", "edredon", "terno"))
+        cantidad = round(azar.uniform(0.5, 12), 2) if tipo == "kilo" else azar.randint(1, 3)
+        return dict(tipo=tipo, cantidad=cantidad, lavado=azar.choice(("normal", "seco", "mano")),
+                    perfumado=azar.random() < 0.3)
 
-    return float(subtotal)
+    lotes = [[_item() for _ in range(por_lote)] for _ in range(n)]
+    claves = {(it["tipo"], it["cantidad"], it["lavado"], bool(it["perfumado"])) for lote in lotes for it in lote}
+    antes = timeit.timeit(lambda: [
+        _calcular_precio_anterior("kilos" if it["tipo"] == "kilo" else it["tipo"], it["cantidad"],
+                                  it["cantidad"], it["lavado"], it["perfumado"]) for lote in lotes for it in lote
+    ], number=1)
+    ahora = timeit.timeit(lambda: [cotizar(lote) for lote in lotes], number=1)
+    # Cada lote con una tabla recién compilada (memo vacío): el costo de un fallo del memo
+    tablas = [compilar(cfg) for _ in lotes]
+    frio = timeit.timeit(lambda: [cotizar(lote, t) for lote, t in zip(lotes, tablas)], number=1)
+    por_item = lambda seg: seg / (n * por_lote) * 1e6
+    print(f"{n * por_lote} ítems, {len(claves)} distintos")
+    print(f"anterior:          {por_item(antes):.2f} µs/ítem")
+    print(f"cotizar:           {por_item(ahora):.2f} µs/ítem")
+    print(f"cotizar sin memo:  {por_item(frio):.2f} µs/ítem")
@@ -0,0 +1,10 @@
+"""Recalcula la tabla resumen_diario (ingresos por día) a partir de boletas y boleta_items.
+
+Uso: python reconstruir_resumen.py
+"""
+import database
+
+if __name__ == "__main__":
+    database.crear_bd()
+    filas = database.reconstruir_resumen()
+    print(f"Resumen diario reconstruido: {filas} filas.")
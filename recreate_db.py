@@ -1,86 +1,37 @@
-import os
-import sqlite3
-from database import DB_PATH
+"""Borra TODAS las boletas y recrea el esquema desde cero con las migraciones.
+
+Uso: python recreate_db.py --borrar-todo
+
+Antes de borrar se respalda la base (respaldo.py): se vuelve atrás con
+python respaldo.py restaurar <respaldo> --confirmar
+"""
+import sys
+
+import database
+import migraciones
+import respaldo
+
+# En orden de borrado; 'boletas' es tabla o vista según la versión del esquema
+TABLAS = ("boletas", "boleta_items", "boleta_idempotencia", "boleta", "resumen_diario",
+          "boleta_fts", "boletas_fts", "clientes", "contadores", "importaciones",
+          "particiones", "boleta_archivada")
+
 
 def drop_and_recreate():
-    # Intentar eliminar las tablas existentes
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        
-        # Eliminar tablas si existen
-        cur.execute("DROP TABLE IF EXISTS boleta_items")
-        cur.execute("DROP TABLE IF EXISTS boleta")
-        cur.execute("DROP TABLE IF EXISTS boletas")
-        
-        # Crear tabla boleta
-        cur.execute("""
-            CREATE TABLE boleta (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero TEXT,
-                cliente TEXT NOT NULL,
-                direccion TEXT,
-                telefono TEXT,
-                fecha TEXT NOT NULL,
-                entrega_fecha TEXT,
-                entrega_hora TEXT,
-                metodo_pago TEXT DEFAULT 'efectivo',
-                estado TEXT DEFAULT 'registrado',
-                a_cuenta REAL DEFAULT 0,
-                saldo REAL DEFAULT 0,
-                total REAL DEFAULT 0,
-                notas TEXT
-            )
-        """)
-        
-        # Crear tabla boleta_items
-        cur.execute("""
-            CREATE TABLE boleta_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                boleta_id INTEGER NOT NULL REFERENCES boleta(id) ON DELETE CASCADE,
-                descripcion TEXT,
-                tipo TEXT,
-                prendas INTEGER DEFAULT 0,
-                kilos REAL DEFAULT 0,
-                lavado TEXT,
-                secado TEXT,
-                p_unit REAL DEFAULT 0,
-                importe REAL DEFAULT 0,
-                perfumado INTEGER DEFAULT 0
-            )
-        """)
-        
-        # Crear tabla boletas (compatibilidad)
-        cur.execute("""
-            CREATE TABLE boletas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cliente TEXT NOT NULL,
-                tipo_item TEXT NOT NULL,
-                kilos REAL DEFAULT 0,
-                cantidad INTEGER DEFAULT 0,
-                servicio TEXT DEFAULT 'normal',
-                perfumado INTEGER DEFAULT 0,
-                precio REAL NOT NULL,
-                fecha TEXT NOT NULL,
-                metodo_pago TEXT DEFAULT 'efectivo',
-                estado TEXT DEFAULT 'registrado'
-            )
-        """)
-        
-        # Crear índices
-        cur.execute("CREATE INDEX idx_boleta_fecha ON boleta(fecha)")
-        cur.execute("CREATE INDEX idx_boleta_cliente ON boleta(cliente)")
-        cur.execute("CREATE INDEX idx_bitems_boleta ON boleta_items(boleta_id)")
-        cur.execute("CREATE INDEX idx_boletas_fecha ON boletas(fecha)")
-        cur.execute("CREATE INDEX idx_boletas_cliente ON boletas(cliente)")
-        
-        conn.commit()
-        print("Base de datos recreada exitosamente con todas las tablas y columnas.")
-    except Exception as e:
-        print(f"Error: {e}")
-    finally:
-        if 'conn' in locals():
-            conn.close()
+    print(f"Respaldo previo en {respaldo.respaldar()}")
+    conn = database._conn()
+    with conn:
+        tipos = dict(conn.execute("SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view')").fetchall())
+        for tabla in TABLAS:
+            if tabla in tipos:
+                conn.execute(f"DROP {tipos[tabla].upper()} {tabla}")
+        conn.execute("PRAGMA user_version = 0")
+    database._FTS_DISPONIBLE.clear()
+    version = migraciones.migrar(conn)
+    print(f"Base de datos recreada exitosamente (esquema versión {version}).")
+
 
 if __name__ == "__main__":
-    drop_and_recreate()
\ No newline at end of file
+    if "--borrar-todo" not in sys.argv[1:]:
+        sys.exit(f"Esto borra todas las boletas de {database.DB_PATH}. Para confirmar: python recreate_db.py --borrar-todo")
+    drop_and_recreate()
@@ -0,0 +1,417 @@
+"""Respaldos en caliente de la BD (y de las particiones de archivo.py), comprimidos y rotados.
+
+Uso: python respaldo.py crear
+     python respaldo.py listar
+     python respaldo.py verificar [respaldo]          (por defecto el último)
+     python respaldo.py restaurar respaldo --confirmar
+
+Se copia con la API de backup de SQLite (sqlite3.Connection.backup) de a LAVA_RESPALDO_PAGINAS
+páginas por paso, con una pausa de LAVA_RESPALDO_PAUSA_MS entre pasos: la app sigue leyendo y
+escribiendo mientras tanto. La copia se hace dentro de una transacción de lectura, así que es una
+foto consistente de un instante aunque haya escrituras (sin ella SQLite reiniciaría la copia con
+cada escritura de otra conexión); mientras dura, el WAL no se puede reciclar y crece un poco.
+
+Cada respaldo es una carpeta <LAVA_RESPALDO_DIR>/<bd>_<fecha-hora>/ con la BD comprimida (gzip),
+las particiones de archivo/ y respaldo.json (versión del esquema, tamaños y sha256). Se conservan
+los LAVA_RESPALDO_CONSERVAR más recientes. Una partición que no cambió desde el respaldo anterior
+se enlaza (hard link) en vez de volver a copiarse.
+
+Restaurar verifica primero el respaldo (sha256 + PRAGMA integrity_check), respalda la BD actual
+y copia el respaldo sobre la BD viva con la misma API: los workers siguen con sus conexiones y
+ven los datos restaurados. Los contadores se dejan por encima de los que había, para que las
+cachés de páginas, los ETags y los cursores de /export/cambios no den nada por visto.
+
+Con LAVA_RESPALDO_CADA_H > 0 la app respalda sola cada tantas horas (ver instalar()).
+"""
+import argparse
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import config as cfg
+import database
+
+PAGINAS = int(os.getenv("LAVA_RESPALDO_PAGINAS", "1024"))        # páginas por paso (4 MB con páginas de 4 KB)
+PAUSA_MS = float(os.getenv("LAVA_RESPALDO_PAUSA_MS", "25"))      # pausa entre pasos
+CONSERVAR = int(os.getenv("LAVA_RESPALDO_CONSERVAR", "7"))       # respaldos que se guardan
+CADA_H = float(os.getenv("LAVA_RESPALDO_CADA_H", "0"))           # 0 = sin respaldos automáticos
+NIVEL_GZIP = int(os.getenv("LAVA_RESPALDO_GZIP", "6"))
+
+MANIFIESTO = "respaldo.json"
+_BLOQUE = 1 << 20
+
+log = logging.getLogger("lavanderia.respaldo")
+
+
+class RespaldoEnCurso(Exception):
+    """Otro proceso está respaldando o restaurando."""
+
+
+class RespaldoInvalido(Exception):
+    """El respaldo no pasó la verificación."""
+
+
+def carpeta():
+    return cfg.RESPALDO_DIR or os.path.join(os.path.dirname(os.path.abspath(database.DB_PATH)), "respaldos")
+
+
+class _Cerrojo:
+    """Lock de archivo entre procesos: un solo respaldo o restauración a la vez."""
+    def __init__(self, directorio):
+        os.makedirs(directorio, exist_ok=True)
+        self._f = open(os.path.join(directorio, ".lock"), "w")
+
+    def __enter__(self):
+        try:
+            fcntl.flock(self._f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._f.close()
+            raise RespaldoEnCurso("ya hay un respaldo o restauración en curso")
+        return self
+
+    def __exit__(self, *exc):
+        self._f.close()   # suelta el lock
+
+
+# ====== Copia paso a paso ======
+def _copiar(origen, destino, paginas=PAGINAS, pausa_ms=PAUSA_MS):
+    """Copia la BD abierta en 'origen' al archivo 'destino' sin frenar a la app."""
+    def pausar(estado, quedan, total):
+        if pausa_ms:
+            time.sleep(pausa_ms / 1000)
+
+    origen.execute("BEGIN")
+    try:
+        origen.execute("SELECT COUNT(1) FROM sqlite_master").fetchone()   # abre la lectura: foto fija
+        copia = sqlite3.connect(destino)
+        try:
+            origen.backup(copia, pages=paginas, progress=pausar)
+            # La copia queda autocontenida (sin -wal): se puede comprimir y abrir en cualquier parte
+            copia.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            copia.close()
+    finally:
+        origen.rollback()
+
+
+def _comprimir(ruta, ruta_gz):
+    """Return: (bytes del original, sha256 del .gz)."""
+    with open(ruta, "rb") as f, open(ruta_gz + ".tmp", "wb") as crudo:
+        with gzip.GzipFile(os.path.basename(ruta), "wb", NIVEL_GZIP, crudo, mtime=0) as gz:
+            shutil.copyfileobj(f, gz, _BLOQUE)
+    os.replace(ruta_gz + ".tmp", ruta_gz)
+    return os.path.getsize(ruta), _sha256(ruta_gz)
+
+
+def _descomprimir(ruta_gz, ruta):
+    with gzip.open(ruta_gz, "rb") as gz, open(ruta, "wb") as f:
+        shutil.copyfileobj(gz, f, _BLOQUE)
+
+
+def _sha256(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(_BLOQUE), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+# ====== Crear, listar, rotar ======
+def listar(directorio=None):
+    """Respaldos completos, del más nuevo al más viejo. Return: [(ruta, manifiesto)]"""
+    directorio = directorio or carpeta()
+    respaldos = []
+    if os.path.isdir(directorio):
+        for nombre in os.listdir(directorio):
+            ruta = os.path.join(directorio, nombre)
+            try:
+                with open(os.path.join(ruta, MANIFIESTO), encoding="utf-8") as f:
+                    respaldos.append((ruta, json.load(f)))
+            except (OSError, ValueError):
+                continue   # a medias (.tmp) o ajeno
+    return sorted(respaldos, key=lambda r: (r[1]["creado"], r[0]), reverse=True)
+
+
+def _rotar(directorio, conservar):
+    for ruta, _ in listar(directorio)[conservar:]:
+        shutil.rmtree(ruta, ignore_errors=True)
+    for nombre in os.listdir(directorio):
+        if nombre.endswith(".tmp"):   # respaldos que se cortaron (con el lock nadie los está escribiendo)
+            shutil.rmtree(os.path.join(directorio, nombre), ignore_errors=True)
+
+
+def _particiones_vivas(conn):
+    """Return: [(clave en el manifiesto, ruta)] de los archivos de archivo.py."""
+    try:
+        archivos = [fila[0] for fila in conn.execute("SELECT archivo FROM particiones ORDER BY anio")]
+    except sqlite3.OperationalError:   # esquema anterior a la migración 13
+        archivos = []
+    return [(f"archivo/{a}", database.ruta_particion(a)) for a in archivos
+            if os.path.exists(database.ruta_particion(a))]
+
+
+def respaldar(directorio=None, conservar=CONSERVAR, si_pasaron_h=None):
+    """Crea un respaldo y rota los viejos. Con si_pasaron_h solo respalda si el último tiene al
+    menos esas horas (lo decide con el lock tomado: entre varios workers respalda uno).
+    Return: ruta del respaldo, o None si no hizo falta."""
+    directorio = directorio or carpeta()
+    with _Cerrojo(directorio):
+        return _respaldar(directorio, conservar, si_pasaron_h)
+
+
+def _respaldar(directorio, conservar=CONSERVAR, si_pasaron_h=None):
+    """respaldar() con el lock de 'directorio' ya tomado."""
+    anteriores = listar(directorio)
+    if si_pasaron_h is not None and anteriores:
+        edad = datetime.now() - datetime.fromisoformat(anteriores[0][1]["creado"])
+        if edad.total_seconds() < si_pasaron_h * 3600:
+            return None
+    t0 = time.perf_counter()
+    creado = datetime.now()
+    stem = Path(database.DB_PATH).stem
+    final = base = os.path.join(directorio, f"{stem}_{creado:%Y%m%d-%H%M%S}")
+    n = 1
+    while os.path.exists(final):   # dos respaldos en el mismo segundo
+        n += 1
+        final = f"{base}-{n}"
+    tmp = final + ".tmp"
+    os.makedirs(tmp)
+    manifiesto = {"creado": creado.isoformat(timespec="seconds"), "bd": os.path.basename(database.DB_PATH),
+                  "archivos": {}}
+    previos = anteriores[0] if anteriores else None
+
+    def guardar(clave, conn, origen=None):
+        destino = os.path.join(tmp, clave)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        previo = previos and previos[1]["archivos"].get(clave)
+        if origen is not None and previo and previo.get("origen") == origen:
+            # Partición sin cambios desde el último respaldo: mismo contenido, sin copiar
+            try:
+                os.link(os.path.join(previos[0], clave + ".gz"), destino + ".gz")
+            except OSError:
+                shutil.copyfile(os.path.join(previos[0], clave + ".gz"), destino + ".gz")
+            manifiesto["archivos"][clave] = previo
+            return
+        _copiar(conn, destino)
+        try:
+            bytes_, sha = _comprimir(destino, destino + ".gz")
+        finally:
+            os.remove(destino)
+        manifiesto["archivos"][clave] = {"bytes": bytes_, "sha256": sha, "origen": origen}
+
+    conn = database._abrir()
+    try:
+        # Primero la BD: una partición copiada después tiene lo mismo o más, y lo que 'main'
+        # todavía no da por movido no se lee (ver archivo.py)
+        manifiesto["version"] = conn.execute("PRAGMA user_version").fetchone()[0]
+        guardar(manifiesto["bd"], conn)
+        particiones = _particiones_vivas(conn)
+    finally:
+        conn.close()
+    for clave, ruta in particiones:
+        estado = os.stat(ruta)
+        parte = sqlite3.connect(ruta)
+        try:
+            guardar(clave, parte, origen=[estado.st_size, estado.st_mtime_ns])
+        finally:
+            parte.close()
+
+    manifiesto["segundos"] = round(time.perf_counter() - t0, 1)
+    with open(os.path.join(tmp, MANIFIESTO), "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, final)
+    _rotar(directorio, conservar)
+    return final
+
+
+# ====== Verificar y restaurar ======
+def _buscar(respaldo, directorio=None):
+    """'respaldo' puede ser una ruta, el nombre de la carpeta o None (el último)."""
+    if respaldo and os.path.isfile(os.path.join(respaldo, MANIFIESTO)):
+        ruta = respaldo
+    else:
+        todos = listar(directorio)
+        coinciden = [r for r, _ in todos if respaldo is None or os.path.basename(r) == respaldo]
+        if not coinciden:
+            raise FileNotFoundError(f"no hay respaldo {respaldo or ''} en {directorio or carpeta()}".replace("  ", " "))
+        ruta = coinciden[0]
+    with open(os.path.join(ruta, MANIFIESTO), encoding="utf-8") as f:
+        return ruta, json.load(f)
+
+
+def _verificar_en(ruta, manifiesto, destino_de):
+    """Descomprime cada archivo en destino_de(clave) y lo revisa. Return: [problemas]"""
+    import migraciones
+    problemas = []
+    if manifiesto.get("version", 0) > migraciones.VERSION:
+        problemas.append(f"esquema versión {manifiesto['version']} más nuevo que el código ({migraciones.VERSION})")
+    for clave, datos in manifiesto["archivos"].items():
+        gz = os.path.join(ruta, clave + ".gz")
+        if not os.path.exists(gz) or _sha256(gz) != datos["sha256"]:
+            problemas.append(f"{clave}: falta o no coincide el sha256")
+            continue
+        destino = destino_de(clave)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        try:
+            _descomprimir(gz, destino)
+            conn = sqlite3.connect(destino)
+            try:
+                resultado = [fila[0] for fila in conn.execute("PRAGMA integrity_check")]
+            finally:
+                conn.close()
+        except (OSError, EOFError, sqlite3.DatabaseError) as e:
+            resultado = [str(e)]
+        if resultado != ["ok"]:
+            problemas.append(f"{clave}: " + "; ".join(resultado[:5]))
+    return problemas
+
+
+def verificar(respaldo=None, directorio=None):
+    """Return: (ruta del respaldo, [problemas]); lista vacía si está sano."""
+    ruta, manifiesto = _buscar(respaldo, directorio)
+    tmp = os.path.join(directorio or carpeta(), f".verificar_{os.getpid()}")
+    try:
+        return ruta, _verificar_en(ruta, manifiesto, lambda clave: os.path.join(tmp, clave))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def restaurar(respaldo, directorio=None, respaldar_antes=True):
+    """Verifica 'respaldo' y lo copia sobre la BD viva (y sus particiones).
+    Return: ruta del respaldo previo de la BD actual (o None). Lanza RespaldoInvalido."""
+    import migraciones
+    directorio = directorio or carpeta()
+    # Todo con el lock: ni el Programador ni otro 'crear' respaldan o rotan a mitad de camino
+    with _Cerrojo(directorio):
+        ruta, manifiesto = _buscar(respaldo, directorio)
+        previo = None
+        if respaldar_antes and os.path.exists(database.DB_PATH):
+            # Sin rotar: el respaldo a restaurar puede ser el más viejo
+            previo = _respaldar(directorio, conservar=max(CONSERVAR + 1, len(listar(directorio)) + 1))
+        bd = manifiesto["bd"]
+        # Se descomprime junto a su destino (mismo disco: os.replace es atómico)
+        destino_de = lambda clave: (database.DB_PATH if clave == bd else
+                                    database.ruta_particion(clave.split("/", 1)[1])) + ".restaurando"
+        try:
+            problemas = _verificar_en(ruta, manifiesto, destino_de)
+            if problemas:
+                raise RespaldoInvalido("; ".join(problemas))
+            for clave in manifiesto["archivos"]:
+                if clave != bd:
+                    os.replace(destino_de(clave), destino_de(clave)[:-len(".restaurando")])
+            vivo = database._abrir()
+            origen = sqlite3.connect(destino_de(bd))
+            try:
+                try:
+                    contadores = dict(vivo.execute("SELECT nombre, valor FROM contadores").fetchall())
+                except sqlite3.DatabaseError:   # BD actual vacía o dañada
+                    contadores = {}
+                origen.backup(vivo)   # un solo paso: toma el lock de escritura hasta terminar
+                with vivo:
+                    vivo.execute("BEGIN IMMEDIATE")
+                    for nombre, valor in contadores.items():
+                        vivo.execute("INSERT INTO contadores (nombre, valor) VALUES (?, ?) ON CONFLICT (nombre) "
+                                     "DO UPDATE SET valor = MAX(valor, excluded.valor)", (nombre, valor + 1))
+                    # Las conexiones de los workers vuelven a adjuntar las particiones nuevas
+                    database._incrementar_contador(vivo.cursor(), database.VERSION_PARTICIONES)
+                migraciones.migrar(vivo)
+            finally:
+                origen.close()
+                vivo.close()
+        finally:
+            for clave in manifiesto["archivos"]:
+                if os.path.exists(destino_de(clave)):
+                    os.remove(destino_de(clave))
+    database._FTS_DISPONIBLE.clear()
+    return previo
+
+
+# ====== Respaldos automáticos desde la app ======
+class Programador:
+    def __init__(self, cada_h=CADA_H):
+        self.cada_h = cada_h
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _arrancar(self):
+        # Un hilo por proceso: tras el fork de gunicorn el hilo del padre no existe en el hijo
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._bucle, name="respaldos", daemon=True).start()
+                self._pid = os.getpid()
+
+    def _bucle(self):
+        while True:
+            # Cada worker revisa; el lock de archivo y la edad del último deciden quién respalda
+            time.sleep(min(self.cada_h * 3600, 600))
+            try:
+                ruta = respaldar(si_pasaron_h=self.cada_h)
+                if ruta:
+                    log.info("respaldo creado en %s", ruta)
+            except RespaldoEnCurso:
+                pass
+            except Exception:
+                log.exception("no se pudo respaldar la BD")
+
+
+programador = Programador()
+
+
+def instalar(app):
+    """Con LAVA_RESPALDO_CADA_H > 0 arranca el hilo de respaldos en cada worker."""
+    if CADA_H > 0:
+        app.before_request(programador._arrancar)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    sub = ap.add_subparsers(dest="orden", required=True)
+    sub.add_parser("crear", help="respalda ahora y rota los viejos")
+    sub.add_parser("listar")
+    p = sub.add_parser("verificar", help="sha256 + PRAGMA integrity_check de un respaldo")
+    p.add_argument("respaldo", nargs="?", help="carpeta o nombre (por defecto el último)")
+    p = sub.add_parser("restaurar", help="verifica y copia el respaldo sobre la BD actual")
+    p.add_argument("respaldo")
+    p.add_argument("--confirmar", action="store_true")
+    p.add_argument("--sin-respaldo-previo", action="store_true", help="no respaldar la BD actual antes (si está dañada)")
+    args = ap.parse_args()
+
+    if args.orden == "crear":
+        ruta = respaldar()
+        _, manifiesto = _buscar(ruta)
+        print(f"Respaldo en {ruta} ({manifiesto['segundos']}s)")
+    elif args.orden == "listar":
+        for ruta, m in listar():
+            tam = sum(os.path.getsize(os.path.join(ruta, c + ".gz")) for c in m["archivos"])
+            print(f"{os.path.basename(ruta)}  esquema v{m.get('version')}  "
+                  f"{len(m['archivos'])} archivos  {tam / 2**20:.1f} MB")
+    elif args.orden == "verificar":
+        ruta, problemas = verificar(args.respaldo)
+        print(f"{ruta}: " + ("ok" if not problemas else "\n  ".join(["CON PROBLEMAS"] + problemas)))
+        return 1 if problemas else 0
+    else:
+        if not args.confirmar:
+            return f"Esto reemplaza {database.DB_PATH} por {args.respaldo}. Para confirmar agrega --confirmar"
+        try:
+            previo = restaurar(args.respaldo, respaldar_antes=not args.sin_respaldo_previo)
+        except RespaldoInvalido as e:
+            return f"No se restauró: {e}"
+        if previo:
+            print(f"BD anterior respaldada en {previo}")
+        print(f"Restaurado {args.respaldo}.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
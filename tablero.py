@@ -0,0 +1,157 @@
+"""Tablero de entregas en vivo (vencidas / para hoy / listas) por Server-Sent Events.
+Una boleta lista sale solo en 'listas', aunque su fecha de entrega ya haya llegado.
+
+Las pantallas no sondean la BD: un solo hilo por proceso vigila el contador 'cambios' (lo sube
+cualquier escritura de boletas, ver migración 10) con una lectura por clave primaria. Cuando
+cambia, arma el tablero UNA vez y lo reparte a todas las pantallas conectadas. N pantallas
+cuestan una consulta por cambio, no N consultas por intervalo de sondeo.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from datetime import date
+
+import database
+
+INTERVALO_S = float(os.getenv("LAVA_TABLERO_INTERVALO", "1"))      # cada cuánto se mira el contador
+LATIDO_S = float(os.getenv("LAVA_TABLERO_LATIDO", "15"))           # comentario SSE para mantener viva la conexión
+MAX_PANTALLAS = int(os.getenv("LAVA_TABLERO_PANTALLAS", "50"))     # conexiones SSE por proceso
+
+_CAMPOS = ("id", "numero", "cliente", "telefono", "entrega_fecha", "entrega_hora", "estado", "saldo")
+
+log = logging.getLogger("lavanderia.tablero")
+
+
+class DemasiadasPantallas(Exception):
+    """Se alcanzó LAVA_TABLERO_PANTALLAS en este proceso."""
+
+
+def armar(hoy=None):
+    """Return: dict con las secciones del tablero para el día 'hoy' ('YYYY-MM-DD')."""
+    hoy = hoy or date.today().isoformat()
+    pendientes, listas = database.tablero(hoy)
+    a_dict = lambda fila: dict(zip(_CAMPOS, fila))
+    return {
+        "hoy": hoy,
+        "vencidas": [a_dict(f) for f in pendientes if f[4] < hoy],
+        "para_hoy": [a_dict(f) for f in pendientes if f[4] == hoy],
+        "listas": [a_dict(f) for f in listas],
+    }
+
+
+class Difusor:
+    def __init__(self, intervalo=INTERVALO_S, max_pantallas=MAX_PANTALLAS):
+        self.intervalo = intervalo
+        self.max_pantallas = max_pantallas
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._pid = None
+        self._pantallas = set()     # una cola por conexión SSE
+        self._clave = None          # (contador 'cambios', día) del último tablero armado
+        self._ultimo = None         # último tablero en JSON
+        self.consultas = 0
+
+    def _arrancar(self):
+        # Un hilo por proceso: tras el fork de gunicorn el hilo del padre no existe en el hijo
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pantallas = set()
+                self._clave = self._ultimo = None
+                threading.Thread(target=self._bucle, name="difusor-tablero", daemon=True).start()
+                self._pid = os.getpid()
+
+    def suscribir(self):
+        """Return: cola de la que la conexión lee los tableros en JSON (el primero es el actual)."""
+        self._arrancar()
+        cola = queue.Queue(maxsize=4)
+        with self._lock:
+            if len(self._pantallas) >= self.max_pantallas:
+                raise DemasiadasPantallas("demasiadas pantallas conectadas a este proceso")
+            self._pantallas.add(cola)
+        try:
+            datos = self._refrescar()
+        except Exception:
+            self.desuscribir(cola)
+            raise
+        if datos is not None:
+            self._publicar(datos)   # las demás pantallas también lo reciben, incluida la nueva
+        else:
+            cola.put_nowait(self._ultimo)
+        return cola
+
+    def desuscribir(self, cola):
+        with self._lock:
+            self._pantallas.discard(cola)
+
+    def avisar(self):
+        """Hubo una escritura en este proceso: revisar ya sin esperar al intervalo."""
+        self._despertar.set()
+
+    def _refrescar(self):
+        """Arma el tablero si cambió el contador o el día. Return: el JSON nuevo o None."""
+        clave = (database.leer_contador("cambios"), date.today().isoformat())
+        with self._lock:
+            if clave == self._clave:
+                return None
+        datos = json.dumps(armar(clave[1]), ensure_ascii=False)
+        with self._lock:
+            self.consultas += 1
+            self._clave = clave
+            if datos == self._ultimo:   # el cambio no tocó el tablero (ej. un pago a cuenta)
+                return None
+            self._ultimo = datos
+            return datos
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            with self._lock:
+                if not self._pantallas:
+                    continue
+            try:
+                datos = self._refrescar()
+            except Exception:
+                log.exception("no se pudo armar el tablero")
+                continue
+            if datos is not None:
+                self._publicar(datos)
+
+    def _publicar(self, datos):
+        with self._lock:
+            pantallas = list(self._pantallas)
+        for cola in pantallas:
+            # Una pantalla lenta no frena a las demás: solo le importa el último tablero
+            try:
+                cola.put_nowait(datos)
+            except queue.Full:
+                try:
+                    cola.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    cola.put_nowait(datos)
+                except queue.Full:
+                    pass
+
+
+def eventos(cola, latido=LATIDO_S):
+    """Generador SSE: un evento 'tablero' por cambio y un comentario de latido si no hay cambios."""
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                datos = cola.get(timeout=latido)
+            except queue.Empty:
+                yield ": latido\n\n"
+                continue
+            yield f"event: tablero\ndata: {datos}\n\n"
+    finally:
+        difusor.desuscribir(cola)
+
+
+difusor = Difusor()
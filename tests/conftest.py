@@ -0,0 +1,57 @@
+"""Cada prueba trabaja sobre una BD nueva en su tmp_path; nunca sobre lavanderia.db."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+# Antes de importar database/app: config lee LAVA_DB_PATH al importarse y app crea la BD
+os.environ["LAVA_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="lava_pruebas_"), "inicial.db")
+os.environ.setdefault("LAVA_RESPALDO_CADA_H", "0")
+
+import database  # noqa: E402
+
+
+def usar_bd(monkeypatch, ruta):
+    """Apunta database (y lo que se abra después: escritor, respaldos, particiones) a 'ruta'."""
+    monkeypatch.setattr(database, "DB_PATH", str(ruta))
+    monkeypatch.setenv("LAVA_DB_PATH", str(ruta))
+    database._FTS_DISPONIBLE.clear()
+
+
+@pytest.fixture
+def bd(tmp_path, monkeypatch):
+    """BD vacía con el esquema al día. Return: ruta"""
+    ruta = tmp_path / "lavanderia.db"
+    usar_bd(monkeypatch, ruta)
+    database.crear_bd()
+    yield str(ruta)
+    database.cerrar_conexion()
+
+
+@pytest.fixture
+def cliente(bd):
+    """Cliente de pruebas de Flask sobre la BD de 'bd', con las cachés por proceso vacías."""
+    import app
+    import cache_boletas
+    import cache_paginas
+    import clientes
+    cache_boletas.boletas.invalidar()
+    cache_paginas.paginas.invalidar()
+    clientes.indice.invalidar()
+    app.app.config["TESTING"] = True
+    return app.app.test_client()
+
+
+def cabecera(cliente="Ana Ríos", fecha="2026-10-01 10:00:00", total=10.5, **cambios):
+    """Cabecera para insertar_boleta_compuesta; 'cambios' reemplaza cualquier campo."""
+    return {**dict(numero=None, cliente=cliente, direccion="", telefono="987654321", fecha=fecha,
+                   entrega_fecha=None, entrega_hora=None, metodo_pago="efectivo", estado="registrado",
+                   a_cuenta=0, saldo=total, total=total, notas=None), **cambios}
+
+
+def item(tipo="otro", cantidad=1, importe=10.5, lavado="Normal"):
+    return dict(descripcion=tipo.capitalize(), tipo=tipo, cantidad=cantidad, lavado=lavado,
+                p_unit=importe / cantidad if cantidad else importe, importe=importe, perfumado=0)
@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+import archivo
+import database
+from conftest import cabecera, item
+
+CLIENTES = ("Ana Ríos", "Luis Pérez", "María Soto")
+
+
+@pytest.fixture
+def historico(bd):
+    """Boletas de 2022 a hoy: las viejas entregadas y pagadas se archivan, las demás no.
+    Return: ids de las que archivar() debe mover"""
+    cerradas = []
+    for i in range(60):
+        anio = 2022 + i % 5                      # 2022..2026
+        fecha = f"{anio}-0{1 + i % 9}-{1 + i % 27:02d} {8 + i % 10:02d}:00:00"
+        pagada = i % 7 != 0
+        cab = cabecera(cliente=CLIENTES[i % 3], fecha=fecha, total=12.5, estado="entregado",
+                       a_cuenta=12.5 if pagada else 0, saldo=0 if pagada else 12.5)
+        boleta_id = database.insertar_boleta_compuesta(cab, [item(importe=5), item("kilo", 2.5, 7.5)])
+        if anio <= 2024 and pagada:
+            cerradas.append(boleta_id)
+    return cerradas
+
+
+def _todo(**filtro):
+    return database.listar_boletas(database.FiltroBoletas(**filtro), limit=1000)
+
+
+def test_archivar_mueve_solo_las_cerradas_antiguas(historico):
+    movidas = archivo.archivar(dias=730)
+    assert sum(movidas.values()) == len(historico)
+    assert set(movidas) <= {2022, 2023, 2024}
+    conn = database._conn()
+    restantes = {r[0] for r in conn.execute("SELECT id FROM boleta")}
+    assert restantes.isdisjoint(historico)
+    for anio in movidas:
+        assert os.path.exists(database.ruta_particion(f"lavanderia_{anio}.db"))
+    assert archivo.archivar(dias=730) == {}   # repetir no mueve nada
+
+
+def test_listado_y_totales_iguales_tras_archivar(historico):
+    filtros = ({}, {"cliente": "rios"}, {"fecha_desde": "2023-01-01", "fecha_hasta": "2023-12-31"})
+    antes = [_todo(**filtro) for filtro in filtros]
+    exportadas = list(database.iter_boletas())
+    archivo.archivar(dias=730)
+
+    for filtro, esperado in zip(filtros, antes):
+        assert _todo(**filtro) == esperado, filtro
+    assert list(database.iter_boletas()) == exportadas
+    # Paginación por cursor que cruza de 'main' a las particiones
+    filas = antes[0][0]
+    ultima = filas[9]
+    pagina, _, _ = database.listar_boletas(database.FiltroBoletas(), limit=20, despues_de=(ultima[8], ultima[0]))
+    assert pagina == filas[10:30]
+
+
+def test_reintento_de_una_clave_archivada_no_duplica(bd):
+    cerrada = cabecera(fecha="2022-03-01 10:00:00", estado="entregado", a_cuenta=10.5, saldo=0)
+    [(_, boleta_id, _)] = database.insertar_boletas_lote([dict(clave="pwa-1", cabecera=cerrada, items=[item()])])
+    assert archivo.archivar(dias=730) == {2022: 1}
+
+    assert database.insertar_boletas_lote([dict(clave="pwa-1", cabecera=cerrada, items=[item()])]) == \
+        [("pwa-1", boleta_id, True)]
+    _, n, total = _todo()
+    assert (n, total) == (1, 10.5)
+
+
+def test_detalle_y_busqueda_de_archivadas(historico, cliente):
+    antes = {i: database.obtener_boleta_detalle(i) for i in historico[:5]}
+    archivo.archivar(dias=730)
+    for boleta_id, (cab, items) in antes.items():
+        assert database.obtener_boleta_detalle(boleta_id) == (cab, items)
+
+    r = cliente.get(f"/api/boletas/{historico[0]}")
+    assert r.status_code == 200
+    assert len(r.get_json()["items"]) == 2
+    r = cliente.get("/api/boletas", query_string={"ids": f"{historico[1]},999999"})
+    assert [b["id"] for b in r.get_json()["boletas"]] == [historico[1]]
+    assert r.get_json()["no_encontradas"] == [999999]
+
+    # Búsqueda de cliente (FTS sin tildes) dentro de un año que solo está en la partición
+    filas, n, _ = _todo(cliente="perez", fecha_desde="2022-01-01", fecha_hasta="2022-12-31")
+    assert n == len(filas) > 0
+    assert all(f[1] == "Luis Pérez" and f[8].startswith("2022") for f in filas)
@@ -0,0 +1,79 @@
+import csv
+import gzip
+import io
+import json
+
+import database
+from conftest import cabecera, item
+
+
+def _cambios(cliente, since=0, **params):
+    """Return: (boletas jsonl, cursor siguiente, hay más)"""
+    r = cliente.get("/export/cambios", query_string={"since": since, "formato": "jsonl", **params})
+    assert r.status_code == 200
+    boletas = [json.loads(linea) for linea in r.get_data(as_text=True).splitlines()]
+    return boletas, int(r.headers["X-Cursor-Siguiente"]), r.headers["X-Hay-Mas"] == "1"
+
+
+def _nuevas(n, **kw):
+    return [database.insertar_boleta_compuesta(cabecera(cliente=f"Cliente {i}", **kw), [item(), item("kilo", 2, 7)])
+            for i in range(n)]
+
+
+def test_solo_lo_nuevo_desde_el_cursor(cliente):
+    ids = _nuevas(3)
+    boletas, cursor, hay_mas = _cambios(cliente)
+    assert [b["id"] for b in boletas] == ids
+    assert not hay_mas
+    assert [len(b["items"]) for b in boletas] == [2, 2, 2]
+
+    assert _cambios(cliente, cursor)[:2] == ([], cursor)
+
+    # Lote del escritor (cambio asignado en bloque) y un cambio de estado: salen en orden de commit
+    lote = [r[1] for r in database.insertar_boletas_lote(
+        [dict(clave=f"k{i}", cabecera=cabecera(), items=[item()]) for i in range(2)])]
+    database.cambiar_estado(ids[0], "lavando")
+    boletas, siguiente, _ = _cambios(cliente, cursor)
+    assert [b["id"] for b in boletas] == lote + [ids[0]]
+    assert boletas[-1]["estado"] == "lavando"
+    assert siguiente > cursor
+
+
+def test_cambio_en_un_item_marca_la_boleta(cliente):
+    ids = _nuevas(2)
+    _, cursor, _ = _cambios(cliente)
+    with database._conn() as conn:
+        conn.execute("UPDATE boleta_items SET importe = 9.9 WHERE boleta_id = ? AND tipo = 'otro'", (ids[1],))
+    boletas, _, _ = _cambios(cliente, cursor)
+    assert [b["id"] for b in boletas] == [ids[1]]
+    assert 9.9 in [it["importe"] for it in boletas[0]["items"]]
+
+
+def test_paginas_con_limite_sin_repetir_ni_saltar(cliente):
+    ids = _nuevas(7)
+    vistos, cursor, paginas = [], 0, 0
+    while True:
+        boletas, cursor, hay_mas = _cambios(cliente, cursor, limite=3)
+        vistos += [b["id"] for b in boletas]
+        paginas += 1
+        if not hay_mas:
+            break
+    assert vistos == ids
+    assert paginas == 3
+
+
+def test_csv_una_fila_por_item_y_gzip(cliente):
+    _nuevas(2)
+    r = cliente.get("/export/cambios", query_string={"formato": "csv"})
+    filas = list(csv.reader(io.StringIO(r.get_data(as_text=True))))
+    assert filas[0][:2] == ["id", "cambio"]
+    assert len(filas) == 1 + 4
+
+    comprimida = cliente.get("/export/cambios", query_string={"formato": "csv", "gzip": "1"})
+    assert comprimida.mimetype == "application/gzip"
+    assert gzip.decompress(comprimida.data).decode("utf-8") == r.get_data(as_text=True)
+
+
+def test_parametros_invalidos(cliente):
+    assert cliente.get("/export/cambios?since=abc").status_code == 400
+    assert cliente.get("/export/cambios?formato=xml").status_code == 400
@@ -0,0 +1,65 @@
+import sqlite3
+
+
+def _lote(*claves, cliente="Ana Ríos"):
+    return {"boletas": [
+        {"idempotency_key": clave, "cliente": cliente, "telefono": "987654321",
+         "items": [{"tipo": "otro", "descripcion": "Cortina", "cantidad": 1, "p_unit": 12.5}]}
+        for clave in claves
+    ]}
+
+
+def _boletas(bd):
+    conn = sqlite3.connect(bd)
+    try:
+        return conn.execute("SELECT COUNT(1) FROM boleta").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_reintento_devuelve_el_mismo_id(cliente, bd):
+    r1 = cliente.post("/api/boletas/lote", json=_lote("pwa-1", "pwa-2"))
+    assert r1.status_code == 200
+    primero = r1.get_json()["resultados"]
+    assert [r["duplicado"] for r in primero] == [False, False]
+
+    r2 = cliente.post("/api/boletas/lote", json=_lote("pwa-1", "pwa-2"))
+    assert r2.status_code == 200
+    segundo = r2.get_json()["resultados"]
+    assert [r["id"] for r in segundo] == [r["id"] for r in primero]
+    assert [r["duplicado"] for r in segundo] == [True, True]
+    assert _boletas(bd) == 2
+
+
+def test_clave_repetida_en_el_mismo_lote(cliente, bd):
+    resultados = cliente.post("/api/boletas/lote", json=_lote("x", "x", "y")).get_json()["resultados"]
+    assert resultados[0]["id"] == resultados[1]["id"]
+    assert [r["duplicado"] for r in resultados] == [False, True, False]
+    assert _boletas(bd) == 2
+
+
+def test_reintento_parcial_solo_guarda_las_nuevas(cliente, bd):
+    antes = cliente.post("/api/boletas/lote", json=_lote("a")).get_json()["resultados"][0]["id"]
+    resultados = cliente.post("/api/boletas/lote", json=_lote("a", "b")).get_json()["resultados"]
+    assert resultados[0] == {"idempotency_key": "a", "id": antes, "duplicado": True}
+    assert resultados[1]["duplicado"] is False
+    assert _boletas(bd) == 2
+
+
+def test_lote_invalido_no_guarda_nada(cliente, bd):
+    lote = _lote("ok")
+    lote["boletas"].append({"idempotency_key": "mal", "cliente": "", "items": []})
+    r = cliente.post("/api/boletas/lote", json=lote)
+    assert r.status_code == 400
+    assert r.get_json()["errores"][0]["indice"] == 1
+    assert _boletas(bd) == 0
+
+
+def test_borrar_la_boleta_libera_su_clave(cliente, bd):
+    boleta_id = cliente.post("/api/boletas/lote", json=_lote("a")).get_json()["resultados"][0]["id"]
+    conn = sqlite3.connect(bd)
+    with conn:
+        conn.execute("DELETE FROM boleta WHERE id = ?", (boleta_id,))
+    conn.close()
+    assert cliente.post("/api/boletas/lote", json=_lote("a")).get_json()["resultados"][0]["duplicado"] is False
+    assert _boletas(bd) == 1
@@ -0,0 +1,98 @@
+import io
+import json
+import os
+
+import pytest
+
+import database
+import importar
+
+COLUMNAS = ("numero,fecha,cliente,telefono,direccion,entrega_fecha,entrega_hora,metodo_pago,estado,"
+            "a_cuenta,notas,descripcion,tipo,cantidad,lavado,p_unit,importe,perfumado")
+
+
+def _fila(n, item=0):
+    return (f"{n},2021-03-{1 + n % 28:02d} 10:00,Cliente {n},98765{n:04d},,,,efectivo,entregado,0,,"
+            f"Ítem {item},kilo,{1 + item},Normal,3.5,,0")
+
+
+def _csv(ruta, numeros, items=1):
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(COLUMNAS + "\n")
+        for n in numeros:
+            for i in range(items):
+                f.write(_fila(n, i) + "\n")
+    return str(ruta)
+
+
+def _importar(ruta, **kw):
+    return importar.importar(ruta, salida=io.StringIO(), **kw)
+
+
+def _boletas():
+    return database._conn().execute("SELECT COUNT(1) FROM boleta").fetchone()[0]
+
+
+def test_csv_agrupa_items_y_no_duplica_al_repetir(bd, tmp_path):
+    ruta = _csv(tmp_path / "historico.csv", range(1, 21), items=2)
+    assert _importar(ruta, lote=7) == (20, 0, 0)
+    assert database._conn().execute("SELECT COUNT(1) FROM boleta_items").fetchone()[0] == 40
+    assert _importar(ruta, lote=7) == (0, 0, 0)
+    assert _boletas() == 20
+
+
+def test_reanuda_tras_una_caida(bd, tmp_path, monkeypatch):
+    ruta = _csv(tmp_path / "historico.csv", range(1, 51))
+    original = database.insertar_boletas_lote
+    llamadas = []
+
+    def se_cae(entradas):
+        llamadas.append(len(entradas))
+        if len(llamadas) == 3:
+            raise KeyboardInterrupt  # corte a mitad de la importación
+        return original(entradas)
+
+    monkeypatch.setattr(database, "insertar_boletas_lote", se_cae)
+    with pytest.raises(KeyboardInterrupt):
+        _importar(ruta, lote=10)
+    assert _boletas() == 20
+    monkeypatch.setattr(database, "insertar_boletas_lote", original)
+
+    assert _importar(ruta, lote=10) == (30, 0, 0)
+    assert _boletas() == 50
+
+
+def test_renombrar_o_agregar_filas_no_duplica(bd, tmp_path):
+    ruta = _csv(tmp_path / "enero.csv", range(1, 11))
+    assert _importar(ruta) == (10, 0, 0)
+    renombrado = tmp_path / "enero_v2.csv"
+    os.rename(ruta, renombrado)
+    with open(renombrado, "a", encoding="utf-8") as f:
+        f.write(_fila(99) + "\n")
+    assert _importar(str(renombrado)) == (1, 10, 0)
+    assert _boletas() == 11
+
+
+def test_boletas_identicas_se_importan_todas(bd, tmp_path):
+    reg = {"fecha": "2020-05-05 10:00", "cliente": "Ana", "items": [{"tipo": "kilo", "cantidad": 2, "p_unit": 3.5}]}
+    ruta = tmp_path / "dos.jsonl"
+    ruta.write_text(json.dumps(reg) + "\n" + json.dumps(reg) + "\n", encoding="utf-8")
+    assert _importar(str(ruta)) == (2, 0, 0)
+    # Otro archivo con el mismo contenido (espacios de más incluidos) y una tercera copia
+    otra = tmp_path / "tres.jsonl"
+    otra.write_text("\n".join(json.dumps(r) for r in (reg, dict(reg, cliente=" Ana "), reg)) + "\n", encoding="utf-8")
+    assert _importar(str(otra)) == (1, 2, 0)
+    assert _boletas() == 3
+
+
+def test_filas_invalidas_van_a_rechazados(bd, tmp_path):
+    ruta = tmp_path / "mixto.jsonl"
+    ruta.write_text("\n".join([
+        json.dumps({"fecha": "2020-01-01", "cliente": "Ok", "items": [{"importe": 10}]}),
+        json.dumps({"fecha": "ayer", "cliente": "Mal", "items": [{"importe": 10}]}),
+        "{no es json",
+    ]) + "\n", encoding="utf-8")
+    assert _importar(str(ruta)) == (1, 0, 2)
+    with open(str(ruta) + ".rechazados.jsonl", encoding="utf-8") as f:
+        rechazos = [json.loads(linea) for linea in f]
+    assert [r["registro"] for r in rechazos] == [2, 3]
@@ -0,0 +1,177 @@
+"""lavanderia.db tal como se publicó (esquema original, user_version 0) migra hasta la última
+versión sin perder boletas y con los totales exactos al centavo."""
+import os
+import random
+import shutil
+import sqlite3
+import threading
+from collections import defaultdict
+from decimal import Decimal
+
+import pytest
+
+import database
+import migraciones
+from conftest import RAIZ, cabecera, item, usar_bd
+
+MONTOS = (0.1, 0.2, 0.3, 8.15, 19.99, 7.05, 12.35, 3.33)
+
+
+def _centavos(valor):
+    return int(Decimal(str(valor)) * 100)
+
+
+def _poblar_legado(ruta, n=300, semilla=7):
+    """Escribe n boletas como la app original: cabecera + items y la copia en 'boletas'
+    ('multi: ...', servicio 'mixto'); 1 de cada 5 solo en 'boletas' (versión más vieja)."""
+    azar = random.Random(semilla)
+    conn = sqlite3.connect(ruta)
+    with conn:
+        for i in range(n):
+            fecha = f"2024-0{1 + i % 3}-{1 + i % 28:02d} {8 + i % 10:02d}:{i % 60:02d}:00"
+            cliente = f"Cliente {i % 40}"
+            importes = [azar.choice(MONTOS) for _ in range(1 + i % 3)]
+            total = round(sum(importes), 2)
+            if i % 5:
+                boleta_id = conn.execute(
+                    "INSERT INTO boleta (cliente, telefono, fecha, metodo_pago, estado, a_cuenta, saldo, total) "
+                    "VALUES (?, ?, ?, ?, 'entregado', 0, 0, ?)",
+                    (cliente, f"98765{i % 40:04d}", fecha, ("efectivo", "yape")[i % 2], total),
+                ).lastrowid
+                for j, importe in enumerate(importes):
+                    conn.execute(
+                        "INSERT INTO boleta_items (boleta_id, descripcion, tipo, prendas, kilos, lavado, p_unit, importe) "
+                        "VALUES (?, 'x', ?, ?, ?, 'Normal', ?, ?)",
+                        (boleta_id, ("kilo", "edredon")[j % 2], j % 2, 0 if j % 2 else 1.5, importe, importe),
+                    )
+                tipo_item = "multi"
+            else:
+                tipo_item = "kilos"
+            conn.execute(
+                "INSERT INTO boletas (cliente, tipo_item, kilos, cantidad, servicio, perfumado, precio, fecha, metodo_pago) "
+                "VALUES (?, ?, 0, 2, 'mixto', 0, ?, ?, ?)",
+                (cliente, tipo_item, total, fecha, ("efectivo", "yape")[i % 2]),
+            )
+    conn.close()
+
+
+def _esperado(ruta):
+    """Centavos por día de lo que había antes de migrar: cada cabecera de 'boleta' más las filas
+    de 'boletas' sin cabecera equivalente (misma fecha, cliente y monto)."""
+    conn = sqlite3.connect(ruta)
+    try:
+        cabeceras = conn.execute("SELECT fecha, cliente, total FROM boleta").fetchall()
+        claves = {(f, c, _centavos(t)) for f, c, t in cabeceras}
+        sueltas = [(f, c, p) for f, c, p in conn.execute("SELECT fecha, cliente, precio FROM boletas")
+                   if (f, c, _centavos(p)) not in claves]
+    finally:
+        conn.close()
+    por_dia = defaultdict(int)
+    for fecha, _, monto in cabeceras + sueltas:
+        por_dia[fecha[:10]] += _centavos(monto)
+    return len(cabeceras) + len(sueltas), dict(por_dia)
+
+
+@pytest.fixture
+def legado(tmp_path, monkeypatch):
+    ruta = tmp_path / "lavanderia.db"
+    shutil.copyfile(os.path.join(RAIZ, "lavanderia.db"), ruta)
+    usar_bd(monkeypatch, ruta)
+    yield str(ruta)
+    database.cerrar_conexion()
+
+
+def _resumen(conn, dimension):
+    return dict(conn.execute(
+        "SELECT dia, SUM(centavos) FROM resumen_diario WHERE dimension = ? GROUP BY dia", (dimension,)
+    ).fetchall())
+
+
+def test_v0_migra_con_totales_exactos(legado):
+    _poblar_legado(legado)
+    assert sqlite3.connect(legado).execute("PRAGMA user_version").fetchone()[0] == 0
+    n, por_dia = _esperado(legado)
+
+    assert migraciones.migrar() == migraciones.VERSION
+    conn = database._conn()
+    assert conn.execute("SELECT type FROM sqlite_master WHERE name = 'boletas'").fetchone()[0] == "view"
+    assert conn.execute("SELECT COUNT(1) FROM boleta").fetchone()[0] == n
+    assert conn.execute("SELECT COUNT(1) FROM boletas").fetchone()[0] == n
+
+    por_dia_bd = dict(conn.execute("SELECT substr(fecha,1,10), SUM(total_c) FROM boleta GROUP BY 1").fetchall())
+    assert por_dia_bd == por_dia
+    assert _resumen(conn, "total") == por_dia
+    assert _resumen(conn, "metodo_pago") == por_dia
+    items_por_dia = dict(conn.execute(
+        "SELECT substr(b.fecha,1,10), SUM(i.importe_c) FROM boleta_items i JOIN boleta b ON b.id = i.boleta_id GROUP BY 1"
+    ).fetchall())
+    assert _resumen(conn, "tipo") == items_por_dia
+
+    # El total del periodo sale del resumen en centavos: igual al exacto, no a la suma en float
+    assert database.contar_boletas() == n
+    assert database.total_periodo() == sum(por_dia.values()) / 100
+    assert database.contar_boletas(fecha_desde="2024-02-01", fecha_hasta="2024-02-28") == \
+        conn.execute("SELECT COUNT(1) FROM boleta WHERE fecha LIKE '2024-02-%'").fetchone()[0]
+
+
+def test_migrar_de_nuevo_no_cambia_nada(legado):
+    _poblar_legado(legado, n=50)
+    migraciones.migrar()
+    conn = database._conn()
+    antes = conn.execute("SELECT * FROM resumen_diario ORDER BY 1, 2, 3").fetchall()
+    assert migraciones.migrar() == migraciones.VERSION
+    assert conn.execute("SELECT * FROM resumen_diario ORDER BY 1, 2, 3").fetchall() == antes
+
+
+def test_resumen_al_dia_tras_escrituras(legado):
+    """Tras migrar, los triggers mantienen el resumen igual a reconstruirlo desde cero."""
+    _poblar_legado(legado, n=60)
+    migraciones.migrar()
+    conn = database._conn()
+    nueva = database.insertar_boleta_compuesta(cabecera(fecha="2024-01-05 09:00:00", total=0.3),
+                                               [item(importe=0.1), item(importe=0.2)])
+    with conn:
+        conn.execute("DELETE FROM boleta WHERE id = (SELECT MIN(id) FROM boleta)")
+        conn.execute("UPDATE boleta SET metodo_pago = 'tarjeta' WHERE id = ?", (nueva,))
+    antes = conn.execute("SELECT * FROM resumen_diario WHERE boletas <> 0 ORDER BY 1, 2, 3").fetchall()
+    database.reconstruir_resumen()
+    assert conn.execute("SELECT * FROM resumen_diario WHERE boletas <> 0 ORDER BY 1, 2, 3").fetchall() == antes
+
+
+def test_workers_que_arrancan_a_la_vez_migran_una_sola_vez(legado, monkeypatch):
+    _poblar_legado(legado, n=100)
+    n, _ = _esperado(legado)
+    # Hasta la 10: la carrera es sobre la 11, que copia por lotes las filas sueltas de 'boletas'
+    with monkeypatch.context() as m:
+        m.setattr(migraciones, "MIGRACIONES", migraciones.MIGRACIONES[:10])
+        m.setattr(migraciones, "VERSION", 10)
+        migraciones.migrar()
+    copiar = migraciones._copiar_boletas_sueltas
+    a_copiar = threading.Barrier(3)
+
+    def juntos(conn, *args, **kw):
+        # Sin lock los tres workers llegan aquí y copian las mismas filas; con lock llega uno solo
+        try:
+            a_copiar.wait(timeout=0.5)
+        except threading.BrokenBarrierError:
+            pass
+        return copiar(conn, *args, **kw)
+
+    monkeypatch.setattr(migraciones, "_copiar_boletas_sueltas", juntos)
+    versiones, inicio = [], threading.Barrier(3)
+
+    def worker():
+        conn = database._abrir()
+        try:
+            inicio.wait()
+            versiones.append(migraciones.migrar(conn))
+        finally:
+            conn.close()
+
+    hilos = [threading.Thread(target=worker) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert versiones == [migraciones.VERSION] * 3
+    assert database._conn().execute("SELECT COUNT(1) FROM boleta").fetchone()[0] == n
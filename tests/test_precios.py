@@ -0,0 +1,58 @@
+"""LAVA_PRECIOS_MODO=validar (por defecto): los pedidos bien preciados pasan con cualquier peso,
+servicio o perfumado; el servidor guarda la tarifa y los recargos aparte."""
+import database
+
+
+def _item(cantidad, lavado="Normal", perfumado=0, p_unit=3.5, tipo="kilo"):
+    return {"tipo": tipo, "descripcion": "Kilos", "cantidad": cantidad, "lavado": lavado,
+            "perfumado": perfumado, "p_unit": p_unit}
+
+
+def _enviar(cliente, *items, clave="k1"):
+    return cliente.post("/api/boletas/lote", json={"boletas": [
+        {"idempotency_key": clave, "cliente": "Ana Ríos", "items": list(items)}]})
+
+
+def _guardado(boleta_id):
+    conn = database._conn()
+    items = conn.execute("SELECT kilos + prendas, p_unit, recargo, importe FROM boleta_items "
+                         "WHERE boleta_id = ? ORDER BY id", (boleta_id,)).fetchall()
+    return conn.execute("SELECT total FROM boleta WHERE id = ?", (boleta_id,)).fetchone()[0], items
+
+
+def test_kilos_con_decimales_redondean_como_el_servidor(cliente):
+    # 0.21 × 3.5 = 0.735: en float redondea a 0.73, la tarifa (al centavo, mitad hacia arriba) da 0.74
+    r = _enviar(cliente, _item(0.21), _item(2.33))
+    assert r.status_code == 200, r.get_json()
+    total, items = _guardado(r.get_json()["resultados"][0]["id"])
+    assert items == [(0.21, 3.5, 0, 0.74), (2.33, 3.5, 0, 8.16)]
+    assert total == 8.9
+
+
+def test_recargos_de_servicio_y_perfumado_se_guardan_aparte(cliente):
+    r = _enviar(cliente, _item(2, perfumado=1), _item(2, "Seco"), _item(3, "A mano", perfumado=1))
+    assert r.status_code == 200, r.get_json()
+    total, items = _guardado(r.get_json()["resultados"][0]["id"])
+    assert items == [(2, 3.5, 0.5, 7.5), (2, 3.5, 2.0, 9.0), (3, 3.5, 2.0, 12.5)]
+    assert all(importe == round(cantidad * p_unit + recargo, 2) for cantidad, p_unit, recargo, importe in items)
+    assert total == 29
+
+
+def test_formulario_con_seco_y_perfumado(cliente):
+    r = cliente.post("/boleta/nueva", data={
+        "cliente": "Luis Pérez", "metodo_pago": "efectivo", "a_cuenta": "0",
+        "item_tipo[]": ["kilo", "otro"], "item_desc[]": ["Kilos", "Cortina"], "item_cantidad[]": ["0.21", "1"],
+        "item_lavado[]": ["Seco", "Normal"], "item_perfumado[]": ["1", "0"], "item_punit[]": ["3.5", "12"],
+    })
+    assert r.status_code == 302, r.get_data(as_text=True)
+    boleta_id = int(r.headers["Location"].split("/boleta/")[1].split("?")[0])
+    total, items = _guardado(boleta_id)
+    assert items == [(0.21, 3.5, 2.5, 3.24), (1, 12, 0, 12)]   # 'otro' no tiene tarifa: queda el del formulario
+    assert total == 15.24
+
+
+def test_precio_unitario_distinto_de_la_tarifa_se_rechaza(cliente):
+    r = _enviar(cliente, _item(2, p_unit=3.0))
+    assert r.status_code == 400
+    assert "tarifa" in r.get_json()["errores"][0]["error"]
+    assert database._conn().execute("SELECT COUNT(1) FROM boleta").fetchone()[0] == 0
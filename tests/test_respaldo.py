@@ -0,0 +1,150 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+
+import pytest
+
+import archivo
+import database
+import respaldo
+from conftest import cabecera, item
+
+
+def _poblar(n, anio=2026, **cambios):
+    return [database.insertar_boleta_compuesta(
+        cabecera(cliente=f"Cliente {i % 20}", fecha=f"{anio}-0{1 + i % 9}-{1 + i % 27:02d} 10:00:00", **cambios),
+        [item(importe=4.5), item("kilo", 1.5, 6)]) for i in range(n)]
+
+
+def _abrir_copia(ruta_respaldo, clave, destino):
+    """Descomprime un archivo del respaldo. Return: conexión a la copia"""
+    with gzip.open(os.path.join(ruta_respaldo, clave + ".gz"), "rb") as gz, open(destino, "wb") as f:
+        shutil.copyfileobj(gz, f)
+    return sqlite3.connect(destino)
+
+
+def _contar(conn=None):
+    return (conn or database._conn()).execute("SELECT COUNT(1) FROM boleta").fetchone()[0]
+
+
+@pytest.fixture
+def dir_respaldos(bd, tmp_path):
+    return str(tmp_path / "respaldos")
+
+
+def test_respaldo_con_escrituras_es_una_foto_consistente(dir_respaldos, tmp_path, monkeypatch):
+    _poblar(300)
+    copiar = respaldo._copiar
+    # De a una página: la copia dura muchos pasos mientras el otro hilo escribe
+    monkeypatch.setattr(respaldo, "_copiar", lambda origen, destino: copiar(origen, destino, paginas=1, pausa_ms=1))
+    parar, escritas = threading.Event(), []
+
+    def escribir():
+        try:
+            while not parar.is_set():
+                escritas.append(database.insertar_boleta_compuesta(cabecera(), [item()]))
+        finally:
+            database.cerrar_conexion()
+
+    hilo = threading.Thread(target=escribir)
+    hilo.start()
+    try:
+        ruta = respaldo.respaldar(dir_respaldos)
+    finally:
+        parar.set()
+        hilo.join()
+    assert escritas, "el hilo no llegó a escribir durante el respaldo"
+
+    assert respaldo.verificar(None, dir_respaldos) == (ruta, [])
+    manifiesto = respaldo.listar(dir_respaldos)[0][1]
+    copia = _abrir_copia(ruta, manifiesto["bd"], tmp_path / "copia.db")
+    n, centavos = copia.execute("SELECT COUNT(1), SUM(total_c) FROM boleta").fetchone()
+    assert 300 <= n <= 300 + len(escritas)
+    # Misma transacción: el resumen de la copia cuadra con sus boletas
+    assert copia.execute("SELECT SUM(boletas), SUM(centavos) FROM resumen_diario WHERE dimension = 'total'"
+                         ).fetchone() == (n, centavos)
+    assert copia.execute("PRAGMA user_version").fetchone()[0] == manifiesto["version"]
+    copia.close()
+
+
+def test_restaurar_vuelve_al_respaldo_y_respalda_antes(dir_respaldos):
+    _poblar(40)
+    ruta = respaldo.respaldar(dir_respaldos)
+    _poblar(15)
+    version = database.leer_contador(database.VERSION_BOLETAS)
+    assert _contar() == 55
+
+    previo = respaldo.restaurar(os.path.basename(ruta), dir_respaldos)
+    assert _contar() == 40
+    assert previo and respaldo.verificar(previo, dir_respaldos)[1] == []
+    assert len(respaldo.listar(dir_respaldos)) == 2
+    # Los contadores no retroceden: cachés, ETags y cursores no dan nada por visto
+    assert database.leer_contador(database.VERSION_BOLETAS) > version
+    assert database.insertar_boleta_compuesta(cabecera(), [item()]) > 0
+
+
+def test_respaldo_dañado_no_se_restaura(dir_respaldos):
+    _poblar(20)
+    ruta = respaldo.respaldar(dir_respaldos)
+    gz = os.path.join(ruta, os.path.basename(database.DB_PATH) + ".gz")
+    with open(gz, "r+b") as f:
+        f.seek(os.path.getsize(gz) // 2)
+        f.write(b"\x00\xff\x00\xff")
+    _poblar(5)
+
+    _, problemas = respaldo.verificar(None, dir_respaldos)
+    assert problemas and "sha256" in problemas[0]
+    with pytest.raises(respaldo.RespaldoInvalido):
+        respaldo.restaurar(os.path.basename(ruta), dir_respaldos, respaldar_antes=False)
+    assert _contar() == 25
+    assert not os.path.exists(database.DB_PATH + ".restaurando")
+
+
+def test_un_respaldo_a_la_vez(dir_respaldos):
+    _poblar(5)
+    with respaldo._Cerrojo(dir_respaldos):
+        with pytest.raises(respaldo.RespaldoEnCurso):
+            respaldo.respaldar(dir_respaldos)
+        with pytest.raises(respaldo.RespaldoEnCurso):
+            respaldo.restaurar(None, dir_respaldos)
+    assert respaldo.listar(dir_respaldos) == []
+
+
+def test_particiones_enlazadas_y_restauradas(dir_respaldos):
+    _poblar(30, anio=2022, estado="entregado", a_cuenta=10.5, saldo=0)
+    _poblar(10)
+    archivo.archivar(dias=730)
+    particion = database.ruta_particion("lavanderia_2022.db")
+    primero = respaldo.respaldar(dir_respaldos)
+    _poblar(3)
+    segundo = respaldo.respaldar(dir_respaldos)
+    clave = "archivo/lavanderia_2022.db.gz"
+    # Partición sin cambios: el segundo respaldo la enlaza en vez de copiarla
+    assert os.stat(os.path.join(primero, clave)).st_ino == os.stat(os.path.join(segundo, clave)).st_ino
+
+    os.remove(particion)
+    respaldo.restaurar(os.path.basename(primero), dir_respaldos, respaldar_antes=False)
+    assert os.path.exists(particion)
+    filas, n, _ = database.listar_boletas(database.FiltroBoletas(fecha_desde="2022-01-01", fecha_hasta="2022-12-31"))
+    assert n == 30 and len(filas) == 20
+
+
+def test_restaurar_reemplaza_particiones_ya_adjuntas(dir_respaldos):
+    _poblar(30, anio=2022, estado="entregado", a_cuenta=10.5, saldo=0)
+    archivo.archivar(dias=730)
+    ruta = respaldo.respaldar(dir_respaldos)
+    en_2022 = database.FiltroBoletas(fecha_desde="2022-01-01", fecha_hasta="2022-12-31")
+    clientes = lambda: {f[1] for f in database.listar_boletas(en_2022, limit=100)[0]}
+    assert len(clientes()) == 20   # la conexión de este hilo queda con la partición adjunta
+
+    particion = sqlite3.connect(database.ruta_particion("lavanderia_2022.db"))
+    with particion:
+        particion.execute("UPDATE boleta SET cliente = 'Cambiado'")
+    particion.close()
+    assert clientes() == {"Cambiado"}
+
+    # Sin volver a adjuntar, la conexión seguiría leyendo el archivo reemplazado
+    respaldo.restaurar(os.path.basename(ruta), dir_respaldos, respaldar_antes=False)
+    assert len(clientes()) == 20
@@ -0,0 +1,35 @@
+import database
+import tablero
+from conftest import cabecera, item
+
+HOY = "2026-10-18"
+
+
+def _boleta(estado, entrega_fecha, entrega_hora="10:00"):
+    return database.insertar_boleta_compuesta(
+        cabecera(estado=estado, entrega_fecha=entrega_fecha, entrega_hora=entrega_hora), [item()])
+
+
+def test_cada_boleta_en_una_sola_seccion_y_en_orden(bd):
+    vencida_tarde = _boleta("lavando", "2026-10-10", "18:00")
+    vencida = _boleta("registrado", "2026-10-10", "09:00")
+    para_hoy = _boleta("lavando", HOY, "11:00")
+    para_hoy_antes = _boleta("registrado", HOY, "08:00")
+    lista_vencida = _boleta("listo", "2026-10-01")
+    lista = _boleta("listo", "2026-10-20")
+    _boleta("registrado", "2026-10-25")          # aún no toca
+    _boleta("entregado", "2026-10-10")
+    _boleta("registrado", None)                  # sin fecha prometida
+
+    datos = tablero.armar(HOY)
+    ids = lambda seccion: [b["id"] for b in datos[seccion]]
+    assert ids("vencidas") == [vencida, vencida_tarde]
+    assert ids("para_hoy") == [para_hoy_antes, para_hoy]
+    assert ids("listas") == [lista_vencida, lista]
+
+
+def test_pendientes_sin_ordenar_en_temporal(bd):
+    plan = " ".join(fila[3] for fila in database._conn().execute(
+        "EXPLAIN QUERY PLAN " + database._PENDIENTES_TABLERO, {"hoy": HOY, "limite": 10}))
+    assert "idx_boleta_estado_entrega" in plan
+    assert "TEMP B-TREE" not in plan